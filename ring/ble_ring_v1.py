@@ -3,7 +3,10 @@ import asyncio
 import struct
 import queue
 
-from .utils.imu_data import IMUData
+from .utils.imu_data import IMUData, IMUBatch
+from .utils.crc import crc16
+from .utils.spp_framer import SPPFramer
+from .utils.command_pipeline import CommandPipeline
 
 from bleak import BleakScanner, BleakClient
 from types import FunctionType
@@ -25,23 +28,28 @@ class BLERing:
   EDPT_OP_LED_FLASH           = 0x23
   EDPT_OP_TOUCH_ACTION        = 0x24
 
-  def __init__(self, address:str, index:int, imu_callback=None, battery_callback=None, touch_callback=None, imu_freq=200, ring_type='V1'):
+  def __init__(self, address:str, index:int, imu_callback=None, battery_callback=None, touch_callback=None, imu_freq=200, ring_type='V1', imu_batch_callback=None):
     self.address = address
     self.index = index
     self.imu_mode = False
-    self.raw_imu_data = bytearray()
+    self.spp_framer = SPPFramer()
     self.touch_callback = touch_callback
     self.battery_callback = battery_callback
     self.imu_callback = imu_callback
+    self.imu_batch_callback = imu_batch_callback
     self.acc_fsr = '0'
     self.gyro_fsr = '0'
     self.imu_freq = imu_freq
     self.client = None
     self.connected = False
+    # set by a 'disconnect' action, tells utils/supervisor.py not to reconnect
+    self.disconnect_requested = False
     self.notify_characteristic = '0000FF11-0000-1000-8000-00805F9B34FB' if ring_type == 'V1' else 'C1D02505-2D20-400A-95D2-6A2F7BCA0C25' # 大创 / 指环王
     self.spp_read_characteristic = 'A6ED0202-D344-460A-8075-B9E8EC90D71B'
     self.spp_write_characteristic = 'A6ED0203-D344-460A-8075-B9E8EC90D71B'
     self.action_queue = queue.Queue()
+    # spp commands are answered by an "ACK:<command>" line, 0.5 s was the old fixed wait
+    self.commands = CommandPipeline(self.write_spp, timeout=0.5, retries=0)
     self.isack = False
   
   @property
@@ -49,6 +57,7 @@ class BLERing:
     return 'Ring' + str(self.index)
 
   def on_disconnect(self, clients):
+    self.connected = False
     print('Disconnected')
 
   def ble_notify_callback(self, sender, data):
@@ -92,33 +101,24 @@ class BLERing:
 
   def spp_notify_callback(self, sender, data:bytearray):
     if self.imu_mode:
-      self.raw_imu_data.extend(data)
-      for i in range(len(self.raw_imu_data) - 1):
-        if self.raw_imu_data[i] == 0xAA and self.raw_imu_data[i + 1] == 0x55:
-          self.raw_imu_data = self.raw_imu_data[i:]
-          break
-      while len(self.raw_imu_data) > 36:
-        imu_frame = self.raw_imu_data[:36]
+      crc_error_count = self.spp_framer.crc_error_count
+      self.spp_framer.feed(data)
+      imu_datas = []
+      # frames are crc-checked memoryviews into the framer buffer
+      for imu_frame in self.spp_framer.frames():
         imu_data = IMUData(
-          struct.unpack("f", imu_frame[4:8])[0],
-          struct.unpack("f", imu_frame[8:12])[0],
-          struct.unpack("f", imu_frame[12:16])[0],
-          struct.unpack("f", imu_frame[16:20])[0],
-          struct.unpack("f", imu_frame[20:24])[0],
-          struct.unpack("f", imu_frame[24:28])[0],
+          *struct.unpack_from("6f", imu_frame, 4),
         #   struct.unpack("Q", imu_frame[28:36])[0]
           time.time() * 16384
         )
-        crc = self.crc16(imu_frame, offset=4)
-        try:
-            assert (crc & 0xFF) == imu_frame[2]
-            assert ((crc >> 8) & 0xFF) == imu_frame[3]
-        except:
-            print(f"Error: crc is wrong!")
-            self.raw_imu_data = self.raw_imu_data[36:]
-            break
-        self.imu_callback(self.index, imu_data)
-        self.raw_imu_data = self.raw_imu_data[36:]
+        imu_datas.append(imu_data)
+      if self.spp_framer.crc_error_count != crc_error_count:
+        print(f"Error: crc is wrong!")
+      if self.imu_callback is not None:
+        for imu_data in imu_datas:
+          self.imu_callback(self.index, imu_data)
+      if self.imu_batch_callback is not None and len(imu_datas) > 0:
+        self.imu_batch_callback(self.index, IMUBatch.from_list(imu_datas))
     else:
       data = data.decode()
       results = data.strip().split('\r\n')
@@ -126,6 +126,7 @@ class BLERing:
         if result.startswith('ACK'):
           if result == 'ACK:ENDB6AX':
             self.imu_mode = True
+          self.commands.on_response(result[4:].split('=')[0], None, result.encode())
           print(result)
         elif result.startswith('ACC'):
           args = list(map(lambda x: x.split(':')[1], result.split(',')))
@@ -140,16 +141,7 @@ class BLERing:
           print(result)
 
   def crc16(self, data, offset=3):
-    genpoly = 0xA001
-    result = 0xFFFF
-    for i in range(offset, len(data)):
-      result = (result & 0xFFFF) ^ (data[i] & 0xFF)
-      for _ in range(8):
-        if (result & 0x0001) == 1:
-          result = (result >> 1) ^ genpoly
-        else:
-          result = result >> 1
-    return result & 0xFFFF
+    return crc16(data, offset)
 
   def check_data(self, data, type):
     crc = self.crc16(data)
@@ -199,9 +191,11 @@ class BLERing:
     data[4] = action_code
     return self.check_data(data, self.EDPT_OP_TOUCH_ACTION)
 
+  async def write_spp(self, data:bytearray):
+    await self.client.write_gatt_char(self.spp_write_characteristic, data)
+
   async def send(self, str):
-    await self.client.write_gatt_char(self.spp_write_characteristic, bytearray(str + '\r\n', encoding='utf-8'))
-    await asyncio.sleep(0.5)
+    await self.commands.send(bytearray(str + '\r\n', encoding='utf-8'), str.split('=')[0])
 
   async def get_battery(self):
     await self.client.write_gatt_char(self.notify_characteristic, self.query_power_sync_ts())
@@ -211,6 +205,9 @@ class BLERing:
     self.action_queue.put(action)
 
   async def connect(self, callback:FunctionType=None):
+    # a reconnect starts in text mode, the ACKs of the setup commands are not IMU frames
+    self.imu_mode = False
+    self.spp_framer = SPPFramer()
     self.client = BleakClient(self.address)
     await self.client.connect()
     if self.client.is_connected and callback is not None:
@@ -238,9 +235,9 @@ class BLERing:
 
     await self.send('ENSPP')
     await self.send('ENFAST')
-    await self.send('TPOPS=' + '0,0,0' if self.touch_callback is None else '1,1,1')
+    await self.send('TPOPS=' + ('0,0,0' if self.touch_callback is None else '1,1,1'))
     # for imu
-    if self.imu_callback != None:
+    if self.imu_callback != None or self.imu_batch_callback != None:
       await self.send('IMUARG=0,0,0,' + str(self.imu_freq))
       await self.send('ENDB6AX')
 
@@ -255,11 +252,13 @@ class BLERing:
       while not self.action_queue.empty():
         data = self.action_queue.get()
         if data == 'disconnect':
+          self.disconnect_requested = True
           await self.client.disconnect()
         else:
           await self.send(data)
       
       await asyncio.sleep(0.2)
+    self.connected = False
 
 
 def imu_callback(name, data):
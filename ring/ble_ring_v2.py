@@ -1,18 +1,32 @@
 import time
-import math
 import asyncio
 import struct
 from bleak import BleakScanner, BleakClient
 import queue
 from types import FunctionType
-from threading import Thread
 from typing import Tuple
 
 import sys
 import os
 
-sys.path.append(os.path.join(os.path.dirname(__file__), "."))
-from utils.imu_data import IMUData
+if __package__:
+    # imported as ring.ble_ring_v2, a top-level utils package may shadow ring/utils
+    from .utils.imu_data import IMUData, IMUBatch
+    from .utils.imu_decoder import decode_imu_packet
+    from .utils.gesture import TouchGestureDetector
+    from .utils.command_pipeline import CommandPipeline
+    from .utils.clock_sync import ClockSync, RING_TICK_RATE
+    from .utils.clock_store import ClockStore, default_clock_store
+    from .utils.notify_capture import write_notification
+else:
+    sys.path.append(os.path.join(os.path.dirname(__file__), "."))
+    from utils.imu_data import IMUData, IMUBatch
+    from utils.imu_decoder import decode_imu_packet
+    from utils.gesture import TouchGestureDetector
+    from utils.command_pipeline import CommandPipeline
+    from utils.clock_sync import ClockSync, RING_TICK_RATE
+    from utils.clock_store import ClockStore, default_clock_store
+    from utils.notify_capture import write_notification
 
 
 class NotifyProtocol:
@@ -33,6 +47,16 @@ class NotifyProtocol:
   
     GET_NFC = bytearray([0x00, 0x00, 0x82, 0x00])
 
+    # commands the ring answers with a notification of the same opcode
+    ANSWERED = {
+        (0x11, 0x00),  # software version
+        (0x11, 0x01),  # hardware version
+        (0x12, 0x00),  # battery level
+        (0x40, 0x06),  # first imu packet
+        (0x71, 0x01),  # first audio packet
+        (0x99, 0x00),  # time calibration
+    }
+
 
 class BLERing:
 
@@ -46,6 +70,10 @@ class BLERing:
         touch_callback=None,
         audio_callback=None,
         imu_freq=200.0,
+        imu_batch_callback=None,
+        clock_sync_interval: float = None,
+        clock_store: ClockStore = None,
+        capture_path: str = None,
     ):
         self.address = address
         self.index = index
@@ -58,6 +86,7 @@ class BLERing:
         self.touch_callback = touch_callback
         self.battery_callback = battery_callback
         self.imu_callback = imu_callback
+        self.imu_batch_callback = imu_batch_callback
         self.audio_callback = audio_callback
         self.acc_fsr = "0"
         self.gyro_fsr = "0"
@@ -65,23 +94,42 @@ class BLERing:
         self.client = None
         self.connected = False
         self.action_queue = queue.Queue()
+        self.commands = CommandPipeline(self.write_command)
+        self.command_index = 0
+        # enabled streams, restored by connect() after a reconnect
+        self.imu_enabled = True
+        self.audio_enabled = False
+        # set by disconnect(), tells utils/supervisor.py not to reconnect
+        self.disconnect_requested = False
         self.isack = False
 
         # touch related
-        self.taped = False
-        self.touch_history = []
-        self.is_holding = False
-        self.touch_type = -1
-        self.tap_thread = Thread(target=self.tap_func)
-        self.tap_thread.daemon = True
-        self.tap_thread.start()
+        self.gesture = TouchGestureDetector(
+            self.on_gesture, double_tap_interval=1.0, long_touch_time=1.0
+        )
         self.last_tap_time = 0
 
         # timestamp related
         self.ring_timestamps = []
         self.end_calib_timestamps = []
         self.start_calib_timestamps = []
+        self.start_indices = []
         self.end_indices = []
+        # online clock sync, probes are sent every clock_sync_interval seconds when set
+        self.clock_sync = ClockSync()
+        self.clock_sync_interval = clock_sync_interval
+        # models of earlier sessions, seeds the clock sync at connect and is refreshed by its probes;
+        # None loads the default store at connect, False does without one
+        self.use_clock_store = clock_store is not False
+        self.clock_store = clock_store if self.use_clock_store else None
+        self.clock_probes = {}
+        self.clock_sync_task = None
+
+        # raw notifications are appended to capture_path, see replay_ring.py
+        self.capture_path = capture_path
+        self.capture = None
+        # host time of the notification being handled, None for now (set by ReplayRing)
+        self.packet_time = None
 
     @property
     def name(self):
@@ -89,30 +137,11 @@ class BLERing:
 
     def on_disconnect(self, clients):
         # print('Disconnected')
-        pass
+        self.connected = False
 
-    def tap_func(self):
-        counter = -1
-        while True:
-            if self.taped:
-                if counter != -1:
-                    if self.touch_callback is not None:
-                        self.touch_callback(self.index, 1)  # double-tap
-                    counter = -1
-                else:
-                    counter = 0
-                self.taped = False
-            elif counter >= 0:
-                counter += 1
-                if counter == 100:  # tap interval
-                    if self.touch_type == 0:
-                        pass
-                    elif self.touch_type == 1:
-                        pass
-                    elif self.touch_type == 2:
-                        pass
-                    counter = -1
-            time.sleep(0.01)
+    def on_gesture(self, event: int):
+        if self.touch_callback is not None:
+            self.touch_callback(self.index, event)
 
     def get_touch_state(self, x, y, z):
         # 0: 000 -> 0
@@ -127,55 +156,31 @@ class BLERing:
         return [0, 1, 3, 2, 5, -1, 4, -2][x * 4 + y * 2 + z]
 
     def _detect_touch_events(self, data: bytearray) -> None:
-        new_touch = [
+        self.gesture.touch(
             self.get_touch_state(
                 1 if data[1] & 0x02 else 0,
                 1 if data[1] & 0x08 else 0,
                 1 if data[1] & 0x20 else 0,
-            ),
-            time.perf_counter(),
-        ]
-        self.touch_history.append(new_touch)
-        if new_touch[0] == 0:
-            if not self.is_holding and len(self.touch_history) > 1:
-                self.taped = True
-                if self.touch_history[-2][0] > self.touch_history[0][0]:  # down
-                    self.touch_type = 1
-                elif self.touch_history[-2][0] < self.touch_history[0][0]:  # up
-                    self.touch_type = 2
-                elif (
-                    self.touch_history[-2][-1] - self.touch_history[0][-1] < 0.1
-                ):  # tap
-                    self.touch_type = 0
-                else:
-                    self.touch_type = 0
-            elif self.is_holding:
-                if self.touch_callback is not None:
-                    self.touch_callback(self.index, 5)  # release
-            self.is_holding = False
-            self.touch_history.clear()
-        else:
-            if (
-                self.touch_history[-1][-1] - self.touch_history[0][-1] > 1
-                and not self.is_holding
-            ):
-                if self.touch_callback is not None:
-                    self.touch_callback(self.index, 2)  # long-touch
-                self.is_holding = True
+            )
+        )
 
     def _detect_double_tap_with_tap(self):
         double_tapped = False
-        if time.perf_counter() - self.last_tap_time < 0.5:
+        now = time.perf_counter() if self.packet_time is None else self.packet_time
+        if now - self.last_tap_time < 0.5:
             double_tapped = True
             if self.touch_callback is not None:
                 self.touch_callback(self.index, 1)  # double-tap
-        self.last_tap_time = time.perf_counter()
+        self.last_tap_time = now
         if double_tapped:
             self.last_tap_time = 0
 
     def notify_callback(self, sender, data: bytearray):
+        if self.capture is not None:
+            write_notification(self.capture, time.perf_counter(), data)
+        if self.commands.pending:
+            self.commands.on_response((data[2], data[3]), data[0] | (data[1] << 8), data)
         # print(len(data), data)
-        bias = self.gyro_bias
         if data[2] == 0x62 and data[3] == 0x1:
             print("呼吸灯结果")
         if data[2] == 0x62 and data[3] == 0x2:
@@ -191,58 +196,15 @@ class BLERing:
             print("Hardware version:", data[4:])
 
         if data[2] == 0x40 and data[3] == 0x06:
-            acc_scale = 32768 / 16 * (2 ** ((data[4] >> 2) & 3)) / 9.8
-            gyr_scale = 32768 / 2000 * (2 ** (data[4] & 3)) / (math.pi / 180)
             if len(data) > 20:
-                imu_data = []
-                head_length = 4 + len(data) % 2
-
-                imu_start_time = 0
-                imu_end_time = 0
-                if (len(data) - head_length) % 12 != 0:
-                    # end with 2 timestamps
-                    imu_start_time = struct.unpack("i", data[-8:-4])[0]
-                    imu_end_time = struct.unpack("i", data[-4:])[0]
-                    imu_packet_num = (len(data) - head_length - 8) // 12
-                else:
-                    imu_packet_num = (len(data) - head_length) // 12
-
-                for i in range(head_length, len(data), 12):
-                    if len(data) - i < 12:
-                        break
-                    acc_x, acc_y, acc_z = struct.unpack("hhh", data[i : i + 6])
-                    acc_x, acc_y, acc_z = (
-                        acc_x / acc_scale,
-                        acc_y / acc_scale,
-                        acc_z / acc_scale,
-                    )
-                    gyr_x, gyr_y, gyr_z = struct.unpack("hhh", data[i + 6 : i + 12])
-                    gyr_x, gyr_y, gyr_z = (
-                        gyr_x / gyr_scale,
-                        gyr_y / gyr_scale,
-                        gyr_z / gyr_scale,
-                    )
-                    if imu_start_time != 0 and imu_end_time != 0:
-                        timestamp = imu_start_time + (
-                            (imu_end_time - imu_start_time) / (imu_packet_num - 1)
-                        ) * ((i - head_length) // 12)
-                    else:
-                        timestamp = time.perf_counter()
-                    imu = IMUData(
-                        -1 * acc_y,
-                        acc_z,
-                        -1 * acc_x,
-                        -1 * gyr_y - bias[0],
-                        gyr_z - bias[1],
-                        -1 * gyr_x - bias[2],
-                        timestamp,
-                    )
-                    imu_data.append(imu)
-
-                # IMU callback function
+                imu_data, timestamps, host_time = decode_imu_packet(data, self.gyro_bias, self.clock_sync, self.packet_time)
+
+                # IMU callback function, host_time tells ring ticks from host seconds
                 if self.imu_callback is not None:
-                    for i, imu in enumerate(imu_data):
-                        self.imu_callback(self.index, imu)
+                    for imu, timestamp in zip(imu_data.tolist(), timestamps.tolist()):
+                        self.imu_callback(self.index, IMUData(*imu, timestamp, host_time))
+                if self.imu_batch_callback is not None:
+                    self.imu_batch_callback(self.index, IMUBatch(imu_data, timestamps, host_time))
 
         elif data[2] == 0x61 and data[3] == 0x0:
             pass
@@ -266,6 +228,12 @@ class BLERing:
 
         elif data[2] == 0x99 and data[3] == 0x0:
             # timestamp
+            send_time = self.clock_probes.pop(data[0] | (data[1] << 8), None)
+            if send_time is not None:
+                ring_time = struct.unpack("i", data[4:8])[0] / RING_TICK_RATE
+                if self.clock_sync.update(ring_time, send_time, time.perf_counter()) and self.clock_store is not None:
+                    self.clock_store.update(self.address, self.clock_sync)
+                return
             self.end_calib_timestamps.append(time.perf_counter())
             self.end_indices.append(struct.unpack("<H", data[0:2])[0])
             self.ring_timestamps.append(struct.unpack("i", data[4:])[0] / 16384)
@@ -294,21 +262,33 @@ class BLERing:
             print(f"Failed to connect to {self.address}")
             return
 
+        if self.clock_store is None and self.use_clock_store:
+            self.clock_store = default_clock_store()
+        if self.clock_store is not None and not self.clock_sync.ready:
+            if self.clock_store.seed(self.address, self.clock_sync):
+                print(f"Ring {self.index} clock model loaded")
+
+        if self.capture_path is not None and self.capture is None:
+            # kept open across reconnects
+            self.capture = open(self.capture_path, "ab", buffering=1 << 16)
         print("Start notify")
         await self.client.start_notify(
             NotifyProtocol.READ_CHARACTERISTIC, self.notify_callback
         )
-        time.sleep(0.5)
-        await self.client.write_gatt_char(
-            NotifyProtocol.WRITE_CHARACTERISTIC, NotifyProtocol.OPEN_6AXIS_IMU
-        )
-        await self.client.write_gatt_char(
-            NotifyProtocol.WRITE_CHARACTERISTIC, NotifyProtocol.GET_BATTERY_LEVEL
-        )
+        # pipelined, a command sent before notify has settled is retried
+        commands = []
+        if self.imu_enabled:
+            commands.append(self.send_command(NotifyProtocol.OPEN_6AXIS_IMU))
+        if self.audio_enabled:
+            commands.append(self.send_command(NotifyProtocol.OPEN_MIC))
+        commands.append(self.send_command(NotifyProtocol.GET_BATTERY_LEVEL))
+        await asyncio.gather(*commands)
 
         if self.client.is_connected:
             print("Connected")
             self.connected = True
+            if self.clock_sync_interval is not None and self.clock_sync_task is None:
+                self.clock_sync_task = asyncio.ensure_future(self._clock_sync_loop())
             if callback is not None:
                 #   callback(self.index)
                 callback()
@@ -320,9 +300,21 @@ class BLERing:
         #         break
         #     await asyncio.sleep(2.0)
 
-    async def send_command(self, command: bytearray):
+    async def write_command(self, command: bytearray):
         await self.client.write_gatt_char(NotifyProtocol.WRITE_CHARACTERISTIC, command)
-        await asyncio.sleep(0.1)
+
+    async def send_command(self, command: bytearray, timeout: float = None, retries: int = None):
+        """Send a command with the next sequence index, returns the answer for NotifyProtocol.ANSWERED ones."""
+        self.command_index = (self.command_index + 1) & 0xFFFF
+        command = bytearray(command)
+        command[0:2] = self.command_index.to_bytes(2, byteorder="little")
+        opcode = (command[2], command[3])
+        if opcode not in NotifyProtocol.ANSWERED:
+            return await self.commands.send(command)
+        response = await self.commands.send(command, opcode, self.command_index, timeout, retries)
+        if response is None:
+            print(f"Ring {self.index}: command {command.hex()} was not answered")
+        return response
 
     async def calibrate_imu(self):
         await self.send_command(NotifyProtocol.CALIB_IMU)
@@ -331,18 +323,22 @@ class BLERing:
         print("Calibration done")
 
     async def open_audio(self):
+        self.audio_enabled = True
         await self.send_command(NotifyProtocol.OPEN_MIC)
         print("Audio opened")
     
     async def close_audio(self):
+        self.audio_enabled = False
         await self.send_command(NotifyProtocol.CLOSE_MIC)
         print("Audio closed")
 
     async def open_imu(self):
+        self.imu_enabled = True
         await self.send_command(NotifyProtocol.OPEN_6AXIS_IMU)
         print("IMU opened")
     
     async def close_imu(self):
+        self.imu_enabled = False
         await self.send_command(NotifyProtocol.CLOSE_6AXIS_IMU)
         print("IMU closed")
 
@@ -356,10 +352,48 @@ class BLERing:
         )
         end_time = time.perf_counter()
         self.start_calib_timestamps.append((start_time + end_time) / 2)
+        self.start_indices.append(index)
+
+    async def probe_clock(self):
+        """Send one CALIB_TIME probe for the online clock sync."""
+        self.command_index = (self.command_index + 1) & 0xFFFF
+        command = bytearray(NotifyProtocol.CALIB_TIME)
+        command[0:2] = self.command_index.to_bytes(2, byteorder="little")
+        index = self.command_index
+        start_time = time.perf_counter()
+        # unanswered probes are forgotten after a few seconds
+        for stale in [i for i, t in self.clock_probes.items() if t < start_time - 5]:
+            del self.clock_probes[stale]
+        # the answer may arrive before the write returns
+        self.clock_probes[index] = start_time
+        await self.commands.send(command)
+        if index in self.clock_probes:
+            self.clock_probes[index] = (start_time + time.perf_counter()) / 2
+
+    async def _clock_sync_loop(self):
+        try:
+            while not self.disconnect_requested:
+                if self.connected:
+                    try:
+                        await self.probe_clock()
+                    except Exception as e:
+                        print(f"Ring {self.index} clock probe failed: {e!r}")
+                await asyncio.sleep(self.clock_sync_interval)
+        finally:
+            self.clock_sync_task = None
 
     async def disconnect(self):
+        self.disconnect_requested = True
+        if self.clock_sync_task is not None:
+            self.clock_sync_task.cancel()
+        if self.clock_store is not None:
+            self.clock_store.update(self.address, self.clock_sync)
+            self.clock_store.save()
         await self.client.stop_notify(NotifyProtocol.READ_CHARACTERISTIC)
         await self.client.disconnect()
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
         print(f"Disconnected from {self.address}")
 
 
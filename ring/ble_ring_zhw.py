@@ -4,7 +4,8 @@ import asyncio
 import struct
 import queue
 
-from .utils.imu_data import IMUData
+from .utils.imu_data import IMUData, IMUBatch
+from .utils.crc import crc16
 
 from bleak import BleakScanner, BleakClient
 from types import FunctionType
@@ -36,6 +37,7 @@ class BLERing:
         battery_callback=None,
         touch_callback=None,
         imu_freq=200,
+        imu_batch_callback=None,
     ):
         self.address = address
         self.index = index
@@ -44,11 +46,14 @@ class BLERing:
         self.touch_callback = touch_callback
         self.battery_callback = battery_callback
         self.imu_callback = imu_callback
+        self.imu_batch_callback = imu_batch_callback
         self.acc_fsr = "0"
         self.gyro_fsr = "0"
         self.imu_freq = imu_freq
         self.client = None
         self.connected = False
+        # set by a 'disconnect' action, tells utils/supervisor.py not to reconnect
+        self.disconnect_requested = False
         self.notify_characteristic = "C1D02505-2D20-400A-95D2-6A2F7BCA0C25"
         self.action_queue = queue.Queue()
         self.isack = False
@@ -58,6 +63,7 @@ class BLERing:
         return "Ring" + str(self.index)
 
     def on_disconnect(self, clients):
+        self.connected = False
         print("Disconnected")
 
 
@@ -71,6 +77,7 @@ class BLERing:
                 print(f"Error: crc is wrong!")
                 return
             # imu data packet
+            imu_datas = []
             for i in range(8):
                 imu_frame = data[3 + i * 28 : 3 + (i + 1) * 28]
                 if len(imu_frame) < 28:
@@ -87,20 +94,16 @@ class BLERing:
                     struct.unpack("i", imu_frame[20:24])[0] / 1e3,
                     struct.unpack("I", imu_frame[24:28])[0] / 1e6 * 16384,
                 )
+                imu_datas.append(imu_data)
 
-                self.imu_callback(self.index, imu_data)
+            if self.imu_callback is not None:
+                for imu_data in imu_datas:
+                    self.imu_callback(self.index, imu_data)
+            if self.imu_batch_callback is not None and len(imu_datas) > 0:
+                self.imu_batch_callback(self.index, IMUBatch.from_list(imu_datas))
 
     def crc16(self, data, offset=3):
-        genpoly = 0xA001
-        result = 0xFFFF
-        for i in range(offset, len(data)):
-            result = (result & 0xFFFF) ^ (data[i] & 0xFF)
-            for _ in range(8):
-                if (result & 0x0001) == 1:
-                    result = (result >> 1) ^ genpoly
-                else:
-                    result = result >> 1
-        return result & 0xFFFF
+        return crc16(data, offset)
 
     def check_data(self, data, type):
         crc = self.crc16(data)
@@ -194,7 +197,7 @@ class BLERing:
         # await self.send("ENFAST")
         # await self.send("TPOPS=" + "0,0,0" if self.touch_callback is None else "1,1,1")
         # for imu
-        if self.imu_callback != None:
+        if self.imu_callback != None or self.imu_batch_callback != None:
             # await self.send("IMUARG=0,0,0," + str(self.imu_freq))
             # await self.send("ENDB6AX")
             await self.client.write_gatt_char(
@@ -212,11 +215,13 @@ class BLERing:
             while not self.action_queue.empty():
                 data = self.action_queue.get()
                 if data == "disconnect":
+                    self.disconnect_requested = True
                     await self.client.disconnect()
                 else:
                     await self.send(data)
 
             await asyncio.sleep(0.2)
+        self.connected = False
 
 
 def imu_callback(name, data):
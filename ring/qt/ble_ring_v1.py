@@ -1,14 +1,16 @@
 import time
 import asyncio
 import struct
-import socket
 import os
 import subprocess
 import queue
 
 from types import FunctionType
 
-from ..utils.imu_data import IMUData
+from ..utils.imu_data import IMUData, IMUBatch
+from ..utils.crc import crc16
+from ..utils.spp_framer import SPPFramer
+from ..utils.bridge_framer import BridgeFramer, BridgeProtocol, PrefixedBridgeFramer, kill_stale_bridges
 
 
 class BLERing:
@@ -37,14 +39,18 @@ class BLERing:
         touch_callback=None,
         imu_freq=200,
         port: int = 5566,
+        imu_batch_callback=None,
+        capture_path: str = None,
     ):
         self.address = address
         self.index = index
         self.imu_mode = True
-        self.raw_imu_data = bytearray()
+        self.spp_framer = SPPFramer()
+        self.bridge_framer = PrefixedBridgeFramer()
         self.touch_callback = touch_callback
         self.battery_callback = battery_callback
         self.imu_callback = imu_callback
+        self.imu_batch_callback = imu_batch_callback
         self.acc_fsr = "0"
         self.gyro_fsr = "0"
         self.imu_freq = imu_freq
@@ -53,6 +59,11 @@ class BLERing:
         self.action_queue = queue.Queue()
         self.isack = False
         self.port = port
+        # raw bridge stream is written here when set, for ring/qt/fake_bridge.py
+        self.capture_path = capture_path
+        # BLEData_dc.exe started by this ring
+        self.bridge_process = None
+        self.connect_callback = None
 
     @property
     def name(self):
@@ -115,58 +126,29 @@ class BLERing:
                 # print('op_type:', op_type, 'report_path:', report_path, 'action_code', action_code)
 
     def spp_notify_callback(self, sender, data: bytearray):
-        self.raw_imu_data.extend(data)
-        while len(self.raw_imu_data) > 36:
-
-            # searching for AA55
-            for i in range(len(self.raw_imu_data) - 1):
-                if self.raw_imu_data[i] == 0xAA and self.raw_imu_data[i + 1] == 0x55:
-                    self.raw_imu_data = self.raw_imu_data[i:]
-                    break
-            
-            if len(self.raw_imu_data) < 36:
-                break
-
-            # start of frame
-            imu_frame = self.raw_imu_data[:36]
-
-            # check crc
-            crc = self.crc16(imu_frame, offset=4)
-            try:
-                assert (crc & 0xFF) == imu_frame[2]
-                assert ((crc >> 8) & 0xFF) == imu_frame[3]
-            except:
-                # error crc, restart searching
-                print(f"Error: crc is wrong!", len(self.raw_imu_data))
-                self.raw_imu_data = self.raw_imu_data[1:]
-                continue
-
+        crc_error_count = self.spp_framer.crc_error_count
+        self.spp_framer.feed(data)
+        imu_datas = []
+        # frames are crc-checked memoryviews into the framer buffer
+        for imu_frame in self.spp_framer.frames():
             # send imu data
             imu_data = IMUData(
-                struct.unpack("f", imu_frame[4:8])[0],
-                struct.unpack("f", imu_frame[8:12])[0],
-                struct.unpack("f", imu_frame[12:16])[0],
-                struct.unpack("f", imu_frame[16:20])[0],
-                struct.unpack("f", imu_frame[20:24])[0],
-                struct.unpack("f", imu_frame[24:28])[0],
+                *struct.unpack_from("6f", imu_frame, 4),
                 #   struct.unpack("Q", imu_frame[28:36])[0]
                 time.time(),
             )
-            
-            self.imu_callback(self.index, imu_data)
-            self.raw_imu_data = self.raw_imu_data[36:]
+            imu_datas.append(imu_data)
+        if self.spp_framer.crc_error_count != crc_error_count:
+            print(f"Error: crc is wrong!", len(self.spp_framer))
+
+        if self.imu_callback is not None:
+            for imu_data in imu_datas:
+                self.imu_callback(self.index, imu_data)
+        if self.imu_batch_callback is not None and len(imu_datas) > 0:
+            self.imu_batch_callback(self.index, IMUBatch.from_list(imu_datas))
 
     def crc16(self, data, offset=3):
-        genpoly = 0xA001
-        result = 0xFFFF
-        for i in range(offset, len(data)):
-            result = (result & 0xFFFF) ^ (data[i] & 0xFF)
-            for _ in range(8):
-                if (result & 0x0001) == 1:
-                    result = (result >> 1) ^ genpoly
-                else:
-                    result = result >> 1
-        return result & 0xFFFF
+        return crc16(data, offset)
 
     def check_data(self, data, type):
         crc = self.crc16(data)
@@ -229,58 +211,62 @@ class BLERing:
 
     def launch(self):
         try:
-            subprocess.Popen(
+            self.bridge_process = subprocess.Popen(
                 [os.path.dirname(os.path.abspath(__file__)) + "\\ble_test_tools\\BLEData_dc.exe", str(self.port)]
             )
         except Exception as e:
             # print(e)
             ...
 
+    def stop_bridge(self):
+        # only this ring's bridge, the other rings keep theirs
+        if self.bridge_process is not None and self.bridge_process.poll() is None:
+            self.bridge_process.kill()
+        self.bridge_process = None
+
+    def on_bridge_packet(self, kind, packet):
+        if kind == BridgeFramer.SPP:
+            self.spp_notify_callback(None, packet)
+        elif kind == BridgeFramer.BLE:
+            self.ble_notify_callback(None, packet)
+        elif packet == "Disconnected":
+            self.connected = False
+            print("Ring Disconnected")
+            if self.connect_callback is not None:
+                self.connect_callback(self.index)
+        elif packet == "Connected":
+            self.connected = True
+            print("Ring Connected")
+            if self.connect_callback is not None:
+                self.connect_callback(self.index)
+        else:
+            print(packet)
+            self.address = packet
+
     async def connect(self, callback: FunctionType = None):
         self.connected = False
-        print("Listening", self.port)
-        server = socket.socket()
-        server.bind(("0.0.0.0", self.port))
-        server.listen(5)
-        self.kill("ble_test_tools.exe")
-        self.kill("BLEData_dc.exe")
-        print("Killed")
-        await asyncio.sleep(1)
-        self.launch()
-        print("Scanning")
-        # server.settimeout(12)
-        conn, addr = server.accept()
-        print("Accepted")
-        # callback()
-        while True:
-            data = conn.recv(1024)
-            while len(data) > 0:
-                if data[:2] in [b"\x59\x90", b"\xb1\xe0"]:
-                    packet_length = data[2]
-                    if data[:2] == b"\x59\x90":
-                        self.spp_notify_callback(None, data[3:packet_length + 3])
-                    elif data[:2] == b"\xb1\xe0":
-                        self.ble_notify_callback(None, data[3:packet_length + 3])
-                    if len(data) > packet_length + 3:
-                        data = data[packet_length + 3:]
-                        continue
-                    else:
-                        break
-                else:
-                    try:
-                        if data.decode("utf-8") == "Disconnected":
-                            self.connected = False
-                            print("Ring Disconnected")
-                            callback(self.index)
-                        elif data.decode("utf-8") == "Connected":
-                            self.connected = True
-                            print("Ring Connected")
-                            callback(self.index)
-                        elif ":" in data.decode("utf-8"):
-                            print(data.decode("utf-8"))
-                            self.address = data.decode("utf-8")
-                    except:
-                        pass
-                    break
-            await asyncio.sleep(0.0001)
-        self.kill("BLEData.exe")
+        self.connect_callback = callback
+        capture = open(self.capture_path, "wb") if self.capture_path is not None else None
+        server = None
+        try:
+            protocol = BridgeProtocol(self.bridge_framer, self.on_bridge_packet, capture)
+            server = await asyncio.get_running_loop().create_server(
+                lambda: protocol, "0.0.0.0", self.port
+            )
+            print("Listening", self.port)
+            kill_stale_bridges("ble_test_tools.exe", "BLEData_dc.exe")
+            print("Killed")
+            await asyncio.sleep(1)
+            self.launch()
+            print("Scanning")
+            await protocol.connected
+            server.close()
+            print("Accepted")
+            await protocol.closed
+            print("Bridge closed")
+        finally:
+            if server is not None:
+                server.close()
+            if capture is not None:
+                capture.close()
+            self.stop_bridge()
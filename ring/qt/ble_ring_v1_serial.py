@@ -3,7 +3,10 @@ import os
 import time
 import socket
 import struct
-from ..utils.imu_data import IMUData
+from ..utils.imu_data import IMUData, IMUBatch
+from ..utils.crc import crc16
+from ..utils.spp_framer import SPPFramer
+from ..utils.bridge_framer import PrefixedBridgeFramer
 import subprocess
 
 class BLERing():
@@ -32,14 +35,17 @@ class BLERing():
         touch_callback=None,
         imu_freq=200,
         port: int = 5566,
+        imu_batch_callback=None,
     ):
         self.address = address
         self.index = index
         self.imu_mode = False
-        self.raw_imu_data = bytearray()
+        self.spp_framer = SPPFramer()
+        self.bridge_framer = PrefixedBridgeFramer()
         self.touch_callback = touch_callback
         self.battery_callback = battery_callback
         self.imu_callback = imu_callback
+        self.imu_batch_callback = imu_batch_callback
         self.acc_fsr = "0"
         self.gyro_fsr = "0"
         self.imu_freq = imu_freq
@@ -56,58 +62,26 @@ class BLERing():
         print("Disconnected")
 
     def spp_notify_callback(self, sender, data: bytearray):
-        self.raw_imu_data.extend(data)
-        while len(self.raw_imu_data) > 36:
-
-            # searching for AA55
-            for i in range(len(self.raw_imu_data) - 1):
-                if self.raw_imu_data[i] == 0xAA and self.raw_imu_data[i + 1] == 0x55:
-                    self.raw_imu_data = self.raw_imu_data[i:]
-                    break
-            
-            if len(self.raw_imu_data) < 36:
-                break
-
-            # start of frame
-            imu_frame = self.raw_imu_data[:36]
-
-            # check crc
-            crc = self.crc16(imu_frame, offset=4)
-            try:
-                assert (crc & 0xFF) == imu_frame[2]
-                assert ((crc >> 8) & 0xFF) == imu_frame[3]
-            except:
-                # error crc, restart searching
-                # print(f"Error: crc is wrong!", len(self.raw_imu_data))
-                self.raw_imu_data = self.raw_imu_data[1:]
-                continue
-
+        self.spp_framer.feed(data)
+        imu_datas = []
+        # frames are crc-checked memoryviews into the framer buffer
+        for imu_frame in self.spp_framer.frames():
             # send imu data
             imu_data = IMUData(
-                struct.unpack("f", imu_frame[4:8])[0],
-                struct.unpack("f", imu_frame[8:12])[0],
-                struct.unpack("f", imu_frame[12:16])[0],
-                struct.unpack("f", imu_frame[16:20])[0],
-                struct.unpack("f", imu_frame[20:24])[0],
-                struct.unpack("f", imu_frame[24:28])[0],
+                *struct.unpack_from("6f", imu_frame, 4),
                 #   struct.unpack("Q", imu_frame[28:36])[0]
                 int(time.time() * 1e3),
             )
-            
-            self.imu_callback(self.index, imu_data)
-            self.raw_imu_data = self.raw_imu_data[36:]
+            imu_datas.append(imu_data)
+
+        if self.imu_callback is not None:
+            for imu_data in imu_datas:
+                self.imu_callback(self.index, imu_data)
+        if self.imu_batch_callback is not None and len(imu_datas) > 0:
+            self.imu_batch_callback(self.index, IMUBatch.from_list(imu_datas))
 
     def crc16(self, data, offset=3):
-        genpoly = 0xA001
-        result = 0xFFFF
-        for i in range(offset, len(data)):
-            result = (result & 0xFFFF) ^ (data[i] & 0xFF)
-            for _ in range(8):
-                if (result & 0x0001) == 1:
-                    result = (result >> 1) ^ genpoly
-                else:
-                    result = result >> 1
-        return result & 0xFFFF
+        return crc16(data, offset)
 
 
     def ble_notify_callback(self, sender, data):
@@ -231,37 +205,26 @@ class BLERing():
         conn, addr = server.accept()
         print('Accepted')
         # callback()
+        framer = self.bridge_framer
         while True:
-            data = conn.recv(1024)
-            while len(data) > 0:
-                if data[:2] in [b"\x59\x90", b"\xb1\xe0"]:
-                    packet_length = data[2]
-                    if data[:2] == b"\x59\x90":
-                        self.spp_notify_callback(None, data[3:packet_length + 3])
-                    elif data[:2] == b"\xb1\xe0":
-                        self.ble_notify_callback(None, data[3:packet_length + 3])
-                    if len(data) > packet_length + 3:
-                        data = data[packet_length + 3:]
-                        continue
-                    else:
-                        break
+            if framer.recv_from(conn) == 0:
+                print('Bridge closed')
+                break
+            for kind, packet in framer.packets():
+                if kind == framer.SPP:
+                    self.spp_notify_callback(None, packet)
+                elif kind == framer.BLE:
+                    self.ble_notify_callback(None, packet)
+                elif packet == "Disconnected":
+                    self.connected = False
+                    print("Ring Disconnected")
+                    if callback is not None:
+                        callback()
+                elif packet == "Connected":
+                    self.connected = True
+                    print("Ring Connected")
+                    if callback is not None:
+                        callback()
                 else:
-                    try:
-                        decoded_data = data.decode('utf-8')
-                        if decoded_data == "Disconnected":
-                            self.connected = False
-                            print("Ring Disconnected")
-                            callback()
-                            break
-                        elif decoded_data == "Connected":
-                            self.connected = True
-                            print("Ring Connected")
-                            callback()
-                            break
-                        elif ":" in decoded_data:
-                            print(decoded_data)
-                            self.address = decoded_data
-                            break
-                    except:
-                        pass
-                    break
+                    print(packet)
+                    self.address = packet
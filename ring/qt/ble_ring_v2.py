@@ -1,13 +1,13 @@
 import math
 import os
 import time
-import socket
 import struct
 import asyncio
 import subprocess
-from threading import Thread
 
-from ..utils.imu_data import IMUData
+from ..utils.imu_data import IMUData, IMUBatch
+from ..utils.gesture import TouchGestureDetector
+from ..utils.bridge_framer import BridgeFramer, BridgeProtocol, NotifyBridgeFramer, kill_stale_bridges
 
 class BLERing():
     def __init__(
@@ -19,6 +19,8 @@ class BLERing():
         touch_callback=None,
         imu_freq=200,
         port: int = 5566,
+        imu_batch_callback=None,
+        capture_path: str = None,
     ):
         self.address = address
         self.index = index
@@ -27,6 +29,7 @@ class BLERing():
         self.touch_callback = touch_callback
         self.battery_callback = battery_callback
         self.imu_callback = imu_callback
+        self.imu_batch_callback = imu_batch_callback
         self.acc_fsr = "0"
         self.gyro_fsr = "0"
         self.imu_freq = imu_freq
@@ -37,43 +40,24 @@ class BLERing():
         self.hold = False
         self.start_touch_time = 0
         self.port = port
+        # raw bridge stream is written here when set, for ring/qt/fake_bridge.py
+        self.capture_path = capture_path
+        self.connect_callback = None
+        # BLEData.exe started by this ring
+        self.bridge_process = None
 
         # touch related
-        self.taped = False
-        self.touch_history = []
-        self.holding_num = 0
-        self.last_hold_time = 0
-        self.touch_type = -1
-        self.tap_thread = Thread(target=self.tap_func)
-        self.tap_thread.daemon = True
-        self.tap_thread.start()
+        self.gesture = TouchGestureDetector(
+            self.on_gesture, double_tap_interval=0.5, long_touch_time=1.0,
+            repeat_long_touch=True, touch_timeout=0.5,
+        )
         self.package_length = 125
+        self.bridge_framer = NotifyBridgeFramer(self.package_length)
 
 
-    def tap_func(self):
-        counter = -1
-        while True:
-            if self.taped:
-                if counter != -1:
-                    self.touch_callback(self.index, 1) # double-tap
-                    counter = -1
-                else:
-                    counter = 0
-                self.taped = False
-            elif counter >= 0:
-                counter += 1
-                if counter == 50:  # tap interval
-                    if self.touch_type == 0:
-                        # self.touch_callback(self.index, 0) # tap
-                        pass
-                    elif self.touch_type == 1:
-                        # self.touch_callback(self.index, 4) # touch-down
-                        pass
-                    elif self.touch_type == 2:
-                        # self.touch_callback(self.index, 3) # touch-up
-                        pass
-                    counter = -1
-            time.sleep(0.01)
+    def on_gesture(self, event: int):
+        if self.touch_callback is not None:
+            self.touch_callback(self.index, event)
 
     def get_touch_state(self, x, y, z):
         # 0: 000 -> 0
@@ -88,47 +72,15 @@ class BLERing():
         return [0, 1, 3, 2, 5, -1, 4, -2][x * 4 + y * 2 + z]
     
     def _detect_touch_events(self, data: bytearray) -> None:
-        new_touch = [
+        self.gesture.touch(
             self.get_touch_state(
                 1 if data[1] & 0x02 else 0,
                 1 if data[1] & 0x08 else 0,
                 1 if data[1] & 0x20 else 0,
-            ),
-            time.time(),
-        ]
-        self.touch_history.append(new_touch)
-        if new_touch[0] == 0:
-            if self.holding_num == 0 and len(self.touch_history) > 1:
-                self.taped = True
-                if self.touch_history[-2][0] > self.touch_history[0][0]: # down
-                    self.touch_type = 1
-                elif self.touch_history[-2][0] < self.touch_history[0][0]: # up
-                    self.touch_type = 2
-                elif self.touch_history[-2][-1] - self.touch_history[0][-1] < 0.1: # tap
-                    self.touch_type = 0
-                else:
-                    self.touch_type = 0
-            elif self.holding_num > 0:
-                self.touch_callback(self.index, 5) # release
-            self.holding_num = 0
-            self.touch_history.clear()
-        else:
-            if (
-                self.touch_history[-1][-1] - self.touch_history[0][-1] > 1
-                # and not self.is_holding
-            ):
-                self.last_hold_time = time.time()
-                self.holding_num += 1
-                if self.holding_num > 2:
-                    self.touch_callback(self.index, 2) # long-touch
+            )
+        )
 
     def notify_callback(self, data: bytearray):
-        if len(self.touch_history) > 0 and time.time() - self.touch_history[-1][-1] > 0.5:
-            # error long-touch
-            if self.holding_num > 2:
-                self.touch_callback(self.index, 5) # release
-            self.holding_num = 0
-            self.touch_history.clear()
         if data[2] == 0x40 and data[3] == 0x06:
             if len(data) >= self.package_length:
                 imu_datas = []
@@ -154,27 +106,24 @@ class BLERing():
                     )
                     imu_datas.append(imu_data)
                 imu_datas[4].gyr_z = (imu_datas[3].gyr_z + imu_datas[5].gyr_z) / 2
-                for i, imu_data in enumerate(imu_datas):
-                    self.imu_callback(self.index, imu_data)
-                    # print(round(acc_x, 2), round(acc_y, 2), round(acc_z, 2), round(gyr_x, 2), round(gyr_y, 2), round(gyr_z, 2))
-                if len(data) > self.package_length:
-                    self.notify_callback(data[self.package_length:])
+                if self.imu_callback is not None:
+                    for i, imu_data in enumerate(imu_datas):
+                        self.imu_callback(self.index, imu_data)
+                        # print(round(acc_x, 2), round(acc_y, 2), round(acc_z, 2), round(gyr_x, 2), round(gyr_y, 2), round(gyr_z, 2))
+                if self.imu_batch_callback is not None:
+                    self.imu_batch_callback(self.index, IMUBatch.from_list(imu_datas))
                 
         elif data[2] == 0x61 and data[3] == 0x0:
             # self.touch_callback(self.index, data[4])
             # print("Touch", data[4])
             # print(f"t610 len: {len(data)} {time.time()}")
             # print(' '.join(f'0x{byte:02x}' for byte in data))
-            if len(data) > 5:
-                self.notify_callback(data[5:])
-            # pass
+            pass
 
         elif data[2] == 0x61 and data[3] == 0x1 and len(data) >= 23:
             # print(f"touch len: {len(data)} {time.time()}")
             # print(' '.join(f'0x{byte:02x}' for byte in data))
             self._detect_touch_events(data[5:])
-            if len(data) > 23:
-                self.notify_callback(data[23:])
         else:
             pass
             # print("in else:")
@@ -238,46 +187,58 @@ class BLERing():
 
     def launch(self):
         try:
-            subprocess.Popen([os.path.dirname(os.path.abspath(__file__)) + "\\ble_test_tools\\BLEData.exe", str(self.port)])
+            self.bridge_process = subprocess.Popen([os.path.dirname(os.path.abspath(__file__)) + "\\ble_test_tools\\BLEData.exe", str(self.port)])
         except Exception as e:
             # print(e)
             ...
+
+    def stop_bridge(self):
+        # only this ring's bridge, the other rings keep theirs
+        if self.bridge_process is not None and self.bridge_process.poll() is None:
+            self.bridge_process.kill()
+        self.bridge_process = None
+    def on_bridge_packet(self, kind, packet):
+        if kind == BridgeFramer.NOTIFY:
+            self.notify_callback(packet)
+        elif packet == 'Disconnected':
+            self.connected = False
+            print("Ring Disconnected")
+            if self.connect_callback is not None:
+                self.connect_callback(self.index)
+        elif packet == 'Connected':
+            self.connected = True
+            print("Ring Connected")
+            if self.connect_callback is not None:
+                self.connect_callback(self.index)
+        else:
+            print(packet)
+            self.address = packet
+
     async def connect(self, callback = None):
         self.connected = False
-        print('Listening', self.port)
-        server = socket.socket()
-        server.bind(('0.0.0.0', self.port))
-        server.listen(5)
-        self.kill('ble_test_tools.exe')
-        self.kill('BLEData.exe')
-        print("Killed")
-        await asyncio.sleep(1)
-        self.launch()
-        print('Scanning')
-        # server.settimeout(12)
-        conn, addr = server.accept()
-        print('Accepted')
-        # callback()
-        while True:
-            data = conn.recv(1024)
-            try:
-                if (data.decode('utf-8') == 'Disconnected'):
-                    self.connected = False
-                    print("Ring Disconnected")
-                    callback(self.index)
-                    continue
-                elif (data.decode('utf-8') == 'Connected'):
-                    self.connected = True
-                    print("Ring Connected")
-                    callback(self.index)
-                    continue
-                elif (":" in data.decode('utf-8')):
-                    print(data.decode('utf-8'))
-                    self.address = data.decode('utf-8')
-                    continue
-            except:
-                pass
-            self.notify_callback(data)
-            await asyncio.sleep(0.0001)
-        self.kill('BLEData.exe')
+        self.connect_callback = callback
+        capture = open(self.capture_path, 'wb') if self.capture_path is not None else None
+        server = None
+        try:
+            protocol = BridgeProtocol(self.bridge_framer, self.on_bridge_packet, capture)
+            server = await asyncio.get_running_loop().create_server(
+                lambda: protocol, '0.0.0.0', self.port
+            )
+            print('Listening', self.port)
+            kill_stale_bridges('ble_test_tools.exe', 'BLEData.exe')
+            print("Killed")
+            await asyncio.sleep(1)
+            self.launch()
+            print('Scanning')
+            await protocol.connected
+            server.close()
+            print('Accepted')
+            await protocol.closed
+            print('Bridge closed')
+        finally:
+            if server is not None:
+                server.close()
+            if capture is not None:
+                capture.close()
+            self.stop_bridge()
             
\ No newline at end of file
@@ -4,10 +4,11 @@ import sys
 import time
 import socket
 import struct
-from threading import Thread
 import subprocess
 
-from ..utils.imu_data import IMUData
+from ..utils.imu_data import IMUData, IMUBatch
+from ..utils.gesture import TouchGestureDetector
+from ..utils.bridge_framer import NotifyBridgeFramer
 
 class BLERing():
     def __init__(
@@ -19,6 +20,7 @@ class BLERing():
         touch_callback=None,
         imu_freq=200,
         port: int = 5566,
+        imu_batch_callback=None,
     ):
         self.address = address
         self.index = index
@@ -26,6 +28,7 @@ class BLERing():
         self.touch_callback = touch_callback
         self.battery_callback = battery_callback
         self.imu_callback = imu_callback
+        self.imu_batch_callback = imu_batch_callback
         self.acc_fsr = "0"
         self.gyro_fsr = "0"
         self.imu_freq = imu_freq
@@ -38,16 +41,13 @@ class BLERing():
         self.port = port
 
         # touch related
-        self.taped = False
-        self.touch_history = []
-        self.holding_num = 0
-        self.last_hold_time = 0
-        self.touch_type = -1
-        self.tap_thread = Thread(target=self.tap_func)
-        self.tap_thread.daemon = True
-        self.tap_thread.start()
+        self.gesture = TouchGestureDetector(
+            self.on_gesture, double_tap_interval=0.5, long_touch_time=1.0,
+            repeat_long_touch=True, tap_events=(TouchGestureDetector.TAP,),
+        )
         self.last_tap_time = 0
         self.package_length = 133
+        self.bridge_framer = NotifyBridgeFramer(self.package_length)
 
         # timestamp related
         self.ring_timestamps = []
@@ -55,30 +55,9 @@ class BLERing():
         self.start_calib_timestamps = []
 
 
-    def tap_func(self):
-        counter = -1
-        while True:
-            if self.taped:
-                if counter != -1:
-                    self.touch_callback(self.index, 1) # double-tap
-                    counter = -1
-                else:
-                    counter = 0
-                self.taped = False
-            elif counter >= 0:
-                counter += 1
-                if counter == 50:  # tap interval
-                    if self.touch_type == 0:
-                        self.touch_callback(self.index, 0) # tap
-                        pass
-                    elif self.touch_type == 1:
-                        # self.touch_callback(self.index, 4) # touch-down
-                        pass
-                    elif self.touch_type == 2:
-                        # self.touch_callback(self.index, 3) # touch-up
-                        pass
-                    counter = -1
-            time.sleep(0.01)
+    def on_gesture(self, event: int):
+        if self.touch_callback is not None:
+            self.touch_callback(self.index, event)
 
     def get_touch_state(self, x, y, z):
         # 0: 000 -> 0
@@ -93,41 +72,14 @@ class BLERing():
         return [0, 1, 3, 2, 5, -1, 4, -2][x * 4 + y * 2 + z]
     
     def _detect_touch_events(self, data) -> None:
-        new_touch = [
+        self.gesture.touch(
             self.get_touch_state(
                 1 if data[1] & 0x02 else 0,
                 1 if data[1] & 0x08 else 0,
                 1 if data[1] & 0x20 else 0,
-            ),
-            time.time(),
-        ]
-        self.touch_history.append(new_touch)
-        if new_touch[0] == 0:
-            if self.holding_num == 0 and len(self.touch_history) > 1:
-                self.taped = True
-                if self.touch_history[-2][0] > self.touch_history[0][0]: # down
-                    self.touch_type = 1
-                elif self.touch_history[-2][0] < self.touch_history[0][0]: # up
-                    self.touch_type = 2
-                elif self.touch_history[-2][-1] - self.touch_history[0][-1] < 0.1: # tap
-                    self.touch_type = 0
-                else:
-                    self.touch_type = 0
-            elif self.holding_num > 0:
-                self.touch_callback(self.index, 5) # release
-            self.holding_num = 0
-            self.touch_history.clear()
-        else:
-            if (
-                self.touch_history[-1][-1] - self.touch_history[0][-1] > 1
-                # and not self.is_holding
-            ):
-                self.last_hold_time = time.time()
-                self.holding_num += 1
-                if self.holding_num > 2:
-                    self.touch_callback(self.index, 2) # long-touch
+            )
+        )
 
-    
     def _detect_double_tap_with_tap(self):
         double_tapped = False
         if time.perf_counter() - self.last_tap_time < 0.5:
@@ -154,9 +106,9 @@ class BLERing():
         if data[2] == 0x10 and data[3] == 0x0:
             print(data[4])
         if data[2] == 0x11 and data[3] == 0x0:
-            print('Software version:', data[4:])
+            print('Software version:', bytes(data[4:]))
         if data[2] == 0x11 and data[3] == 0x1:
-            print('Hardware version:', data[4:])
+            print('Hardware version:', bytes(data[4:]))
         
         if data[2] == 0x40 and data[3] == 0x06:
             acc_scale = 32768/16 * (2 ** ((data[4] >> 2) & 3)) / 9.8
@@ -193,9 +145,8 @@ class BLERing():
                     for i, imu_data in enumerate(imu_datas):
                         self.imu_callback(self.index, imu_data)
                         # print(round(acc_x, 2), round(acc_y, 2), round(acc_z, 2), round(gyr_x, 2), round(gyr_y, 2), round(gyr_z, 2))
-                
-                if len(data) > self.package_length:
-                    self.notify_callback(data[self.package_length:])
+                if self.imu_batch_callback is not None:
+                    self.imu_batch_callback(self.index, IMUBatch.from_list(imu_datas))
                 
         elif data[2] == 0x61 and data[3] == 0x0:
             pass
@@ -212,14 +163,10 @@ class BLERing():
             else:
                 if self.touch_callback is not None:
                     self.touch_callback(self.index, data[4])
-            if len(data) > 5:
-                self.notify_callback(data[5:])
 
         elif data[2] == 0x12 and data[3] == 0x0:
             battery_level = data[4]
             print(f"Ring {self.index} battery level: {battery_level}")
-            if len(data) > 5:
-                self.notify_callback(data[5:])
                 
         elif data[2] == 0x99 and data[3] == 0x0:
             # timestamp
@@ -261,29 +208,27 @@ class BLERing():
         conn, addr = server.accept()
         print('Accepted')
         # callback()
+        framer = self.bridge_framer
         while True:
-            data = conn.recv(1024)
-            # print(data)
-            try:
-                decoded_data = data.decode('utf-8')
-                if (decoded_data == 'Disconnected'):
+            if framer.recv_from(conn) == 0:
+                print('Bridge closed')
+                break
+            for kind, packet in framer.packets():
+                if kind == framer.NOTIFY:
+                    self.notify_callback(packet)
+                elif packet == 'Disconnected':
                     self.connected = False
                     print("Ring Disconnected")
-                    callback()
-                    continue
-                elif (decoded_data == 'Connected'):
+                    if callback is not None:
+                        callback()
+                elif packet == 'Connected':
                     self.connected = True
                     print("Ring Connected")
-                    callback()
-                    continue
-                elif (":" in decoded_data):
-                    print(decoded_data)
-                    self.address = decoded_data
-                    continue
-            except Exception as e:
-                # print(e)
-                pass
-            self.notify_callback(data)
+                    if callback is not None:
+                        callback()
+                else:
+                    print(packet)
+                    self.address = packet
             # time.sleep(0.0001)
         self.kill('BLEData.exe')
             
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import random
+import struct
+import asyncio
+import argparse
+import subprocess
+
+from .ble_ring_v2 import BLERing
+
+
+def synthesize_v2_stream(packet_num: int, package_length: int = 125) -> bytes:
+    """Bridge stream of packet_num v2 IMU notifications (10 samples each) framed like BLEData.exe."""
+    stream = bytearray(b"Connected")
+    sample_num = (package_length - 5) // 12
+    for i in range(packet_num):
+        packet = bytearray(struct.pack("<HBBB", i & 0xFFFF, 0x40, 0x06, 0x00))
+        for j in range(sample_num):
+            packet += struct.pack("<6h", 0, 0, 1000, 10, 20, 30)
+        packet += bytes(package_length - len(packet))
+        stream += packet
+    return bytes(stream)
+
+
+async def replay(port: int, stream: bytes, speed: float = 0, packet_length: int = 125, host: str = "127.0.0.1"):
+    """Send a captured bridge stream to a ring listening on port, as the bridge would.
+
+    The stream is written in randomly sized chunks so the ring sees merged and split
+    packets. With speed > 0 the stream is paced to speed x 200 Hz IMU packets of 10
+    samples, otherwise it is sent as fast as possible.
+    """
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            break
+        except ConnectionRefusedError:
+            await asyncio.sleep(0.1)
+    # 200 Hz IMU, 10 samples per packet
+    packet_rate = 20 * speed
+    start_time = time.perf_counter()
+    sent = 0
+    while sent < len(stream):
+        size = random.randint(1, 4 * packet_length)
+        writer.write(stream[sent : sent + size])
+        sent += size
+        if packet_rate > 0:
+            delay = start_time + sent / packet_length / packet_rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _watch_bridges(bridges: list):
+    # fail as soon as a fake bridge dies, its ring would wait for it forever
+    while True:
+        for bridge in bridges:
+            code = bridge.poll()
+            if code is not None and code != 0:
+                raise RuntimeError(f"Fake bridge {' '.join(bridge.args[1:])} exited with {code}")
+        await asyncio.sleep(0.1)
+
+
+async def bench(ring_num: int, packet_num: int, base_port: int, timeout: float = 60.0, verbose: bool = True):
+    """Connect ring_num qt v2 rings in one event loop, each fed by its own fake bridge process.
+
+    Returns the number of IMU samples every ring received and the seconds from
+    the first sample to the end of the last stream. Raises RuntimeError
+    when a bridge process exits with an error and TimeoutError when the rings
+    have not received their streams within timeout seconds.
+    """
+    counts = [0] * ring_num
+    first_sample_time = []
+
+    def imu_batch_callback(index, batch):
+        if not first_sample_time:
+            first_sample_time.append(time.perf_counter())
+        counts[index] += len(batch)
+
+    rings = [
+        BLERing("", i, port=base_port + i, imu_batch_callback=imu_batch_callback)
+        for i in range(ring_num)
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    bridges = [
+        subprocess.Popen(
+            [sys.executable, "-m", "ring.qt.fake_bridge", "--port", str(ring.port), "--packets", str(packet_num)],
+            cwd=root,
+            stdout=None if verbose else subprocess.DEVNULL,
+        )
+        for ring in rings
+    ]
+    connect = asyncio.gather(*[ring.connect() for ring in rings])
+    watch = asyncio.ensure_future(_watch_bridges(bridges))
+    try:
+        done, _ = await asyncio.wait({connect, watch}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if watch in done:
+            watch.result()
+        if connect not in done:
+            raise TimeoutError(f"{ring_num} rings did not receive their streams within {timeout} s")
+        connect.result()
+    finally:
+        watch.cancel()
+        connect.cancel()
+        for bridge in bridges:
+            if bridge.poll() is None:
+                bridge.kill()
+            bridge.wait()
+    elapsed = time.perf_counter() - first_sample_time[0] if first_sample_time else 0.0
+    if verbose and elapsed > 0:
+        total = sum(counts)
+        print(f"{ring_num} rings: {total} samples in {elapsed:.2f} s, {total / elapsed:.0f} samples/s in total")
+        for ring, count in zip(rings, counts):
+            framer = ring.bridge_framer
+            print(f"  ring {ring.index}: {count} samples, {framer.packet_count} packets, {framer.resync_count} resyncs, {framer.discarded_bytes} bytes discarded")
+    return counts, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5566)
+    parser.add_argument("--capture", type=str, default=None, help="raw bridge stream recorded with BLERing(capture_path=...)")
+    parser.add_argument("--packets", type=int, default=2000, help="synthetic IMU packets to send when no capture is given")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed relative to real time, 0 for as fast as possible")
+    parser.add_argument("--bench", type=int, default=0, help="run the given number of rings against fake bridges")
+    args = parser.parse_args()
+    if args.bench > 0:
+        asyncio.run(bench(args.bench, args.packets, args.port))
+    else:
+        if args.capture is not None:
+            with open(args.capture, "rb") as f:
+                stream = f.read()
+        else:
+            stream = synthesize_v2_stream(args.packets)
+        asyncio.run(replay(args.port, stream, args.speed))
@@ -0,0 +1,41 @@
+import sys
+import socket
+import asyncio
+import subprocess
+
+import pytest
+
+from ring.qt.fake_bridge import bench, _watch_bridges
+
+RING_NUM = 8
+PACKET_NUM = 500
+# 10 samples per v2 IMU packet
+SAMPLES_PER_PACKET = 10
+# 200 Hz per ring
+REAL_TIME_RATE = 200
+
+
+def free_ports(count: int) -> int:
+    # first of count consecutive ports nobody listens on
+    for base in range(42000, 60000, count):
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as s:
+                    s.bind(("0.0.0.0", port))
+            return base
+        except OSError:
+            continue
+    pytest.skip("no free ports")
+
+
+def test_eight_rings_throughput():
+    counts, elapsed = asyncio.run(bench(RING_NUM, PACKET_NUM, free_ports(RING_NUM), timeout=60, verbose=False))
+    assert counts == [PACKET_NUM * SAMPLES_PER_PACKET] * RING_NUM
+    # every ring is decoded faster than it streams in real time
+    assert sum(counts) / elapsed > RING_NUM * REAL_TIME_RATE
+
+
+def test_dead_bridge_fails_fast():
+    bridge = subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+    with pytest.raises(RuntimeError, match="exited with 3"):
+        asyncio.run(asyncio.wait_for(_watch_bridges([bridge]), 10))
@@ -0,0 +1,95 @@
+import time
+import asyncio
+import argparse
+from types import FunctionType
+
+from .ble_ring_v2 import BLERing
+from .utils.gesture import GestureEngine
+from .utils.notify_capture import read_notifications
+
+
+class ReplayRing(BLERing):
+    """BLERing that replays notifications captured with BLERing(capture_path=...).
+
+    Every captured notification goes through the real notify_callback, so the
+    IMU, touch and audio callbacks see what they saw live. Samples without
+    ring timestamps get the captured host time, and touch gestures are timed
+    on it as well, so a replay is deterministic at any speed. speed=1.0 replays
+    in real time, N replays N times faster and None as fast as possible.
+    connect() returns once the capture is used up or disconnect() is called,
+    commands sent to the ring are dropped.
+    """
+
+    # notifications between yields to the event loop when replaying as fast as possible
+    YIELD_EVERY = 256
+
+    def __init__(self, path: str, index: int = 0, speed: float = 1.0, **kwargs):
+        super().__init__(f"replay:{path}", index, **kwargs)
+        self.path = path
+        self.speed = speed
+        # gestures run on the captured clock instead of a timer thread
+        self.gesture.engine = GestureEngine(clock=lambda: self.packet_time, threaded=False)
+        # statistics of the last replay
+        self.replayed_count = 0
+        self.replay_duration = 0.0
+
+    async def write_command(self, command: bytearray):
+        pass
+
+    async def connect(self, callback: FunctionType = None):
+        self.disconnect_requested = False
+        self.connected = True
+        if callback is not None:
+            callback()
+        self.replayed_count = 0
+        start = time.perf_counter()
+        first_time = None
+        try:
+            for host_time, data in read_notifications(self.path):
+                if self.disconnect_requested:
+                    break
+                if first_time is None:
+                    first_time = host_time
+                if self.speed is not None:
+                    delay = start + (host_time - first_time) / self.speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                elif self.replayed_count % self.YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+                self.packet_time = host_time
+                self.gesture.engine.run_pending(host_time)
+                self.notify_callback(None, bytearray(data))
+                self.replayed_count += 1
+            if self.packet_time is not None:
+                # gestures still waiting for their deadline
+                self.gesture.engine.run_pending(float("inf"))
+        finally:
+            self.packet_time = None
+            self.connected = False
+            self.replay_duration = time.perf_counter() - start
+
+    async def disconnect(self):
+        self.disconnect_requested = True
+
+
+async def _bench(path: str, speed: float):
+    samples = 0
+
+    def imu_batch_callback(index, batch):
+        nonlocal samples
+        samples += len(batch)
+
+    ring = ReplayRing(path, speed=speed, imu_batch_callback=imu_batch_callback)
+    await ring.connect()
+    print(
+        f"{ring.replayed_count} notifications, {samples} IMU samples in {ring.replay_duration:.3f} s: "
+        f"{ring.replayed_count / ring.replay_duration:.0f} notifications/s, {samples / ring.replay_duration:.0f} samples/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a notification capture and report the decoding throughput")
+    parser.add_argument("path", type=str, help="capture written by BLERing(capture_path=...)")
+    parser.add_argument("--speed", type=float, default=None, help="replay speed, as fast as possible when omitted")
+    args = parser.parse_args()
+    asyncio.run(_bench(args.path, args.speed))
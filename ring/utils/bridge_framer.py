@@ -0,0 +1,285 @@
+import re
+import abc
+import socket
+import asyncio
+import subprocess
+
+# bridge executables already killed by kill_stale_bridges() in this process
+_killed_bridges = set()
+
+
+def kill_stale_bridges(*names: str):
+    """Kill bridge executables left over from an earlier run, once per process and name.
+
+    Rings connecting later must not kill the bridges of the rings already
+    connected, so each name is only killed the first time it is asked for.
+    """
+    for name in names:
+        if name in _killed_bridges:
+            continue
+        _killed_bridges.add(name)
+        try:
+            subprocess.Popen("taskkill /T /F /IM " + name, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except Exception as e:
+            # print(e)
+            ...
+
+
+class BridgeFramer(abc.ABC):
+    """Incremental framer for the TCP stream sent by the qt BLE bridge (BLEData.exe).
+
+    TCP may merge or split the bridge's writes, so bytes are received with
+    recv_into() into one reusable buffer and cut into packets by their length.
+    packets() yields (kind, packet) tuples where packet is a memoryview into the
+    buffer (valid until the next receive) or, for MESSAGE, the decoded text.
+    Bytes that cannot start a packet are skipped up to the next sync point.
+    """
+
+    MESSAGE = 0  # "Connected", "Disconnected" or the ring address
+    NOTIFY = 1  # raw ring notification (v2 bridge)
+    SPP = 2  # 0x59 0x90 prefixed spp notification (v1 bridge)
+    BLE = 3  # 0xB1 0xE0 prefixed ble notification (v1 bridge)
+
+    MESSAGES = (b"Disconnected", b"Connected")
+    ADDRESS = re.compile(rb"[0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5}")
+    ADDRESS_TEMPLATE = b"00:00:00:00:00:00"
+    # (pattern, offset of the pattern inside a packet), used to resync
+    SYNC = ()
+
+    def __init__(self, capacity: int = 4096):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        # a tail shorter than this may still grow into a packet or message
+        self.keep = max(
+            [len(m) - 1 for m in self.MESSAGES]
+            + [len(p) + o - 1 for p, o in self.SYNC]
+            + [len(self.ADDRESS_TEMPLATE) - 1]
+        )
+        # statistics
+        self.packet_count = 0
+        self.resync_count = 0
+        self.discarded_bytes = 0
+        self._syncing = False
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _reserve(self, size: int):
+        if len(self.buffer) - self.end >= size:
+            return
+        pending = self.end - self.start
+        if pending + size > len(self.buffer):
+            buffer = bytearray(max(2 * len(self.buffer), pending + size))
+            buffer[:pending] = self.view[self.start : self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        else:
+            self.view[:pending] = self.view[self.start : self.end]
+        self.start = 0
+        self.end = pending
+
+    def get_buffer(self, size: int = 1024) -> memoryview:
+        """Free space of at least size bytes at the end of the buffer, commit what was written with advance()."""
+        self._reserve(size)
+        return self.view[self.end :]
+
+    def advance(self, n: int):
+        self.end += n
+
+    def recv_from(self, conn: socket.socket, size: int = 1024) -> int:
+        """Receive up to size bytes from conn, returns 0 once the bridge has closed the connection."""
+        n = conn.recv_into(self.get_buffer(size), size)
+        self.advance(n)
+        return n
+
+    def feed(self, data):
+        self._reserve(len(data))
+        self.view[self.end : self.end + len(data)] = data
+        self.end += len(data)
+
+    @abc.abstractmethod
+    def _packet(self, start: int, available: int):
+        """Return (kind, header_length, length) of the packet at start.
+
+        length is 0 when more bytes are needed to tell and None when no packet starts here.
+        """
+
+    def _message(self, start: int, available: int):
+        """Length of the text message at start, 0 if it may still be incomplete, None if there is none."""
+        head = self.view[start : start + min(available, len(self.ADDRESS_TEMPLATE))].tobytes()
+        for message in self.MESSAGES:
+            if head.startswith(message):
+                return len(message)
+        if self.ADDRESS.match(head):
+            return len(self.ADDRESS_TEMPLATE)
+        for message in self.MESSAGES:
+            if message.startswith(head):
+                return 0
+        if len(head) < len(self.ADDRESS_TEMPLATE) and self.ADDRESS.match(head + self.ADDRESS_TEMPLATE[len(head) :]):
+            return 0
+        return None
+
+    def _next_sync(self, start: int) -> int:
+        # closest position after start where a packet or a message may start, end if there is none
+        best = self.end
+        for pattern, offset in self.SYNC:
+            pos = self.buffer.find(pattern, start + 1 + offset, self.end)
+            if pos >= 0:
+                best = min(best, pos - offset)
+        for message in self.MESSAGES:
+            pos = self.buffer.find(message, start + 1, self.end)
+            if pos >= 0:
+                best = min(best, pos)
+        match = self.ADDRESS.search(self.buffer, start + 1, self.end)
+        if match is not None:
+            best = min(best, match.start())
+        return best
+
+    def _resync(self):
+        # skip to the closest position where a packet or a message may start
+        best = max(self.start + 1, min(self._next_sync(self.start), self.end - self.keep))
+        if not self._syncing:
+            self.resync_count += 1
+            self._syncing = True
+        self.discarded_bytes += best - self.start
+        self.start = best
+
+    def packets(self):
+        while self.start < self.end:
+            available = self.end - self.start
+            kind, header_length, length = self._packet(self.start, available)
+            if length is None:
+                length = self._message(self.start, available)
+                if length is None:
+                    self._resync()
+                    continue
+                if length == 0:
+                    break
+                message = self.view[self.start : self.start + length].tobytes()
+                self.start += length
+                self._syncing = False
+                yield self.MESSAGE, message.decode("utf-8")
+                continue
+            if length == 0 or length > available:
+                break
+            packet = self.view[self.start + header_length : self.start + length]
+            self.start += length
+            self.packet_count += 1
+            self._syncing = False
+            yield kind, packet
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+
+
+class PrefixedBridgeFramer(BridgeFramer):
+    """v1 bridge stream: [0x59 0x90 | 0xB1 0xE0] [payload length] [payload]."""
+
+    SYNC = ((b"\x59\x90", 0), (b"\xb1\xe0", 0))
+    HEADERS = {0x59: (0x90, BridgeFramer.SPP), 0xB1: (0xE0, BridgeFramer.BLE)}
+
+    def _packet(self, start, available):
+        header = self.HEADERS.get(self.buffer[start])
+        if header is None:
+            return None, 0, None
+        if available < 3:
+            if available == 2 and self.buffer[start + 1] != header[0]:
+                return None, 0, None
+            return header[1], 3, 0
+        if self.buffer[start + 1] != header[0]:
+            return None, 0, None
+        return header[1], 3, self.buffer[start + 2] + 3
+
+
+class NotifyBridgeFramer(BridgeFramer):
+    """v2 bridge stream: raw notifications, their length follows from the opcode in bytes 2 and 3.
+
+    Notifications of VARIABLE length (the version strings) run up to the next
+    position where a packet or a message may start.
+    """
+
+    VARIABLE = -1
+    SYNC = (
+        (b"\x40\x06", 2),
+        (b"\x61\x00", 2),
+        (b"\x61\x01", 2),
+        (b"\x61\x02", 2),
+        (b"\x12\x00", 2),
+        (b"\x99\x00", 2),
+        (b"\x62\x01", 2),
+        (b"\x62\x02", 2),
+        (b"\x62\x03", 2),
+        (b"\x10\x00", 2),
+        (b"\x11\x00", 2),
+        (b"\x11\x01", 2),
+    )
+
+    def __init__(self, package_length: int, capacity: int = 4096):
+        super().__init__(capacity)
+        self.lengths = {
+            (0x40, 0x06): package_length,  # imu
+            (0x61, 0x00): 5,
+            (0x61, 0x01): 23,  # touch state
+            (0x61, 0x02): 5,  # touch event
+            (0x12, 0x00): 5,  # battery level
+            (0x99, 0x00): 8,  # time calibration
+            (0x62, 0x01): 5,  # breathing LED result
+            (0x62, 0x02): 5,  # custom LED result
+            (0x62, 0x03): 5,  # custom LED pwm idle result
+            (0x10, 0x00): 5,  # battery
+            (0x11, 0x00): self.VARIABLE,  # software version
+            (0x11, 0x01): self.VARIABLE,  # hardware version
+        }
+
+    def _packet(self, start, available):
+        if available < 4:
+            return self.NOTIFY, 0, 0
+        length = self.lengths.get((self.buffer[start + 2], self.buffer[start + 3]))
+        if length == self.VARIABLE:
+            end = self._next_sync(start + 3)
+            # wait for the next packet to tell where this one ends
+            length = end - start if end < self.end else 0
+        return self.NOTIFY, 0, length
+
+
+class BridgeProtocol(asyncio.BufferedProtocol):
+    """asyncio protocol feeding a bridge connection straight into a BridgeFramer.
+
+    The event loop reads into the framer's buffer and every complete packet is
+    handed to packet_callback(kind, packet). Many rings, each listening on its own
+    port, can share one event loop this way.
+    """
+
+    def __init__(self, framer: BridgeFramer, packet_callback, capture=None):
+        self.framer = framer
+        self.packet_callback = packet_callback
+        # optional binary file receiving the raw stream, see ring/qt/fake_bridge.py
+        self.capture = capture
+        self.transport = None
+        self.connected = asyncio.get_running_loop().create_future()
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if not self.connected.done():
+            self.connected.set_result(transport.get_extra_info("peername"))
+
+    def get_buffer(self, sizehint):
+        return self.framer.get_buffer(max(sizehint, 1024))
+
+    def buffer_updated(self, nbytes):
+        if self.capture is not None:
+            self.capture.write(self.framer.view[self.framer.end : self.framer.end + nbytes])
+        self.framer.advance(nbytes)
+        for kind, packet in self.framer.packets():
+            self.packet_callback(kind, packet)
+
+    def eof_received(self):
+        return False
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(exc)
@@ -7,75 +7,89 @@ import numpy as np
 import json
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from ble_ring_v2 import BLERing
-from threading import Thread
+from utils.clock_fit import ClockFit, match_probes
+from utils.clock_store import default_clock_store
 from tqdm import trange
 
-async def calib_time(ring_mac):
+async def calib_time(ring_macs, method='huber'):
     calib_packet_num = 300
     calib_packet_interval = 0.1
     max_calib_delta = 0.010
 
-    ring = BLERing(ring_mac, index=0)
-    await ring.connect()
-    await asyncio.sleep(1)  # wait for connection to stabilize
-    cnt = 0
-    pc_timestamps = []
-    ring_timestamps = []
-    pc_delta_time = []
-    for _ in trange(calib_packet_num):
-        await ring.calib_time(index=cnt)
-        await asyncio.sleep(calib_packet_interval)
-        cnt += 1
-    await asyncio.sleep(1)
+    if isinstance(ring_macs, str):
+        ring_macs = [ring_macs]
+    # every ring has its own link, so all of them are calibrated at the same time
+    rings = [BLERing(ring_mac, index=i) for i, ring_mac in enumerate(ring_macs)]
+    fits = [None] * len(rings)
+    clock_store = default_clock_store()
+    connected = []
+    try:
+        results = await asyncio.gather(*[ring.connect() for ring in rings], return_exceptions=True)
+        for ring, result in zip(rings, results):
+            # BLERing.connect() reports most failures by not connecting
+            if isinstance(result, BaseException) or not ring.connected:
+                reason = f": {result!r}" if isinstance(result, BaseException) else ""
+                print(f"Ring {ring.index} ({ring.address}) failed to connect, skipped{reason}")
+            else:
+                connected.append(ring)
+        if not connected:
+            return fits
+        await asyncio.sleep(1)  # wait for connection to stabilize
+        for cnt in trange(calib_packet_num):
+            # a ring dropping out only loses its own probes
+            await asyncio.gather(*[ring.calib_time(index=cnt) for ring in connected], return_exceptions=True)
+            await asyncio.sleep(calib_packet_interval)
+        await asyncio.sleep(1)
 
-    ring.start_calib_timestamps = np.sort(ring.start_calib_timestamps)
-    ring.end_calib_timestamps = np.sort(ring.end_calib_timestamps)
-    ring.end_indices = np.sort(np.array(ring.end_indices))
-    ring.start_calib_timestamps = ring.start_calib_timestamps[ring.end_indices]
-    ring.end_calib_timestamps = ring.end_calib_timestamps[ring.end_indices]
-    
-    ring_timestamps = np.array(ring.ring_timestamps)
-    pc_timestamps = (np.array(ring.start_calib_timestamps) + np.array(ring.end_calib_timestamps)) / 2
-    pc_delta_time = np.array(ring.end_calib_timestamps) - np.array(ring.start_calib_timestamps)
+        for ring in connected:
+            # answers may be lost or reordered, pair them with the probes by index
+            ring_timestamps, pc_timestamps, pc_delta_time = match_probes(
+                ring.start_indices, ring.start_calib_timestamps,
+                ring.end_indices, ring.ring_timestamps, ring.end_calib_timestamps,
+            )
+            try:
+                fit = ClockFit(ring_timestamps, pc_timestamps, pc_delta_time, max_rtt=max_calib_delta, method=method)
+            except ValueError as e:
+                print(f"Ring {ring.index} ({ring.address}) not calibrated: {e}")
+                continue
+            fits[ring.index] = fit
+            print(f"Ring {ring.index} ({ring.address}) used calib packet num: {fit.used_count}, percentage: {fit.used_count / calib_packet_num}")
+            if fit.used_count < 20:
+                print("Warning: not enough calib data")
+            print('intercept:', fit.intercept, 'slope:', fit.slope, f'jitter: {fit.jitter * 1000:.3f} ms')
 
-    timestamps = list(zip(pc_timestamps, ring_timestamps, pc_delta_time))
-    # sort with pc_delta
-    timestamps = sorted(timestamps, key=lambda x: x[2])
-    timestamps = [x for x in timestamps if x[2] < max_calib_delta]
-    print(f"used calib packet num: {len(timestamps)}, percentage: {len(timestamps) / calib_packet_num}")
-    if len(timestamps) < 20:
-        print("Warning: not enough calib data")
-    pc_timestamps, ring_timestamps, pc_delta_time = zip(*timestamps)
-
-    # print('pc_timestamps:', pc_timestamps)
-    # print('ring_timestamps:', ring_timestamps)
-    # print('pc_delta_time:', pc_delta_time)
-
-    # linear regression
-    ring_timestamps = np.array(ring_timestamps)
-    pc_timestamps = np.array(pc_timestamps)
-    pc_delta_time = np.array(pc_delta_time)
-    X_b = np.c_[np.ones((len(ring_timestamps), 1)), ring_timestamps]
-    intercept, slope = np.linalg.inv(X_b.T.dot(X_b)).dot(X_b.T).dot(pc_timestamps)
-    print('intercept:', intercept, 'slope:', slope)
-
-    # save
-    os.makedirs('data', exist_ok=True)
-    with open(f'data/calib_time_{int(time.time())}.json', 'w') as f:
-        json.dump({
-            'intercept': intercept,
-            'slope': slope,
-            'pc_timestamps': pc_timestamps.tolist(),
-            'ring_timestamps': ring_timestamps.tolist(),
-            'pc_delta_time': pc_delta_time.tolist(),
-            'ring_mac': ring_mac,
-        }, f)
-
-    await ring.disconnect()
+            # seed the clock sync of later sessions, see utils/clock_store.py
+            last_ring_time = fit.ring_times.max()
+            clock_store.put(
+                ring.address,
+                float(last_ring_time),
+                float(fit.to_host(last_ring_time)),
+                float(fit.slope),
+                fit.slope_std,
+                fit.residual_std,
+                fit.used_count,
+            )
 
+            # save
+            os.makedirs('data', exist_ok=True)
+            suffix = f'_{ring.index}' if len(rings) > 1 else ''
+            with open(f'data/calib_time_{int(time.time())}{suffix}.json', 'w') as f:
+                json.dump({
+                    **fit.as_dict(),
+                    'pc_timestamps': pc_timestamps[fit.used].tolist(),
+                    'ring_timestamps': ring_timestamps[fit.used].tolist(),
+                    'pc_delta_time': pc_delta_time[fit.used].tolist(),
+                    'ring_mac': ring.address,
+                }, f)
+    finally:
+        # rings that calibrated keep their results whatever happened to the others
+        clock_store.save()
+        await asyncio.gather(*[ring.disconnect() for ring in connected], return_exceptions=True)
+    return fits
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--ring', type=str, required=True)
+    parser.add_argument('--ring', type=str, nargs='+', required=True)
+    parser.add_argument('--method', type=str, default='huber', choices=ClockFit.METHODS)
     args = parser.parse_args()
-    asyncio.run(calib_time(args.ring))
+    asyncio.run(calib_time(args.ring, args.method))
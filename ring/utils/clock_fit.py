@@ -0,0 +1,151 @@
+import numpy as np
+
+# Huber tuning constant, 95% efficiency for Gaussian residuals
+HUBER_K = 1.345
+# MAD -> standard deviation for Gaussian residuals
+MAD_SCALE = 1.4826
+
+
+def unwrap_indices(indices, reference: int = None, bits: int = 16) -> np.ndarray:
+    """Unwrap wrapping sequence indices into a monotonic count.
+
+    Consecutive indices may be out of order (answers overtaking each other),
+    every step is taken as the shortest signed distance modulo 2**bits. The
+    first index is placed closest to reference when given, so that the probes
+    and the answers of one run are unwrapped consistently.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) == 0:
+        return indices
+    period = 1 << bits
+    half = period >> 1
+    steps = (np.diff(indices) + half) % period - half
+    first = indices[0] if reference is None else reference + (indices[0] - reference + half) % period - half
+    return first + np.concatenate(([0], np.cumsum(steps)))
+
+
+def match_probes(probe_indices, send_times, answer_indices, ring_times, receive_times):
+    """Pair CALIB_TIME probes with their answers by sequence index.
+
+    Answers may be lost, duplicated or arrive out of order. Returns the ring
+    time, the host time (midpoint between sending and receiving) and the round
+    trip of every answered probe, in the order the probes were sent.
+    """
+    probes = unwrap_indices(probe_indices)
+    answers = unwrap_indices(answer_indices, probes[0] if len(probes) else None)
+    # the first answer of an index wins
+    answers, first = np.unique(answers, return_index=True)
+    _, probe_pos, answer_pos = np.intersect1d(probes, answers, assume_unique=True, return_indices=True)
+    order = np.argsort(probe_pos)
+    probe_pos = probe_pos[order]
+    answer_pos = first[answer_pos[order]]
+
+    send_times = np.asarray(send_times, dtype=np.float64)[probe_pos]
+    receive_times = np.asarray(receive_times, dtype=np.float64)[answer_pos]
+    ring_times = np.asarray(ring_times, dtype=np.float64)[answer_pos]
+    return ring_times, (send_times + receive_times) / 2, receive_times - send_times
+
+
+def _weighted_line(x: np.ndarray, y: np.ndarray, w: np.ndarray):
+    # weighted least squares of y = a + b * x with x already centered
+    sw = np.sqrt(w)
+    (a, b), *_ = np.linalg.lstsq(np.column_stack((sw, sw * x)), sw * y, rcond=None)
+    return a, b
+
+
+class ClockFit:
+    """Batch ring-to-host clock fit of a calibration run, host = intercept + slope * ring.
+
+    Probes whose round trip is longer than max_rtt are left out, like the
+    online gate of utils/clock_sync.py. The line is solved on ring times
+    centered at their mean so the normal equations stay well conditioned.
+    method is one of:
+      - "lstsq": ordinary least squares
+      - "huber": least squares reweighted with Huber weights, the default
+      - "theil_sen": median of the pairwise slopes
+    Both robust methods ignore the few answers delayed by a retransmission
+    that still pass the round-trip gate.
+    """
+
+    METHODS = ("lstsq", "huber", "theil_sen")
+
+    def __init__(self, ring_times, host_times, rtt=None, max_rtt: float = 0.010, method: str = "huber", max_iter: int = 20):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown clock fit method {method!r}, expected one of {self.METHODS}")
+        ring_times = np.asarray(ring_times, dtype=np.float64)
+        host_times = np.asarray(host_times, dtype=np.float64)
+        self.used = np.ones(len(ring_times), dtype=bool) if rtt is None else np.asarray(rtt) <= max_rtt
+        self.method = method
+        self.ring_times = ring_times[self.used]
+        self.host_times = host_times[self.used]
+        if len(self.ring_times) < 2:
+            raise ValueError(f"Clock fit needs at least 2 probes within {max_rtt * 1000:.0f} ms, got {len(self.ring_times)}")
+
+        self.ring_center = self.ring_times.mean()
+        self.host_center = self.host_times.mean()
+        x = self.ring_times - self.ring_center
+        y = self.host_times - self.host_center
+        self.weights = np.ones(len(x))
+        if method == "theil_sen":
+            i, j = np.triu_indices(len(x), k=1)
+            dx = x[j] - x[i]
+            valid = dx != 0
+            b = np.median((y[j] - y[i])[valid] / dx[valid])
+            a = np.median(y - b * x)
+        else:
+            a, b = _weighted_line(x, y, self.weights)
+            if method == "huber":
+                for _ in range(max_iter):
+                    r = y - a - b * x
+                    scale = MAD_SCALE * np.median(np.abs(r - np.median(r)))
+                    if scale == 0:
+                        break
+                    u = np.abs(r) / (HUBER_K * scale)
+                    self.weights = np.minimum(1.0, 1.0 / np.maximum(u, 1e-12))
+                    a_new, b_new = _weighted_line(x, y, self.weights)
+                    converged = abs(a_new - a) < 1e-9 and abs(b_new - b) * np.ptp(x) < 1e-9
+                    a, b = a_new, b_new
+                    if converged:
+                        break
+        self.offset = a
+        self.slope = b
+        self.residuals = y - a - b * x
+
+    @property
+    def intercept(self) -> float:
+        """Host time at ring time 0."""
+        return self.host_center + self.offset - self.slope * self.ring_center
+
+    @property
+    def used_count(self) -> int:
+        return len(self.ring_times)
+
+    @property
+    def residual_std(self) -> float:
+        """Weighted RMS of the residuals, the outliers a robust fit ignored count less."""
+        return float(np.sqrt(np.sum(self.weights * self.residuals ** 2) / np.sum(self.weights)))
+
+    @property
+    def jitter(self) -> float:
+        """Robust spread of the residuals (scaled MAD), in seconds."""
+        return float(MAD_SCALE * np.median(np.abs(self.residuals - np.median(self.residuals))))
+
+    @property
+    def slope_std(self) -> float:
+        x = self.ring_times - self.ring_center
+        return float(self.residual_std / np.sqrt(np.sum(self.weights * x ** 2)))
+
+    def to_host(self, ring_time):
+        """Map ring time in seconds (scalar or array) to host time."""
+        return self.host_center + self.offset + self.slope * (np.asarray(ring_time) - self.ring_center)
+
+    def as_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "intercept": float(self.intercept),
+            "slope": float(self.slope),
+            "residual_std": self.residual_std,
+            "jitter": self.jitter,
+            "slope_std": self.slope_std,
+            "used": self.used_count,
+        }
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import threading
+
+from .clock_sync import ClockSync
+
+
+class ClockStore:
+    """Ring clock models kept on disk, keyed by the ring's MAC address.
+
+    Each entry holds a reference pair of ring time and host time (as
+    time.time(), since the time.perf_counter() epoch does not survive a
+    reboot), the slope and how certain both were. An entry older than max_age
+    is ignored. The offset of a younger one is trusted less the older it is,
+    by the slope uncertainty times its age, so the first probes of a session
+    can still correct it.
+    """
+
+    # the drift of a ring is not known better than this across sessions
+    MIN_SLOPE_STD = 1e-6
+
+    def __init__(self, path: str = os.path.join("data", "clock_models.json"), max_age: float = 7 * 24 * 3600, save_interval: float = 60.0):
+        self.path = path
+        self.max_age = max_age
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.models = None
+        self.last_save = 0.0
+
+    def _load(self):
+        if self.models is None:
+            self.models = {}
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    self.models = json.load(f)
+        return self.models
+
+    @staticmethod
+    def _key(mac: str) -> str:
+        return mac.upper()
+
+    def get(self, mac: str) -> dict:
+        """Stored model of mac, None if there is none or it expired."""
+        with self.lock:
+            model = self._load().get(self._key(mac))
+        if model is None or time.time() - model["updated"] > self.max_age:
+            return None
+        return model
+
+    def seed(self, mac: str, clock_sync: ClockSync) -> bool:
+        """Seed clock_sync from the stored model of mac, returns whether there was one."""
+        model = self.get(mac)
+        if model is None:
+            return False
+        age = time.time() - model["updated"]
+        slope_std = max(model["slope_std"], self.MIN_SLOPE_STD)
+        clock_sync.seed(
+            model["ring_time"],
+            # time.time() -> time.perf_counter() of this process
+            model["host_time"] - (time.time() - time.perf_counter()),
+            model["slope"],
+            model["residual_std"] + slope_std * age,
+            slope_std,
+            model["residual_std"],
+        )
+        return True
+
+    def put(self, mac: str, ring_time: float, host_time: float, slope: float, slope_std: float, residual_std: float, probes: int):
+        """Store a model, host_time is the time.perf_counter() host time at ring_time."""
+        with self.lock:
+            self._load()[self._key(mac)] = {
+                "ring_time": ring_time,
+                "host_time": host_time + (time.time() - time.perf_counter()),
+                "slope": slope,
+                "slope_std": slope_std,
+                "residual_std": residual_std,
+                "probes": probes,
+                "updated": time.time(),
+            }
+
+    def update(self, mac: str, clock_sync: ClockSync):
+        """Refresh the entry of mac from clock_sync, written to disk at most every save_interval."""
+        if clock_sync.accepted_count == 0:
+            return
+        self.put(
+            mac,
+            clock_sync.last_ring_time,
+            float(clock_sync.to_host(clock_sync.last_ring_time)),
+            clock_sync.slope,
+            clock_sync.slope_std,
+            clock_sync.residual_std,
+            clock_sync.accepted_count,
+        )
+        if time.time() - self.last_save > self.save_interval:
+            self.save()
+
+    def save(self):
+        with self.lock:
+            if not self.models:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # write then rename, a crash never leaves a truncated file behind
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(self.models, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+            self.last_save = time.time()
+
+
+_store = None
+
+
+def default_clock_store() -> ClockStore:
+    global _store
+    if _store is None:
+        _store = ClockStore()
+    return _store
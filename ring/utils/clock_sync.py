@@ -0,0 +1,115 @@
+import numpy as np
+
+# ring timestamps count at 16384 Hz
+RING_TICK_RATE = 16384
+
+
+class ClockSync:
+    """Online ring-to-host clock model, host = intercept + slope * ring.
+
+    Every CALIB_TIME probe gives one (ring time, host time) pair, the host time
+    being the midpoint between sending the probe and receiving the answer like
+    in utils/calib_time.py. Probes whose round trip is longer than max_rtt are
+    dropped, the rest update a recursive least squares fit whose forgetting
+    factor lets the slope follow the clock drift of long sessions. Times are
+    kept relative to the first accepted probe so the fit stays well conditioned.
+    """
+
+    # a first probe this far from a seeded model means the ring or the host restarted
+    REANCHOR_THRESHOLD = 0.05
+
+    def __init__(self, max_rtt: float = 0.010, forgetting: float = 0.99, tick_rate: float = RING_TICK_RATE):
+        self.max_rtt = max_rtt
+        self.forgetting = forgetting
+        self.tick_rate = tick_rate
+        self.ring_origin = None
+        self.host_origin = None
+        # ring time of the latest accepted probe
+        self.last_ring_time = None
+        # [intercept, slope] of host - host_origin against ring - ring_origin
+        self.theta = np.array([0.0, 1.0])
+        # variance of the probe residuals, P is relative to it
+        self.residual_var = 1e-6
+        # the offset is unknown, the slope is 1 within about 100 ppm
+        self.P = np.diag([1.0, (100e-6) ** 2]) / self.residual_var
+        self.seeded = False
+        # statistics
+        self.probe_count = 0
+        self.accepted_count = 0
+        self.last_residual = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.seeded or self.accepted_count > 0
+
+    @property
+    def slope_std(self) -> float:
+        return float(np.sqrt(self.residual_var * self.P[1, 1]))
+
+    @property
+    def residual_std(self) -> float:
+        return float(np.sqrt(self.residual_var))
+
+    def seed(self, ring_time: float, host_time: float, slope: float, host_std: float, slope_std: float, residual_std: float):
+        """Start from a known model (see utils/clock_store.py) before the first probe.
+
+        host_time is the host time at ring_time, known to within host_std.
+        """
+        self.ring_origin = ring_time
+        self.host_origin = host_time
+        self.theta = np.array([0.0, slope])
+        self.residual_var = residual_std ** 2
+        self.P = np.diag([host_std ** 2, slope_std ** 2]) / self.residual_var
+        self.seeded = True
+
+    def _recenter(self, ring_time: float):
+        # move the origin to ring_time, the intercept becomes the host time there
+        shift = np.array([[1.0, ring_time - self.ring_origin], [0.0, 1.0]])
+        self.host_origin += self.theta[0] + self.theta[1] * (ring_time - self.ring_origin)
+        self.theta = np.array([0.0, self.theta[1]])
+        self.P = shift @ self.P @ shift.T
+        self.ring_origin = ring_time
+
+    @property
+    def slope(self) -> float:
+        return self.theta[1]
+
+    @property
+    def intercept(self) -> float:
+        """Host time at ring time 0."""
+        return self.host_origin + self.theta[0] - self.theta[1] * self.ring_origin
+
+    def update(self, ring_time: float, send_time: float, receive_time: float) -> bool:
+        """Add a probe answered with ring_time (seconds), returns whether it passed the gate."""
+        self.probe_count += 1
+        if receive_time - send_time > self.max_rtt:
+            return False
+        host_time = (send_time + receive_time) / 2
+        if self.accepted_count == 0 and self.seeded:
+            self._recenter(ring_time)
+            if abs(host_time - self.host_origin) > self.REANCHOR_THRESHOLD:
+                # keep the drift, forget the offset
+                self.ring_origin = None
+                self.P[0, 0] = 1.0
+                self.P[0, 1] = self.P[1, 0] = 0.0
+        if self.ring_origin is None:
+            self.ring_origin = ring_time
+            self.host_origin = host_time
+        x = np.array([1.0, ring_time - self.ring_origin])
+        y = host_time - self.host_origin
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.last_residual = y - x @ self.theta
+        self.theta = self.theta + gain * self.last_residual
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        self.residual_var += (1 - self.forgetting) * (self.last_residual ** 2 - self.residual_var)
+        self.accepted_count += 1
+        self.last_ring_time = ring_time
+        return True
+
+    def to_host(self, ring_time):
+        """Map ring time in seconds (scalar or array) to host time."""
+        return self.host_origin + self.theta[0] + self.theta[1] * (np.asarray(ring_time) - self.ring_origin)
+
+    def ticks_to_host(self, ticks):
+        return self.to_host(np.asarray(ticks) / self.tick_rate)
@@ -0,0 +1,89 @@
+import asyncio
+
+
+class PendingCommand:
+    __slots__ = ("key", "index", "future")
+
+    def __init__(self, key, index, future: asyncio.Future):
+        self.key = key
+        self.index = index
+        self.future = future
+
+
+class CommandPipeline:
+    """Per ring queue of GATT writes acknowledged by notifications.
+
+    Writes go out one after another without a fixed sleep in between; a command
+    sent with a key then waits for the notification that answers it, which the
+    ring's notify callback hands to on_response(). Up to max_in_flight commands
+    may wait for their answer at the same time. A command that is not answered
+    within its timeout is written again, up to retries times.
+    """
+
+    def __init__(self, write, max_in_flight: int = 4, timeout: float = 1.0, retries: int = 2):
+        # coroutine function writing one command to the ring
+        self.write = write
+        self.timeout = timeout
+        self.retries = retries
+        self.write_lock = asyncio.Lock()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.pending = []
+        # statistics
+        self.sent_count = 0
+        self.retry_count = 0
+        self.timeout_count = 0
+
+    async def _write(self, payload):
+        async with self.write_lock:
+            await self.write(payload)
+        self.sent_count += 1
+
+    async def send(self, payload, key=None, index: int = None, timeout: float = None, retries: int = None):
+        """Write payload and return the notification answering it.
+
+        Without a key the command is not acknowledged and send() returns once it
+        is written. None is returned when every attempt timed out.
+        """
+        if key is None:
+            await self._write(payload)
+            return None
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        async with self.in_flight:
+            for attempt in range(retries + 1):
+                if attempt > 0:
+                    self.retry_count += 1
+                pending = PendingCommand(key, index, asyncio.get_running_loop().create_future())
+                self.pending.append(pending)
+                try:
+                    await self._write(payload)
+                    return await asyncio.wait_for(pending.future, timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    if pending in self.pending:
+                        self.pending.remove(pending)
+        self.timeout_count += 1
+        return None
+
+    def on_response(self, key, index: int, response) -> bool:
+        """Resolve the command answered by response, returns whether one was waiting.
+
+        A command with the same key and index wins, otherwise the oldest one
+        with the same key is answered (streams like the IMU reply with their own
+        packet counter instead of the command index).
+        """
+        match = None
+        for pending in self.pending:
+            if pending.key == key:
+                if pending.index == index:
+                    match = pending
+                    break
+                if match is None:
+                    match = pending
+        if match is None:
+            return False
+        self.pending.remove(match)
+        if not match.future.done():
+            match.future.set_result(bytes(response))
+        return True
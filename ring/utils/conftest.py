@@ -0,0 +1,139 @@
+import struct
+import asyncio
+
+import pytest
+
+import ring.ble_ring_v1 as ble_ring_v1
+import ring.ble_ring_v2 as ble_ring_v2
+import ring.utils.clock_store as clock_store
+from ring.utils.crc import crc16
+
+V1_SPP_READ = "A6ED0202-D344-460A-8075-B9E8EC90D71B"
+V1_SPP_WRITE = "A6ED0203-D344-460A-8075-B9E8EC90D71B"
+V2_READ = "BAE80011-4F05-4503-8E65-3AF1F7329D1F"
+
+# v2 commands answered by a notification of the same opcode (NotifyProtocol.ANSWERED)
+V2_ANSWERED = {(0x11, 0x00), (0x11, 0x01), (0x12, 0x00), (0x40, 0x06), (0x71, 0x01), (0x99, 0x00)}
+
+
+def v1_frame(i: int) -> bytes:
+    """36 byte SPP IMU frame of the v1 ring."""
+    frame = bytearray(36)
+    frame[0:2] = b"\xAA\x55"
+    struct.pack_into("6f", frame, 4, i, 0, 9.8, 0, 0, 0)
+    crc = crc16(frame, 4)
+    frame[2] = crc & 0xFF
+    frame[3] = crc >> 8
+    return bytes(frame)
+
+
+def v2_packet(i: int) -> bytes:
+    """v2 IMU notification of 10 samples without the timestamp tail."""
+    return struct.pack("<HBBB", i & 0xFFFF, 0x40, 0x06, 0x00) + bytes(120)
+
+
+class FakeClient:
+    """BleakClient stand-in, patched over the BleakClient of a ring module by the fixtures below.
+
+    Notifications are delivered from the event loop like bleak does, never from
+    inside the write that triggered them. drop() injects a link loss.
+    """
+
+    # every client created, each subclass keeps its own list
+    instances = []
+    # seconds connect() takes
+    connect_time = 0.0
+
+    def __init__(self, address, disconnected_callback=None):
+        self.address = address
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.notify = {}
+        self.written = []
+        self.instances.append(self)
+
+    async def connect(self):
+        if self.connect_time > 0:
+            await asyncio.sleep(self.connect_time)
+        self.is_connected = True
+
+    def set_disconnected_callback(self, callback):
+        self.disconnected_callback = callback
+
+    async def start_notify(self, characteristic, callback):
+        self.notify[characteristic] = callback
+
+    async def stop_notify(self, characteristic):
+        self.notify.pop(characteristic, None)
+
+    async def write_gatt_char(self, characteristic, data):
+        if not self.is_connected:
+            raise OSError("Not connected")
+        self.written.append(bytes(data))
+        self.answer(characteristic, bytes(data))
+
+    def answer(self, characteristic, data: bytes):
+        pass
+
+    def push(self, characteristic, data: bytes):
+        asyncio.get_running_loop().call_soon(self.notify[characteristic], characteristic, bytearray(data))
+
+    def drop(self):
+        self.is_connected = False
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+
+    async def disconnect(self):
+        self.drop()
+
+
+class FakeV1Client(FakeClient):
+    instances = []
+
+    def answer(self, characteristic, data: bytes):
+        if characteristic == V1_SPP_WRITE:
+            command = data.decode().strip().split("=")[0]
+            self.push(V1_SPP_READ, f"ACK:{command}\r\n".encode())
+
+    def stream(self, count: int, split: int = 0):
+        frames = b"".join(v1_frame(i) for i in range(count))
+        if split:
+            # a frame cut short, as by a drop
+            frames += v1_frame(count)[:split]
+        self.push(V1_SPP_READ, frames)
+
+
+class FakeV2Client(FakeClient):
+    instances = []
+
+    def answer(self, characteristic, data: bytes):
+        if (data[2], data[3]) in V2_ANSWERED:
+            self.push(V2_READ, data[:4] + b"\x64")
+
+    def stream(self, count: int):
+        for i in range(count):
+            self.push(V2_READ, v2_packet(i))
+
+    def touch(self, code: int):
+        # 0x61/0x02 touch report, code 1 is a long-touch
+        self.push(V2_READ, bytes([0, 0, 0x61, 0x02, code]))
+
+
+@pytest.fixture
+def fake_v1_client(monkeypatch):
+    """FakeV1Client class the v1 rings connect with, tests may subclass it and patch again."""
+    monkeypatch.setattr(FakeV1Client, "instances", [])
+    monkeypatch.setattr(ble_ring_v1, "BleakClient", FakeV1Client)
+    return FakeV1Client
+
+
+@pytest.fixture
+def fake_v2_client(monkeypatch, tmp_path):
+    """FakeV2Client class the v2 rings connect with, tests may subclass it and patch again.
+
+    The default clock store the rings load at connect is an empty one under tmp_path.
+    """
+    monkeypatch.setattr(clock_store, "_store", clock_store.ClockStore(str(tmp_path / "clock_models.json")))
+    monkeypatch.setattr(FakeV2Client, "instances", [])
+    monkeypatch.setattr(ble_ring_v2, "BleakClient", FakeV2Client)
+    return FakeV2Client
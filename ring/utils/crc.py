@@ -0,0 +1,60 @@
+import numpy as np
+
+# CRC-16 with the reflected 0x8005 polynomial and 0xFFFF init (as used by the ring firmware)
+CRC16_POLY = 0xA001
+CRC16_INIT = 0xFFFF
+
+
+def _make_table():
+    table = []
+    for byte in range(256):
+        result = byte
+        for _ in range(8):
+            if result & 0x0001:
+                result = (result >> 1) ^ CRC16_POLY
+            else:
+                result = result >> 1
+        table.append(result)
+    return table
+
+
+CRC16_TABLE = _make_table()
+CRC16_TABLE_NP = np.array(CRC16_TABLE, dtype=np.uint16)
+
+
+class CRC16:
+    """Incremental CRC16, feed the data in any number of chunks with update()."""
+
+    def __init__(self, value: int = CRC16_INIT):
+        self.value = value
+
+    def update(self, data, offset: int = 0) -> "CRC16":
+        table = CRC16_TABLE
+        result = self.value
+        for byte in memoryview(data)[offset:]:
+            result = (result >> 8) ^ table[(result ^ byte) & 0xFF]
+        self.value = result
+        return self
+
+    def reset(self):
+        self.value = CRC16_INIT
+
+
+def crc16(data, offset: int = 3) -> int:
+    return CRC16().update(data, offset).value
+
+
+def crc16_frames(frames: np.ndarray, offset: int = 3) -> np.ndarray:
+    """CRC16 of every row of a (K, L) uint8 array, skipping the first `offset` bytes."""
+    frames = np.asarray(frames, dtype=np.uint8)
+    result = np.full(frames.shape[0], CRC16_INIT, dtype=np.uint16)
+    for column in frames[:, offset:].T:
+        result = (result >> 8) ^ CRC16_TABLE_NP[(result ^ column) & 0xFF]
+    return result
+
+
+def check_frames(frames: np.ndarray, offset: int = 3, crc_pos: int = 1) -> np.ndarray:
+    """Validate many frames at once, the little-endian CRC is stored at frames[:, crc_pos:crc_pos + 2]."""
+    frames = np.asarray(frames, dtype=np.uint8)
+    expected = frames[:, crc_pos].astype(np.uint16) | (frames[:, crc_pos + 1].astype(np.uint16) << 8)
+    return crc16_frames(frames, offset) == expected
@@ -0,0 +1,235 @@
+import time
+import heapq
+import itertools
+import threading
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline: float, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class GestureEngine:
+    """Timer queue shared by the touch detectors of all rings.
+
+    One daemon thread sleeps on a condition until the earliest deadline and
+    sleeps without timeout while no timer is pending, so idle rings cost no
+    CPU. With threaded=False nothing runs by itself and run_pending() has to
+    be called, which together with a fake clock makes the timing
+    deterministic.
+    """
+
+    def __init__(self, clock=time.perf_counter, threaded: bool = True):
+        self.clock = clock
+        self.threaded = threaded
+        self.condition = threading.Condition()
+        self.timers = []
+        self.counter = itertools.count()
+        self.thread = None
+
+    def call_at(self, deadline: float, callback) -> Timer:
+        timer = Timer(deadline, callback)
+        with self.condition:
+            heapq.heappush(self.timers, (deadline, next(self.counter), timer))
+            if self.threaded and self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return timer
+
+    def _pop_due(self, now: float):
+        due = []
+        with self.condition:
+            while self.timers and self.timers[0][0] <= now:
+                timer = heapq.heappop(self.timers)[2]
+                if not timer.cancelled:
+                    due.append(timer)
+        return due
+
+    def run_pending(self, now: float = None) -> int:
+        """Fire every timer due at now (default: the clock), returns how many fired."""
+        due = self._pop_due(self.clock() if now is None else now)
+        for timer in due:
+            # the owner may have cancelled it after it was popped
+            if not timer.cancelled:
+                timer.callback()
+        return len(due)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.timers and self.timers[0][2].cancelled:
+                    heapq.heappop(self.timers)
+                if not self.timers:
+                    self.condition.wait()
+                    continue
+                timeout = self.timers[0][0] - self.clock()
+                if timeout > 0:
+                    self.condition.wait(timeout)
+                    continue
+            self.run_pending()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def default_engine() -> GestureEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = GestureEngine()
+        return _engine
+
+
+class TouchGestureDetector:
+    """Turn the touch states of one ring into tap, double-tap, long-touch and release events.
+
+    touch(state) is called with every decoded touch state (0 for no touch).
+    Events are reported as callback(event) with the touch_callback codes below.
+    Taps are only reported as double-taps unless listed in tap_events, in which
+    case they are reported once double_tap_interval has passed without a second
+    tap. The timers run on the shared GestureEngine.
+    """
+
+    TAP = 0
+    DOUBLE_TAP = 1
+    LONG_TOUCH = 2
+    SWIPE_UP = 3
+    SWIPE_DOWN = 4
+    RELEASE = 5
+
+    def __init__(
+        self,
+        callback,
+        double_tap_interval: float = 0.5,
+        long_touch_time: float = 1.0,
+        repeat_long_touch: bool = False,
+        touch_timeout: float = None,
+        tap_events: tuple = (),
+        engine: GestureEngine = None,
+    ):
+        self.callback = callback
+        self.double_tap_interval = double_tap_interval
+        self.long_touch_time = long_touch_time
+        # report a long-touch on every touch state while holding instead of once
+        self.repeat_long_touch = repeat_long_touch
+        # a touch is dropped when no touch state arrives for this long
+        self.touch_timeout = touch_timeout
+        self.tap_events = tap_events
+        self.engine = default_engine() if engine is None else engine
+        self.lock = threading.Lock()
+
+        self.touch_id = 0
+        self.first_state = 0
+        self.last_state = 0
+        self.holding = False
+        self.last_tap_time = None
+        self.long_touch_timer = None
+        self.timeout_timer = None
+        self.tap_timer = None
+
+    def _cancel(self, timer):
+        if timer is not None:
+            timer.cancel()
+
+    def _emit(self, events):
+        for event in events:
+            self.callback(event)
+
+    def touch(self, state: int, now: float = None):
+        if now is None:
+            now = self.engine.clock()
+        events = []
+        with self.lock:
+            if state != 0:
+                if self.last_state == 0:
+                    # touch down
+                    self.touch_id += 1
+                    self.first_state = state
+                    touch_id = self.touch_id
+                    self.long_touch_timer = self.engine.call_at(
+                        now + self.long_touch_time, lambda: self._on_long_touch(touch_id)
+                    )
+                elif self.holding and self.repeat_long_touch:
+                    events.append(self.LONG_TOUCH)
+                self.last_state = state
+                if self.touch_timeout is not None:
+                    self._cancel(self.timeout_timer)
+                    touch_id = self.touch_id
+                    self.timeout_timer = self.engine.call_at(
+                        now + self.touch_timeout, lambda: self._on_timeout(touch_id)
+                    )
+            elif self.last_state != 0:
+                self._end_touch()
+                if self.holding:
+                    events.append(self.RELEASE)
+                    self.holding = False
+                else:
+                    events.extend(self._tap(now))
+                self.last_state = 0
+        self._emit(events)
+
+    def _end_touch(self):
+        self._cancel(self.long_touch_timer)
+        self._cancel(self.timeout_timer)
+        self.long_touch_timer = None
+        self.timeout_timer = None
+
+    def _tap(self, now):
+        if self.last_state > self.first_state:
+            tap = self.SWIPE_DOWN
+        elif self.last_state < self.first_state:
+            tap = self.SWIPE_UP
+        else:
+            tap = self.TAP
+        if self.last_tap_time is not None and now - self.last_tap_time < self.double_tap_interval:
+            self.last_tap_time = None
+            self._cancel(self.tap_timer)
+            self.tap_timer = None
+            return [self.DOUBLE_TAP]
+        self.last_tap_time = now
+        if tap in self.tap_events:
+            self._cancel(self.tap_timer)
+            self.tap_timer = self.engine.call_at(
+                now + self.double_tap_interval, lambda: self._on_tap(tap, now)
+            )
+        return []
+
+    # timers may fire right after being cancelled, so each callback checks that
+    # the touch or tap it was set for is still the current one
+
+    def _on_tap(self, tap, tap_time):
+        with self.lock:
+            if self.last_tap_time != tap_time:
+                return
+            self.last_tap_time = None
+            self.tap_timer = None
+        self._emit([tap])
+
+    def _on_long_touch(self, touch_id):
+        with self.lock:
+            if touch_id != self.touch_id or self.last_state == 0 or self.holding:
+                return
+            self.long_touch_timer = None
+            self.holding = True
+        self._emit([self.LONG_TOUCH])
+
+    def _on_timeout(self, touch_id):
+        events = []
+        with self.lock:
+            if touch_id != self.touch_id or self.last_state == 0:
+                return
+            self._end_touch()
+            if self.holding:
+                events.append(self.RELEASE)
+                self.holding = False
+            self.last_state = 0
+        self._emit(events)
@@ -3,9 +3,27 @@ from __future__ import annotations
 import math
 import numpy as np
 
+if __package__:
+    from .orientation import OrientationClassifier, DEFAULT_PLANES, default_orientation_classifier
+else:
+    # run as a script for the microbenchmark at the bottom
+    from orientation import OrientationClassifier, DEFAULT_PLANES, default_orientation_classifier
+
 class IMUData():
+    ''' One IMU sample
+    attrs:
+        timestamp: time of the sample, in host seconds when host_time is set,
+            otherwise in the units of the driver's own clock (ring ticks for v2)
+        host_time: True when timestamp is host time.perf_counter() seconds
+    '''
+    __slots__ = ('acc_x', 'acc_y', 'acc_z', 'gyr_x', 'gyr_y', 'gyr_z', 'timestamp', 'host_time',
+        '_acc_np', '_gyr_np', '_imu_np')
+
+    # shared by every sample, never copied
+    plane_directions = DEFAULT_PLANES
+
     def __init__(self, acc_x:float, acc_y:float, acc_z:float,
-            gyr_x:float, gyr_y:float, gyr_z:float, timestamp:float):
+            gyr_x:float, gyr_y:float, gyr_z:float, timestamp:float, host_time:bool=False):
         self.acc_x = acc_x
         self.acc_y = acc_y
         self.acc_z = acc_z
@@ -13,15 +31,42 @@ class IMUData():
         self.gyr_y = gyr_y
         self.gyr_z = gyr_z
         self.timestamp = timestamp
-        self.acc_np = np.array([self.acc_x, self.acc_y, self.acc_z])
-        self.gyr_np = np.array([self.gyr_x, self.gyr_y, self.gyr_z])
-        self.imu_np = np.concatenate((self.acc_np, self.gyr_np), axis=0)
-        self.plane_directions = np.array([
-            [-0.23709712, 0.20552186, -0.93578157],
-            [-0.94889871, 0.04797022, 0.28491208],
-            [-0.0617075, 0.95126743, 0.29782995],
-            [ 0.99204434, -0.06982192, 0.00740044]
-        ])
+        self.host_time = host_time
+        # numpy views are built on first access
+        self._acc_np = None
+        self._gyr_np = None
+        self._imu_np = None
+
+    @property
+    def acc_np(self) -> np.ndarray:
+        if self._acc_np is None:
+            self._acc_np = np.array([self.acc_x, self.acc_y, self.acc_z])
+        return self._acc_np
+
+    @acc_np.setter
+    def acc_np(self, value:np.ndarray):
+        # like the plain attribute it replaces, acc_x..acc_z are left as they are
+        self._acc_np = value
+
+    @property
+    def gyr_np(self) -> np.ndarray:
+        if self._gyr_np is None:
+            self._gyr_np = np.array([self.gyr_x, self.gyr_y, self.gyr_z])
+        return self._gyr_np
+
+    @gyr_np.setter
+    def gyr_np(self, value:np.ndarray):
+        self._gyr_np = value
+
+    @property
+    def imu_np(self) -> np.ndarray:
+        if self._imu_np is None:
+            self._imu_np = np.concatenate((self.acc_np, self.gyr_np), axis=0)
+        return self._imu_np
+
+    @imu_np.setter
+    def imu_np(self, value:np.ndarray):
+        self._imu_np = value
     
     def __getitem__(self, index):
         return [self.acc_x, self.acc_y, self.acc_z, self.gyr_x, self.gyr_y, self.gyr_z][index]
@@ -40,13 +85,14 @@ class IMUData():
 
     def scale(self) -> IMUData:
         return IMUData(self.acc_x / 9.8, -self.acc_y / 9.8, -self.acc_z / 9.8,
-            self.gyr_x / math.pi * 180, -self.gyr_y / math.pi * 180, -self.gyr_z / math.pi * 180, self.timestamp)
+            self.gyr_x / math.pi * 180, -self.gyr_y / math.pi * 180, -self.gyr_z / math.pi * 180, self.timestamp,
+            self.host_time)
                     
-    def direction(self) -> int: # TODO: -> str
-        for i in range(len(self.plane_directions)):
-            if np.dot(self.acc_np / self.acc_norm, self.plane_directions[i]) >= math.sqrt(2) / 2:
-                return i
-        return -1
+    def direction(self, classifier:OrientationClassifier=None) -> int:
+        ''' index of the plane the ring lies in (see OrientationClassifier), -1 for none '''
+        if classifier is None:
+            classifier = default_orientation_classifier()
+        return classifier.classify_one(self.acc_x, self.acc_y, self.acc_z)
   
     def to_numpy(self):
         return np.array([self.acc_x, self.acc_y, self.acc_z,
@@ -64,14 +110,73 @@ class IMUData():
         self.gyr_x = data.gyr_x
         self.gyr_y = data.gyr_y
         self.gyr_z = data.gyr_z
-        self.acc_np = np.array([self.acc_x, self.acc_y, self.acc_z])
-        self.gyr_np = np.array([self.gyr_x, self.gyr_y, self.gyr_z])
-        self.imu_np = np.concatenate((self.acc_np, self.gyr_np), axis=0)
+        self._acc_np = None
+        self._gyr_np = None
+        self._imu_np = None
     
 
+class IMUBatch():
+    ''' IMU samples of one packet stored column-wise
+    attrs:
+        imu_np: (N, 6) float64 array of [acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z]
+        timestamp: (N,) float64 array of sample timestamps
+        host_time: True when timestamp is in host time.perf_counter() seconds, see IMUData
+    '''
+    __slots__ = ('imu_np', 'timestamp', 'host_time')
+
+    def __init__(self, imu_np:np.ndarray, timestamp:np.ndarray, host_time:bool=False):
+        self.imu_np = imu_np
+        self.timestamp = timestamp
+        self.host_time = host_time
+
+    @classmethod
+    def from_list(cls, data:list[IMUData]) -> IMUBatch:
+        imu_np = np.array([[x.acc_x, x.acc_y, x.acc_z, x.gyr_x, x.gyr_y, x.gyr_z] for x in data],
+            dtype=np.float64).reshape(-1, 6)
+        timestamp = np.array([x.timestamp for x in data], dtype=np.float64)
+        return cls(imu_np, timestamp, len(data) > 0 and data[0].host_time)
+
+    @property
+    def acc_np(self) -> np.ndarray:
+        return self.imu_np[:, :3]
+
+    @property
+    def gyr_np(self) -> np.ndarray:
+        return self.imu_np[:, 3:]
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return IMUBatch(self.imu_np[index], self.timestamp[index], self.host_time)
+        return IMUData(*self.imu_np[index].tolist(), self.timestamp[index].item(), self.host_time)
+
+    def __iter__(self):
+        for imu, timestamp in zip(self.imu_np.tolist(), self.timestamp.tolist()):
+            yield IMUData(*imu, timestamp, self.host_time)
+
+    def __str__(self):
+        return '\n'.join(map(str, self)) + '\n'
+
+    def scale(self) -> IMUBatch:
+        imu_np = self.imu_np.copy()
+        imu_np[:, :3] /= 9.8
+        imu_np[:, 3:] = imu_np[:, 3:] / math.pi * 180
+        imu_np *= [1, -1, -1, 1, -1, -1]
+        return IMUBatch(imu_np, self.timestamp, self.host_time)
+
+    def to_numpy(self):
+        return self.imu_np.astype(np.float32)
+
+    def to_numpy_with_timestamp(self):
+        return np.concatenate((self.imu_np, self.timestamp[:, None]), axis=1)
+
+
 class IMUDataGroup():
     
-    def __init__(self, data:list[IMUData]):
+    def __init__(self, data:list[IMUData] | IMUBatch):
+        # an IMUBatch is wrapped as is, without copying its arrays
         self.data = data
 
     def __getitem__(self, index) -> IMUData:
@@ -81,11 +186,54 @@ class IMUDataGroup():
         return '\n'.join(map(str, self.data)) + '\n'
 
     def scale(self) -> IMUDataGroup:
+        if isinstance(self.data, IMUBatch):
+            return IMUDataGroup(self.data.scale())
         return IMUDataGroup([x.scale() for x in self.data])
 
     def to_numpy(self):
+        if isinstance(self.data, IMUBatch):
+            return self.data.imu_np.reshape(-1)
         return np.array([x[j] for x in self.data for j in range(6)])
 
     @property
     def timestamp(self):
         return self.data[0].timestamp
+
+if __name__ == '__main__':
+    import time
+    import tracemalloc
+
+    class EagerIMUData():
+        ''' IMUData as it was before the slots, numpy arrays built in __init__ '''
+        def __init__(self, acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z, timestamp):
+            self.acc_x = acc_x
+            self.acc_y = acc_y
+            self.acc_z = acc_z
+            self.gyr_x = gyr_x
+            self.gyr_y = gyr_y
+            self.gyr_z = gyr_z
+            self.timestamp = timestamp
+            self.acc_np = np.array([self.acc_x, self.acc_y, self.acc_z])
+            self.gyr_np = np.array([self.gyr_x, self.gyr_y, self.gyr_z])
+            self.imu_np = np.concatenate((self.acc_np, self.gyr_np), axis=0)
+            self.plane_directions = np.array(DEFAULT_PLANES)
+
+    def measure(cls, name:str):
+        n = 100000
+        start_time = time.perf_counter()
+        for i in range(n):
+            cls(0.1, 9.8, 0.2, 0.01, 0.02, 0.03, i)
+        elapsed = time.perf_counter() - start_time
+
+        m = 10000
+        tracemalloc.start()
+        samples = [cls(0.1, 9.8, 0.2, 0.01, 0.02, 0.03, i) for i in range(m)]
+        stats = tracemalloc.take_snapshot().statistics('filename')
+        tracemalloc.stop()
+        blocks = sum(stat.count for stat in stats)
+        size = sum(stat.size for stat in stats)
+        print(f'{name:<8} construction: {elapsed / n * 1e6:.2f} us/sample  '
+            f'allocations: {blocks / m:.1f} blocks/sample  memory: {size / m:.0f} B/sample')
+
+    measure(EagerIMUData, 'eager')
+    measure(IMUData, 'lazy')
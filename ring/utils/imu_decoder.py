@@ -0,0 +1,59 @@
+import math
+import time
+import numpy as np
+from typing import Tuple
+
+# ring frame -> IMUData frame: (x, y, z) = (-y, z, -x) for both acc and gyr
+AXIS_INDEX = np.array([1, 2, 0, 4, 5, 3])
+AXIS_SIGN = np.array([-1.0, 1.0, -1.0, -1.0, 1.0, -1.0])
+
+
+def imu_scales(fsr: int) -> Tuple[float, float]:
+    acc_scale = 32768 / 16 * (2 ** ((fsr >> 2) & 3)) / 9.8
+    gyr_scale = 32768 / 2000 * (2 ** (fsr & 3)) / (math.pi / 180)
+    return acc_scale, gyr_scale
+
+
+def decode_imu_packet(
+    data: bytearray, gyro_bias: Tuple[float] = (0, 0, 0), clock_sync=None, receive_time: float = None
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """Decode a whole 0x40/0x06 IMU notification at once.
+
+    Returns an (N, 6) float64 array of [acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z]
+    in the IMUData frame (gyro bias removed), the N sample timestamps and
+    whether they are host time. Packets ending with the start/end ring
+    timestamps are interpolated linearly, in ring ticks (host_time False) or,
+    given a ready ClockSync, in host time. Otherwise every sample gets
+    receive_time, by default the host time at which the packet was decoded.
+    The time base may change within a stream once the clock sync gets ready.
+    """
+    head_length = 4 + len(data) % 2
+    num = (len(data) - head_length) // 12
+    acc_scale, gyr_scale = imu_scales(data[4])
+
+    raw = np.frombuffer(data, dtype="<i2", count=num * 6, offset=head_length)
+    scale = np.array([acc_scale] * 3 + [gyr_scale] * 3)
+    imu = raw.reshape(num, 6)[:, AXIS_INDEX] / scale
+    imu *= AXIS_SIGN
+    imu[:, 3:] -= gyro_bias
+
+    imu_start_time = 0
+    imu_end_time = 0
+    if (len(data) - head_length) % 12 != 0:
+        # end with 2 timestamps
+        imu_start_time, imu_end_time = np.frombuffer(
+            data, dtype="<i4", count=2, offset=len(data) - 8
+        ).tolist()
+        imu_packet_num = (len(data) - head_length - 8) // 12
+    else:
+        imu_packet_num = num
+
+    if imu_start_time != 0 and imu_end_time != 0 and imu_packet_num > 1:
+        step = (imu_end_time - imu_start_time) / (imu_packet_num - 1)
+        timestamps = imu_start_time + step * np.arange(num, dtype=np.float64)
+        if clock_sync is None or not clock_sync.ready:
+            return imu, timestamps, False
+        timestamps = clock_sync.ticks_to_host(timestamps)
+    else:
+        timestamps = np.full(num, time.perf_counter() if receive_time is None else receive_time)
+    return imu, timestamps, True
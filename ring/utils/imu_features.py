@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Tuple
+
+from .orientation import OrientationClassifier, default_orientation_classifier
+
+# Python's pow() on numpy scalars, which rounds differently from the vectorized np.power
+_scalar_pow = np.frompyfunc(pow, 2, 1)
+
+
+def _features(windows: np.ndarray, exact: bool = True) -> np.ndarray:
+    # Window.feature() of utils/window.py along the last axis, same operations in the same order
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.std(windows, axis=-1)
+        min = np.min(windows, axis=-1)
+        max = np.max(windows, axis=-1)
+        mean = np.mean(windows, axis=-1)
+        d = windows - mean[..., None]
+        if exact:
+            sc = np.mean(d ** 3, axis=-1) / _scalar_pow(std, 3).astype(np.float64)
+            ku = np.mean(d ** 4, axis=-1) / _scalar_pow(std, 4).astype(np.float64)
+        else:
+            d2 = d * d
+            std2 = std * std
+            sc = np.mean(d2 * d, axis=-1) / (std2 * std)
+            ku = np.mean(d2 * d2, axis=-1) / (std2 * std2)
+    flat = np.isnan(ku)
+    sc[flat] = 0
+    ku[flat] = 0
+    return np.stack((mean, min, max, sc, ku), axis=-1)
+
+
+def _chunk_features(channels: np.ndarray, window_length: int, hop: int, exact: bool) -> np.ndarray:
+    # channels: (C, T) with every channel contiguous -> (W, C, 5)
+    windows = sliding_window_view(channels, window_length, axis=-1)[:, ::hop]
+    return _features(windows, exact).transpose(1, 0, 2)
+
+
+def window_count(length: int, window_length: int, hop: int = 1) -> int:
+    return 0 if length < window_length else (length - window_length) // hop + 1
+
+
+def window_features(
+    data: np.ndarray, window_length: int, hop: int = 1, chunk_size: int = 1024, processes: int = None, exact: bool = True
+) -> np.ndarray:
+    """Window.feature() of every channel of every window of a recording at once.
+
+    data is a (T, C) array (or (T,) for one channel). Window i covers samples
+    [i * hop, i * hop + window_length), the windows a streaming Window sees
+    once it is full and on every hop-th push after that. Returns a (W, C, 5)
+    array of [mean, min, max, skewness, kurtosis], equal to the streaming
+    results. Windows are processed chunk_size at a time, so memory stays
+    bounded by chunk_size * window_length * C values, and the chunks are
+    spread over a process pool when processes is given (call it under
+    `if __name__ == '__main__':` then). exact=False computes the powers with
+    multiplications, several times faster but off by a few ulps.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim == 1:
+        return window_features(data[:, None], window_length, hop, chunk_size, processes, exact)[:, 0]
+    count = window_count(len(data), window_length, hop)
+    # channel major, so each window of a channel is contiguous like np.array(window)
+    channels = np.ascontiguousarray(data.T)
+    chunks = [
+        channels[:, start * hop:(min(count, start + chunk_size) - 1) * hop + window_length]
+        for start in range(0, count, chunk_size)
+    ]
+    if not chunks:
+        return np.empty((0, data.shape[1], 5))
+    if processes is not None and processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            n = len(chunks)
+            results = list(pool.map(_chunk_features, chunks, [window_length] * n, [hop] * n, [exact] * n))
+    else:
+        results = [_chunk_features(chunk, window_length, hop, exact) for chunk in chunks]
+    return np.concatenate(results, axis=0)
+
+
+def imu_window_features(
+    data: np.ndarray,
+    window_length: int,
+    hop: int = 1,
+    chunk_size: int = 1024,
+    processes: int = None,
+    exact: bool = True,
+    classifier: OrientationClassifier = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Features of a recorded IMU session, as a Window of IMUData would give them.
+
+    data is a (T, 6) array of [acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z] (extra
+    columns such as the timestamp of IMUBatch.to_numpy_with_timestamp() are
+    ignored). Returns the (W, 6, 5) window_features() of the six axes and the
+    (W,) direction() of the newest sample of every window, classified by the
+    default planes unless a classifier is given.
+    """
+    data = np.asarray(data, dtype=np.float64)[:, :6]
+    features = window_features(data, window_length, hop, chunk_size, processes, exact)
+    last = data[window_length - 1::hop][:len(features)]
+    if classifier is None:
+        classifier = default_orientation_classifier()
+    return features, classifier.classify(last[:, :3])
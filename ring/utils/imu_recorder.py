@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import struct
+import threading
+import numpy as np
+from collections import deque
+
+from .imu_data import IMUBatch
+
+MAGIC = b"RIMU"
+VERSION = 2
+# the JSON header is padded to this size, records start right after it
+HEADER_SIZE = 4096
+# host_ts of every INDEX_STRIDE-th record goes into the seek index
+INDEX_STRIDE = 4096
+
+RECORD_DTYPE = np.dtype([
+    ("ring_index", "<u2"),
+    ("host_ts", "<f8"),    # time.perf_counter() when the packet arrived
+    ("device_ts", "<f8"),  # sample timestamp of the driver (ring ticks or mapped host time)
+    ("host_time", "u1"),   # 1 when device_ts is host time, see IMUData.host_time
+    ("acc", "<f4", (3,)),
+    ("gyr", "<f4", (3,)),
+])
+
+
+def _ring_info(ring) -> dict:
+    return {
+        "index": ring.index,
+        "mac": getattr(ring, "address", None),
+        "acc_fsr": getattr(ring, "acc_fsr", None),
+        "gyro_fsr": getattr(ring, "gyro_fsr", None),
+        "gyro_bias": list(getattr(ring, "gyro_bias", None) or (0, 0, 0)),
+        "imu_freq": getattr(ring, "imu_freq", None),
+    }
+
+
+class IMURecorder:
+    """Append the IMU samples of one or more rings to a fixed-width binary file.
+
+    The file starts with a HEADER_SIZE byte header holding the magic, the
+    version and a JSON description of the record dtype and the rings (MAC,
+    FSR, gyro bias), followed by RECORD_DTYPE records. record() has the
+    imu_batch_callback signature and only queues the converted packet; a
+    writer thread joins what is queued every flush_interval and writes it with
+    one buffered write. The seek index (host_ts of every INDEX_STRIDE-th
+    record) is saved next to the file by close().
+    """
+
+    def __init__(self, path: str, rings: list = (), flush_interval: float = 0.5, buffer_size: int = 1 << 20):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.rings = {}
+        self.queue = deque()
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.record_count = 0
+        self.index = []
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.header = {
+            "version": VERSION,
+            "dtype": RECORD_DTYPE.descr,
+            # time.time() - time.perf_counter(), host_ts + this is wall time
+            "host_time_offset": time.time() - time.perf_counter(),
+            "index_stride": INDEX_STRIDE,
+            "rings": [],
+        }
+        self._write_header()
+        for ring in rings:
+            self.add_ring(ring)
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def _write_header(self):
+        header = json.dumps(self.header).encode()
+        if len(header) > HEADER_SIZE - 12:
+            raise ValueError(f"IMU recording header is {len(header)} bytes, at most {HEADER_SIZE - 12} fit")
+        position = self.file.tell()
+        self.file.seek(0)
+        self.file.write(MAGIC + struct.pack("<II", VERSION, len(header)) + header.ljust(HEADER_SIZE - 12, b" "))
+        if position > HEADER_SIZE:
+            self.file.seek(position)
+
+    def add_ring(self, ring):
+        """Describe ring in the header and record its IMU packets, calling its previous imu_batch_callback too."""
+        with self.lock:
+            self.rings[ring.index] = _ring_info(ring)
+            self.header["rings"] = list(self.rings.values())
+            self._write_header()
+        imu_batch_callback = ring.imu_batch_callback
+
+        def recording_imu_batch_callback(index, batch):
+            self.record(index, batch)
+            if imu_batch_callback is not None:
+                imu_batch_callback(index, batch)
+
+        ring.imu_batch_callback = recording_imu_batch_callback
+
+    def record(self, index: int, batch: IMUBatch, host_ts: float = None):
+        records = np.empty(len(batch), dtype=RECORD_DTYPE)
+        records["ring_index"] = index
+        records["host_ts"] = time.perf_counter() if host_ts is None else host_ts
+        records["device_ts"] = batch.timestamp
+        records["host_time"] = batch.host_time
+        records["acc"] = batch.imu_np[:, :3]
+        records["gyr"] = batch.imu_np[:, 3:]
+        self.queue.append(records)
+        if len(self.queue) == 1:
+            self.ready.set()
+
+    def _flush(self):
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.queue.popleft())
+            except IndexError:
+                break
+        if not chunks:
+            return
+        records = np.concatenate(chunks)
+        # seek index entries falling into this chunk
+        first = -self.record_count % INDEX_STRIDE
+        self.index.extend(records["host_ts"][first::INDEX_STRIDE].tolist())
+        with self.lock:
+            self.file.write(records.tobytes())
+        self.record_count += len(records)
+
+    def _writer(self):
+        while not self.closed:
+            self.ready.wait()
+            self.ready.clear()
+            time.sleep(self.flush_interval)
+            self._flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.ready.set()
+        self.thread.join()
+        self._flush()
+        with self.lock:
+            self.file.close()
+        np.save(self.path + ".idx.npy", np.array(self.index, dtype=np.float64))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class IMURecording:
+    """Read an IMURecorder file through np.memmap without loading it.
+
+    records is a read-only structured memmap of every complete record, so
+    slicing it or reading a field only touches the pages used. time_slice()
+    finds a host time range with the seek index (rebuilt from every
+    INDEX_STRIDE-th record when the recording was not closed cleanly) and
+    one block of INDEX_STRIDE records at each end, so it costs the same for
+    a 10 GB session as for a short one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, length = struct.unpack("<4sII", f.read(12))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an IMU recording")
+            self.header = json.loads(f.read(length))
+        self.version = version
+        self.dtype = np.dtype([tuple(field) if len(field) == 2 else (field[0], field[1], tuple(field[2])) for field in self.header["dtype"]])
+        count = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=self.dtype)
+        self.stride = self.header.get("index_stride", INDEX_STRIDE)
+        index_path = path + ".idx.npy"
+        index = np.load(index_path) if os.path.exists(index_path) else None
+        if index is None or len(index) != -(-count // self.stride):
+            index = np.array(self.records["host_ts"][::self.stride])
+        self.index = index
+
+    @property
+    def rings(self) -> list:
+        return self.header["rings"]
+
+    @property
+    def host_time_offset(self) -> float:
+        return self.header["host_time_offset"]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def seek(self, host_ts: float) -> int:
+        """Position of the first record with a host_ts not before host_ts."""
+        block = max(0, int(np.searchsorted(self.index, host_ts, side="left")) - 1)
+        start = block * self.stride
+        end = min(len(self.records), start + 2 * self.stride)
+        return start + int(np.searchsorted(self.records["host_ts"][start:end], host_ts, side="left"))
+
+    def time_slice(self, start: float = None, end: float = None) -> np.ndarray:
+        """Records with start <= host_ts < end, as a memmap view."""
+        first = 0 if start is None else self.seek(start)
+        last = len(self.records) if end is None else self.seek(end)
+        return self.records[first:last]
+
+    @staticmethod
+    def to_batch(records: np.ndarray) -> IMUBatch:
+        """Copy records (e.g. of one ring) into an IMUBatch for the usual processing.
+
+        The batch takes the time base of the first record, split records whose
+        host_time changes (the clock sync got ready) before converting them.
+        """
+        host_time = "host_time" in records.dtype.names and len(records) > 0 and bool(records["host_time"][0])
+        return IMUBatch(
+            np.concatenate((records["acc"], records["gyr"]), axis=1).astype(np.float64),
+            records["device_ts"].astype(np.float64),
+            host_time,
+        )
+
+    def ring_records(self, index: int, records: np.ndarray = None) -> np.ndarray:
+        if records is None:
+            records = self.records
+        return records[records["ring_index"] == index]
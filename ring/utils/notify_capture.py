@@ -0,0 +1,25 @@
+import struct
+
+# host time.perf_counter() and length of every notification, followed by its bytes
+RECORD_HEAD = struct.Struct("<dH")
+
+
+def write_notification(f, host_time: float, data: bytes):
+    f.write(RECORD_HEAD.pack(host_time, len(data)) + bytes(data))
+
+
+def read_notifications(path: str):
+    """Yield (host_time, data) of every notification captured with BLERing(capture_path=...).
+
+    A record cut short by a crash ends the capture.
+    """
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(RECORD_HEAD.size)
+            if len(head) < RECORD_HEAD.size:
+                return
+            host_time, length = RECORD_HEAD.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield host_time, data
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import math
+import numpy as np
+
+# unit gravity directions of the four planes the ring is classified into
+DEFAULT_PLANES = np.array([
+    [-0.23709712, 0.20552186, -0.93578157],
+    [-0.94889871, 0.04797022, 0.28491208],
+    [-0.0617075, 0.95126743, 0.29782995],
+    [ 0.99204434, -0.06982192, 0.00740044]
+])
+DEFAULT_PLANES.flags.writeable = False
+
+
+class OrientationClassifier:
+    ''' Classify accelerometer readings into the plane the ring lies in.
+
+    A sample belongs to the first plane whose direction is within angle
+    degrees of gravity, -1 for none. classify() labels an (N, 3) array with
+    one product against all planes and a threshold, classify_one() is the
+    same test on plain floats for single samples.
+
+    update() and update_one() add hysteresis for streams: a new plane is
+    entered only within angle - hysteresis degrees, and the current one is
+    kept until the sample leaves angle + hysteresis degrees, so labels do not
+    flicker at the boundary. They keep the label between calls, use one
+    classifier per ring (each ring may also have its own planes).
+    '''
+    def __init__(self, planes=DEFAULT_PLANES, angle:float=45.0, hysteresis:float=5.0):
+        self.planes = np.array(planes, dtype=np.float64).reshape(-1, 3)
+        self.planes.flags.writeable = False
+        # plain floats for the scalar path
+        self.plane_tuples = tuple(tuple(plane) for plane in self.planes.tolist())
+        self.threshold = math.cos(math.radians(angle))
+        self.enter_threshold = math.cos(math.radians(angle - hysteresis))
+        self.exit_threshold = math.cos(math.radians(angle + hysteresis))
+        self.label = -1
+
+    def reset(self):
+        self.label = -1
+
+    def cosines(self, acc:np.ndarray) -> np.ndarray:
+        ''' (N, P) cosines between every sample of an (N, 3) array and every plane '''
+        acc = np.asarray(acc, dtype=np.float64).reshape(-1, 3)
+        x, y, z = acc[:, 0:1], acc[:, 1:2], acc[:, 2:3]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            norm = np.sqrt(x * x + y * y + z * z)
+            # the product written out, so it rounds like the scalar path
+            planes = self.planes.T
+            return x / norm * planes[0] + y / norm * planes[1] + z / norm * planes[2]
+
+    @staticmethod
+    def _first(mask:np.ndarray) -> np.ndarray:
+        return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+    def classify(self, acc:np.ndarray) -> np.ndarray:
+        return self._first(self.cosines(acc) >= self.threshold)
+
+    def _cosines_one(self, x:float, y:float, z:float) -> list[float]:
+        norm = math.sqrt(x * x + y * y + z * z)
+        if norm == 0:
+            return [math.nan] * len(self.plane_tuples)
+        return [x / norm * px + y / norm * py + z / norm * pz for px, py, pz in self.plane_tuples]
+
+    def classify_one(self, x:float, y:float, z:float) -> int:
+        for i, cos in enumerate(self._cosines_one(x, y, z)):
+            if cos >= self.threshold:
+                return i
+        return -1
+
+    def update_one(self, x:float, y:float, z:float) -> int:
+        cosines = self._cosines_one(x, y, z)
+        for i, cos in enumerate(cosines):
+            if cos >= self.enter_threshold:
+                self.label = i
+                return i
+        if self.label != -1 and not cosines[self.label] >= self.exit_threshold:
+            self.label = -1
+        return self.label
+
+    def update(self, acc:np.ndarray) -> np.ndarray:
+        ''' update_one() of every row of an (N, 3) array, without a Python loop '''
+        cosines = self.cosines(acc)
+        n = len(cosines)
+        if n == 0:
+            return np.empty(0, dtype=int)
+        entered = self._first(cosines >= self.enter_threshold)
+        # label carried from the latest entered sample, or from before this call
+        last_entered = np.maximum.accumulate(np.where(entered != -1, np.arange(n), -1))
+        carried = np.where(last_entered >= 0, entered[np.maximum(last_entered, 0)], self.label)
+        kept = (carried != -1) & (cosines[np.arange(n), np.maximum(carried, 0)] >= self.exit_threshold)
+        # once the carried plane is left the label stays -1 until a plane is entered again
+        left = np.cumsum((entered == -1) & ~kept)
+        left_before = np.where(last_entered >= 0, left[np.maximum(last_entered, 0)], 0)
+        labels = np.where(entered != -1, entered, np.where(left == left_before, carried, -1))
+        self.label = int(labels[-1])
+        return labels
+
+
+_classifier = OrientationClassifier()
+
+
+def default_orientation_classifier() -> OrientationClassifier:
+    ''' shared classifier with the default planes, for the stateless classify() and classify_one() '''
+    return _classifier
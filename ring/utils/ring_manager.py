@@ -0,0 +1,182 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import NamedTuple, Any
+
+from .supervisor import ConnectionStats, connect_once, supervise
+
+
+class RingEvent(NamedTuple):
+    kind: int
+    index: int
+    time: float  # host time.perf_counter() when the event was queued
+    data: Any
+
+
+class RingManager:
+    """Connect several rings on one event loop and merge their streams into one queue.
+
+    The manager installs its own imu_batch, touch and audio callbacks on the
+    rings before connecting them, so the rings only have to be constructed
+    with their address and index. Every event goes into a single deque as a
+    RingEvent; deque appends and pops are atomic, so the ring callbacks on the
+    manager loop and a consumer on another thread never take a lock for it.
+
+    Each ring may have at most ring_queue_size events waiting in the queue,
+    newer events of a ring that is that far ahead of the consumer are dropped
+    and counted in stats(). With reconnect=True every ring runs under
+    supervise() and is reconnected after a drop.
+    """
+
+    IMU = 0  # data: IMUBatch of one packet
+    TOUCH = 1  # data: touch event code
+    AUDIO = 2  # data: (audio_type, audio)
+
+    def __init__(
+        self,
+        rings: list = (),
+        max_connecting: int = 2,
+        ring_queue_size: int = 256,
+        reconnect: bool = False,
+    ):
+        self.max_connecting = max_connecting
+        self.ring_queue_size = ring_queue_size
+        self.reconnect = reconnect
+        self.queue = deque()
+        self.ready = threading.Event()
+        self.rings = []
+        self.slots = {}
+        # written by the producers only
+        self.put_counts = []
+        self.drop_counts = []
+        # written by the consumer only
+        self.get_counts = []
+        # written by the manager loop
+        self.connection_stats = []
+
+        self.loop = None
+        self.thread = None
+        self.stopped = None
+        for ring in rings:
+            self.add(ring)
+
+    def add(self, ring):
+        if ring.index in self.slots:
+            raise ValueError(f"Ring index {ring.index} is already managed")
+        self.slots[ring.index] = len(self.rings)
+        self.rings.append(ring)
+        self.put_counts.append(0)
+        self.drop_counts.append(0)
+        self.get_counts.append(0)
+        self.connection_stats.append(ConnectionStats())
+        ring.imu_callback = None
+        ring.imu_batch_callback = lambda index, batch: self.put(self.IMU, index, batch)
+        ring.touch_callback = lambda index, event: self.put(self.TOUCH, index, event)
+        if hasattr(ring, "audio_callback"):
+            ring.audio_callback = lambda index, audio_type, audio: self.put(self.AUDIO, index, (audio_type, audio))
+
+    def put(self, kind: int, index: int, data):
+        slot = self.slots[index]
+        if self.put_counts[slot] - self.get_counts[slot] >= self.ring_queue_size:
+            self.drop_counts[slot] += 1
+            return
+        self.put_counts[slot] += 1
+        self.queue.append(RingEvent(kind, index, time.perf_counter(), data))
+        if len(self.queue) == 1:
+            # the consumer may be waiting for an empty queue to fill up
+            self.ready.set()
+
+    def _popped(self, event: RingEvent) -> RingEvent:
+        self.get_counts[self.slots[event.index]] += 1
+        return event
+
+    def get(self, timeout: float = None) -> RingEvent:
+        """Next event in arrival order, None if nothing arrived within timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            try:
+                return self._popped(self.queue.popleft())
+            except IndexError:
+                pass
+            self.ready.clear()
+            if self.queue:
+                continue
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                return None
+            self.ready.wait(remaining)
+
+    def poll(self) -> list:
+        """All queued events without waiting."""
+        events = []
+        while True:
+            try:
+                events.append(self._popped(self.queue.popleft()))
+            except IndexError:
+                return events
+
+    def stats(self) -> list:
+        return [
+            {
+                "index": ring.index,
+                "queued": self.put_counts[slot] - self.get_counts[slot],
+                "received": self.put_counts[slot] + self.drop_counts[slot],
+                "dropped": self.drop_counts[slot],
+                **self.connection_stats[slot].as_dict(),
+            }
+            for slot, ring in enumerate(self.rings)
+        ]
+
+    async def _connect(self, ring, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            task, connected = await connect_once(ring)
+        if connected:
+            self.connection_stats[self.slots[ring.index]].on_connected()
+        try:
+            await task
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ring {ring.index} stopped: {e!r}")
+
+    async def run(self):
+        """Connect all rings, at most max_connecting at a time, and run until stop()."""
+        self.loop = asyncio.get_running_loop()
+        self.stopped = self.loop.create_future()
+        semaphore = asyncio.Semaphore(self.max_connecting)
+        if self.reconnect:
+            tasks = [
+                asyncio.ensure_future(supervise(ring, self.connection_stats[slot], semaphore))
+                for slot, ring in enumerate(self.rings)
+            ]
+        else:
+            tasks = [asyncio.ensure_future(self._connect(ring, semaphore)) for ring in self.rings]
+        await self.stopped
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for ring in self.rings:
+            if getattr(ring, "client", None) is not None and ring.client.is_connected:
+                await ring.client.disconnect()
+
+    def start(self):
+        """Run the manager loop on a daemon thread and return immediately."""
+        started = threading.Event()
+
+        async def main():
+            run = asyncio.ensure_future(self.run())
+            await asyncio.sleep(0)
+            started.set()
+            await run
+
+        self.thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def stop(self):
+        if self.loop is not None and self.stopped is not None:
+            self.loop.call_soon_threadsafe(lambda: self.stopped.done() or self.stopped.set_result(None))
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,84 @@
+from .crc import crc16
+
+
+class SPPFramer:
+    """Reassemble fixed-size 0xAA 0x55 IMU frames from the v1 SPP byte stream.
+
+    Incoming bytes are appended to a preallocated buffer and consumed through a
+    read cursor, so every byte is looked at a constant number of times. Frames
+    are yielded as memoryviews into the buffer; they are only valid until the
+    next call to feed().
+    """
+
+    HEADER = b"\xAA\x55"
+
+    def __init__(self, frame_length: int = 36, crc_offset: int = 4, capacity: int = 4096):
+        self.frame_length = frame_length
+        self.crc_offset = crc_offset
+        self.buffer = bytearray(max(capacity, 2 * frame_length))
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        # statistics
+        self.frame_count = 0
+        self.crc_error_count = 0
+        self.discarded_bytes = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def clear(self):
+        self.start = 0
+        self.end = 0
+
+    def feed(self, data):
+        size = len(data)
+        if self.end + size > len(self.buffer):
+            pending = self.end - self.start
+            if pending + size > len(self.buffer):
+                # grow into a new buffer, views handed out earlier stay untouched
+                buffer = bytearray(max(2 * len(self.buffer), pending + size))
+                buffer[:pending] = self.view[self.start : self.end]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            else:
+                self.view[:pending] = self.view[self.start : self.end]
+            self.start = 0
+            self.end = pending
+        self.view[self.end : self.end + size] = data
+        self.end += size
+
+    def _discard(self, new_start: int):
+        self.discarded_bytes += new_start - self.start
+        self.start = new_start
+
+    def frames(self):
+        length = self.frame_length
+        while self.end - self.start >= length:
+            # searching for AA55
+            head = self.buffer.find(self.HEADER, self.start, self.end)
+            if head < 0:
+                # keep a trailing 0xAA, it may be the first half of a header
+                keep = 1 if self.buffer[self.end - 1] == 0xAA else 0
+                self._discard(self.end - keep)
+                break
+            if head > self.start:
+                self._discard(head)
+            if self.end - self.start < length:
+                break
+
+            frame = self.view[self.start : self.start + length]
+            crc = crc16(frame, self.crc_offset)
+            if (crc & 0xFF) != frame[2] or ((crc >> 8) & 0xFF) != frame[3]:
+                # error crc, restart searching from the next byte
+                self.crc_error_count += 1
+                self._discard(self.start + 1)
+                continue
+
+            self.start += length
+            self.frame_count += 1
+            yield frame
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
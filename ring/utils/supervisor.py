@@ -0,0 +1,140 @@
+import time
+import asyncio
+import contextlib
+
+
+class ConnectionStats:
+    """Connection history of one ring, kept up to date by supervise()."""
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        self.failed_attempts = 0
+        # seconds from each detected drop to the next successful connect
+        self.gaps = []
+        # samples missing around the drops, estimated from the IMU rate
+        self.lost_samples = 0
+        self.disconnected_at = None
+        self.last_sample_time = None
+        self.sample_gap_pending = False
+
+    @property
+    def total_gap(self) -> float:
+        return sum(self.gaps)
+
+    def on_connected(self):
+        self.connects += 1
+        if self.disconnected_at is not None:
+            self.gaps.append(time.perf_counter() - self.disconnected_at)
+            self.disconnected_at = None
+
+    def on_disconnected(self):
+        self.disconnects += 1
+        self.disconnected_at = time.perf_counter()
+        self.sample_gap_pending = True
+
+    def on_samples(self, num: int, imu_freq: float):
+        now = time.perf_counter()
+        if self.sample_gap_pending and self.last_sample_time is not None:
+            # the first packet after the drop covers its own num samples
+            self.lost_samples += max(0, round((now - self.last_sample_time) * imu_freq) - num)
+        self.sample_gap_pending = False
+        self.last_sample_time = now
+
+    def as_dict(self) -> dict:
+        return {
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "failed_attempts": self.failed_attempts,
+            "total_gap": self.total_gap,
+            "lost_samples": self.lost_samples,
+        }
+
+
+async def connect_once(ring):
+    """Start ring.connect() and wait until the ring reports the connection or gives up.
+
+    connect() of the v1 rings keeps running for the whole connection while the
+    v2 one returns once connected, so this returns the still running task
+    together with whether the connect callback fired.
+    """
+    connected = asyncio.Event()
+    task = asyncio.ensure_future(ring.connect(lambda *args: connected.set()))
+    waiter = asyncio.ensure_future(connected.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        waiter.cancel()
+    return task, connected.is_set()
+
+
+def _track_samples(ring, stats: ConnectionStats):
+    if ring.imu_batch_callback is not None:
+        imu_batch_callback = ring.imu_batch_callback
+
+        def tracked_imu_batch_callback(index, batch):
+            stats.on_samples(len(batch), ring.imu_freq)
+            imu_batch_callback(index, batch)
+
+        ring.imu_batch_callback = tracked_imu_batch_callback
+    elif ring.imu_callback is not None:
+        imu_callback = ring.imu_callback
+
+        def tracked_imu_callback(index, data):
+            stats.on_samples(1, ring.imu_freq)
+            imu_callback(index, data)
+
+        ring.imu_callback = tracked_imu_callback
+
+
+async def supervise(
+    ring,
+    stats: ConnectionStats = None,
+    semaphore: asyncio.Semaphore = None,
+    min_backoff: float = 0.5,
+    max_backoff: float = 30.0,
+    check_interval: float = 0.2,
+) -> ConnectionStats:
+    """Keep a bleak ring connected, reconnecting with exponential backoff.
+
+    connect() of every driver enables the streams again (IMU, mic and touch
+    for v2, IMU and touch reports for v1), so a reconnect restores the state
+    the ring had. Returns once the ring is disconnected on purpose with
+    disconnect() or a 'disconnect' action. The optional semaphore bounds how
+    many rings are in the middle of connecting.
+    """
+    if stats is None:
+        stats = ConnectionStats()
+    _track_samples(ring, stats)
+    ring.disconnect_requested = False
+    failures = 0
+    while True:
+        async with semaphore if semaphore is not None else contextlib.nullcontext():
+            task, connected = await connect_once(ring)
+        try:
+            if connected:
+                stats.on_connected()
+                failures = 0
+            try:
+                await task
+            except Exception as e:
+                print(f"Ring {ring.index} connection error: {e!r}")
+            while connected and ring.connected and not ring.disconnect_requested:
+                await asyncio.sleep(check_interval)
+        finally:
+            task.cancel()
+
+        if ring.disconnect_requested:
+            return stats
+        if connected:
+            stats.on_disconnected()
+            print(f"Ring {ring.index} disconnected")
+        else:
+            stats.failed_attempts += 1
+            failures += 1
+        delay = min(max_backoff, min_backoff * 2 ** failures)
+        print(f"Ring {ring.index} reconnecting in {delay:.1f} s")
+        await asyncio.sleep(delay)
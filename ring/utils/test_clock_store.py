@@ -0,0 +1,46 @@
+import asyncio
+
+import ring.ble_ring_v2 as ble_ring_v2
+from ring.utils.clock_store import ClockStore, default_clock_store
+
+
+def put_model(store: ClockStore, mac: str):
+    store.put(mac, 1000.0, 5.0, 1e-3, 1e-7, 1e-4, 300)
+
+
+def connect(ring: ble_ring_v2.BLERing):
+    async def run():
+        await ring.connect()
+        await ring.disconnect()
+
+    asyncio.run(run())
+
+
+def test_default_store_seeds_at_connect(fake_v2_client):
+    put_model(default_clock_store(), "aa:bb")
+    # no clock_sync_interval, the stored model is used without probing
+    ring = ble_ring_v2.BLERing("AA:BB", 0)
+    assert ring.clock_store is None
+    connect(ring)
+    assert ring.clock_store is default_clock_store()
+    assert ring.clock_sync.ready
+    assert ring.clock_sync.accepted_count == 0
+    assert ring.clock_sync_task is None
+    assert not any(command[2:4] == ble_ring_v2.NotifyProtocol.CALIB_TIME[2:4] for command in fake_v2_client.instances[-1].written)
+
+
+def test_given_store_seeds_at_connect(fake_v2_client, tmp_path):
+    store = ClockStore(str(tmp_path / "other.json"))
+    put_model(store, "AA:BB")
+    ring = ble_ring_v2.BLERing("AA:BB", 0, clock_store=store)
+    connect(ring)
+    assert ring.clock_store is store
+    assert ring.clock_sync.ready
+
+
+def test_store_disabled(fake_v2_client):
+    put_model(default_clock_store(), "AA:BB")
+    ring = ble_ring_v2.BLERing("AA:BB", 0, clock_store=False)
+    connect(ring)
+    assert ring.clock_store is None
+    assert not ring.clock_sync.ready
@@ -0,0 +1,127 @@
+import asyncio
+
+import ring.ble_ring_v2 as ble_ring_v2
+from ring.utils.command_pipeline import CommandPipeline
+
+
+class FlakyRing:
+    """Answers a command only from its answer_on-th write on."""
+
+    def __init__(self, answer_on: int = 1):
+        self.answer_on = answer_on
+        self.writes = []
+        self.pipeline = CommandPipeline(self.write, timeout=0.05, retries=2)
+
+    async def write(self, payload):
+        self.writes.append(payload)
+        if self.writes.count(payload) >= self.answer_on:
+            key, index = payload
+            asyncio.get_running_loop().call_soon(self.pipeline.on_response, key, index, b"answer %d" % index)
+
+
+def test_answered_first_time():
+    async def run():
+        ring = FlakyRing()
+        assert await ring.pipeline.send(("version", 1), "version", 1) == b"answer 1"
+        return ring
+
+    ring = asyncio.run(run())
+    assert (ring.pipeline.sent_count, ring.pipeline.retry_count, ring.pipeline.timeout_count) == (1, 0, 0)
+    assert ring.pipeline.pending == []
+
+
+def test_retried_until_answered():
+    async def run():
+        ring = FlakyRing(answer_on=3)
+        assert await ring.pipeline.send(("version", 1), "version", 1) == b"answer 1"
+        return ring
+
+    ring = asyncio.run(run())
+    assert ring.writes == [("version", 1)] * 3
+    assert (ring.pipeline.retry_count, ring.pipeline.timeout_count) == (2, 0)
+
+
+def test_timeout_after_retries():
+    async def run():
+        ring = FlakyRing(answer_on=10)
+        assert await ring.pipeline.send(("version", 1), "version", 1, retries=1) is None
+        return ring
+
+    ring = asyncio.run(run())
+    assert len(ring.writes) == 2
+    assert (ring.pipeline.retry_count, ring.pipeline.timeout_count) == (1, 1)
+    # nothing is left waiting for a late answer
+    assert ring.pipeline.pending == []
+    assert not ring.pipeline.on_response("version", 1, b"late")
+
+
+def test_unacknowledged_command():
+    async def run():
+        ring = FlakyRing(answer_on=10)
+        assert await ring.pipeline.send(("touch", 1)) is None
+        return ring
+
+    ring = asyncio.run(run())
+    assert (ring.pipeline.sent_count, ring.pipeline.timeout_count) == (1, 0)
+
+
+def test_answers_matched_by_index():
+    async def run():
+        pipeline = CommandPipeline(lambda payload: asyncio.sleep(0), timeout=1.0)
+        first = asyncio.ensure_future(pipeline.send(b"a", "battery", 1))
+        second = asyncio.ensure_future(pipeline.send(b"b", "battery", 2))
+        other = asyncio.ensure_future(pipeline.send(b"c", "version", 3))
+        while len(pipeline.pending) < 3:
+            await asyncio.sleep(0)
+        # out of order, and an answer carrying a stream counter instead of the index
+        assert pipeline.on_response("battery", 2, b"second")
+        assert pipeline.on_response("version", 77, b"other")
+        assert pipeline.on_response("battery", 1, b"first")
+        assert not pipeline.on_response("battery", 1, b"again")
+        return await asyncio.gather(first, second, other)
+
+    assert asyncio.run(run()) == [b"first", b"second", b"other"]
+
+
+def test_in_flight_limit():
+    async def run():
+        pipeline = CommandPipeline(lambda payload: asyncio.sleep(0), max_in_flight=2, timeout=1.0)
+        sends = [asyncio.ensure_future(pipeline.send(i, "key", i)) for i in range(4)]
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert [pending.index for pending in pipeline.pending] == [0, 1]
+        for i in range(4):
+            while not any(pending.index == i for pending in pipeline.pending):
+                await asyncio.sleep(0)
+            pipeline.on_response("key", i, bytes([i]))
+        return await asyncio.gather(*sends)
+
+    assert asyncio.run(run()) == [b"\x00", b"\x01", b"\x02", b"\x03"]
+
+
+def test_ring_retries_lost_command(fake_v2_client, monkeypatch):
+    class LateClient(fake_v2_client):
+        instances = []
+
+        def answer(self, characteristic, data: bytes):
+            # the first battery query is lost
+            if (data[2], data[3]) == (0x12, 0x00) and sum(1 for w in self.written if w[2:4] == b"\x12\x00") == 1:
+                return
+            super().answer(characteristic, data)
+
+    monkeypatch.setattr(ble_ring_v2, "BleakClient", LateClient)
+    ring = ble_ring_v2.BLERing("AA:BB", 0)
+    ring.commands.timeout = 0.05
+
+    async def run():
+        await ring.connect()
+        return await ring.send_command(ble_ring_v2.NotifyProtocol.GET_SOFTWARE_VERSION)
+
+    response = asyncio.run(run())
+    assert ring.connected
+    assert response[2:4] == b"\x11\x00"
+    assert ring.commands.retry_count == 1
+    assert ring.commands.timeout_count == 0
+    # the retry carries the same index, the answer echoes it
+    battery = [w for w in LateClient.instances[-1].written if w[2:4] == b"\x12\x00"]
+    assert len(battery) == 2 and battery[0] == battery[1]
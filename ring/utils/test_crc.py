@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from ring.utils.crc import CRC16, check_frames, crc16, crc16_frames
+
+
+def bitwise_crc16(data, offset=3):
+    # the bit by bit loop the lookup table replaced
+    genpoly = 0xA001
+    result = 0xFFFF
+    for i in range(offset, len(data)):
+        result = (result & 0xFFFF) ^ (data[i] & 0xFF)
+        for _ in range(8):
+            if (result & 0x0001) == 1:
+                result = (result >> 1) ^ genpoly
+            else:
+                result = result >> 1
+    return result & 0xFFFF
+
+
+def random_bytes(rng: random.Random, length: int) -> bytearray:
+    return bytearray(rng.randrange(256) for _ in range(length))
+
+
+def test_crc16_matches_bitwise():
+    rng = random.Random(1)
+    for _ in range(500):
+        data = random_bytes(rng, rng.randrange(0, 64))
+        offset = rng.randrange(0, 5)
+        assert crc16(data, offset) == bitwise_crc16(data, offset)
+        assert crc16(bytes(data), offset) == bitwise_crc16(data, offset)
+        assert crc16(memoryview(data), offset) == bitwise_crc16(data, offset)
+
+
+def test_incremental_update_matches_bitwise():
+    rng = random.Random(2)
+    for _ in range(200):
+        data = random_bytes(rng, rng.randrange(0, 128))
+        cuts = sorted(rng.randrange(len(data) + 1) for _ in range(rng.randrange(4)))
+        crc = CRC16()
+        for start, end in zip([0] + cuts, cuts + [len(data)]):
+            crc.update(data[start:end])
+        assert crc.value == bitwise_crc16(data, 0)
+        crc.reset()
+        assert crc.update(data).value == bitwise_crc16(data, 0)
+
+
+def test_frames_match_bitwise():
+    rng = random.Random(3)
+    frames = np.array([random_bytes(rng, 20) for _ in range(100)], dtype=np.uint8)
+    expected = [bitwise_crc16(frame) for frame in frames.tolist()]
+    assert crc16_frames(frames).tolist() == expected
+
+    # store the CRC of half of the frames, the rest keep random bytes
+    for frame, crc in zip(frames[::2], expected[::2]):
+        frame[1] = crc & 0xFF
+        frame[2] = crc >> 8
+    valid = check_frames(frames)
+    stored = frames[:, 1].astype(int) | (frames[:, 2].astype(int) << 8)
+    assert valid.tolist() == [int(s) == crc for s, crc in zip(stored, expected)]
+    assert valid[::2].all()
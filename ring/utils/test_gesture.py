@@ -0,0 +1,126 @@
+from ring.utils.gesture import GestureEngine, TouchGestureDetector
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_detector(**kwargs):
+    clock = FakeClock()
+    engine = GestureEngine(clock=clock, threaded=False)
+    events = []
+    detector = TouchGestureDetector(events.append, engine=engine, **kwargs)
+
+    def advance(seconds: float):
+        clock.now += seconds
+        engine.run_pending()
+
+    def touch(*states, step: float = 0.02):
+        for state in states:
+            detector.touch(state)
+            advance(step)
+
+    return detector, engine, events, advance, touch
+
+
+def test_double_tap():
+    _, _, events, advance, touch = make_detector(double_tap_interval=0.5)
+    touch(1, 1, 0)
+    advance(0.3)
+    touch(1, 0)
+    assert events == [TouchGestureDetector.DOUBLE_TAP]
+    advance(10)
+    assert events == [TouchGestureDetector.DOUBLE_TAP]
+
+
+def test_taps_too_far_apart():
+    _, _, events, advance, touch = make_detector(double_tap_interval=0.5)
+    touch(1, 0)
+    advance(0.6)
+    touch(1, 0)
+    advance(10)
+    # single taps are only reported when listed in tap_events
+    assert events == []
+
+
+def test_tap_reported_after_double_tap_interval():
+    _, _, events, advance, touch = make_detector(
+        double_tap_interval=0.5, tap_events=(TouchGestureDetector.TAP,)
+    )
+    touch(2, 2, 0)
+    advance(0.4)
+    assert events == []
+    advance(0.1)
+    assert events == [TouchGestureDetector.TAP]
+
+
+def test_swipes():
+    _, _, events, advance, touch = make_detector(
+        tap_events=(TouchGestureDetector.SWIPE_UP, TouchGestureDetector.SWIPE_DOWN)
+    )
+    touch(1, 3, 5, 0)
+    advance(1)
+    touch(5, 3, 1, 0)
+    advance(1)
+    assert events == [TouchGestureDetector.SWIPE_DOWN, TouchGestureDetector.SWIPE_UP]
+
+
+def test_long_touch_and_release():
+    _, _, events, advance, touch = make_detector(long_touch_time=1.0)
+    touch(1)
+    advance(0.9)
+    assert events == []
+    advance(0.1)
+    assert events == [TouchGestureDetector.LONG_TOUCH]
+    touch(1, 1, 1)
+    touch(0)
+    assert events == [TouchGestureDetector.LONG_TOUCH, TouchGestureDetector.RELEASE]
+    # a release is no tap
+    touch(1, 0)
+    assert events == [TouchGestureDetector.LONG_TOUCH, TouchGestureDetector.RELEASE]
+
+
+def test_repeat_long_touch():
+    _, _, events, advance, touch = make_detector(long_touch_time=1.0, repeat_long_touch=True)
+    touch(1)
+    advance(1.0)
+    touch(1, 1)
+    assert events == [TouchGestureDetector.LONG_TOUCH] * 3
+
+
+def test_short_touch_cancels_long_touch():
+    _, engine, events, advance, touch = make_detector(long_touch_time=1.0)
+    touch(1, 0)
+    advance(5)
+    assert events == []
+    # nothing is left to wake up for
+    assert all(timer.cancelled for _, _, timer in engine.timers)
+
+
+def test_touch_timeout_releases():
+    _, _, events, advance, touch = make_detector(long_touch_time=1.0, touch_timeout=0.5)
+    for _ in range(60):
+        touch(1)
+    assert events == [TouchGestureDetector.LONG_TOUCH]
+    # the release notification got lost
+    advance(0.4)
+    assert events == [TouchGestureDetector.LONG_TOUCH]
+    advance(0.1)
+    assert events == [TouchGestureDetector.LONG_TOUCH, TouchGestureDetector.RELEASE]
+
+
+def test_engine_fires_in_deadline_order():
+    clock = FakeClock()
+    engine = GestureEngine(clock=clock, threaded=False)
+    fired = []
+    engine.call_at(3, lambda: fired.append(3))
+    engine.call_at(1, lambda: fired.append(1))
+    engine.call_at(2, lambda: fired.append(2)).cancel()
+    assert engine.run_pending(0.5) == 0
+    assert engine.run_pending(5) == 2
+    assert fired == [1, 3]
+    assert engine.thread is None
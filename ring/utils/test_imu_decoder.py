@@ -0,0 +1,90 @@
+import math
+import random
+import struct
+
+import numpy as np
+
+from ring.utils.imu_decoder import decode_imu_packet
+
+
+def reference_decode(data: bytes, bias):
+    # the per sample struct loop decode_imu_packet replaced
+    acc_scale = 32768 / 16 * (2 ** ((data[4] >> 2) & 3)) / 9.8
+    gyr_scale = 32768 / 2000 * (2 ** (data[4] & 3)) / (math.pi / 180)
+    head_length = 4 + len(data) % 2
+    imu_start_time = 0
+    imu_end_time = 0
+    if (len(data) - head_length) % 12 != 0:
+        imu_start_time = struct.unpack("i", data[-8:-4])[0]
+        imu_end_time = struct.unpack("i", data[-4:])[0]
+        imu_packet_num = (len(data) - head_length - 8) // 12
+    else:
+        imu_packet_num = (len(data) - head_length) // 12
+
+    samples = []
+    for i in range(head_length, len(data), 12):
+        if len(data) - i < 12:
+            break
+        acc_x, acc_y, acc_z = (v / acc_scale for v in struct.unpack("hhh", data[i : i + 6]))
+        gyr_x, gyr_y, gyr_z = (v / gyr_scale for v in struct.unpack("hhh", data[i + 6 : i + 12]))
+        if imu_start_time != 0 and imu_end_time != 0:
+            timestamp = imu_start_time + (
+                (imu_end_time - imu_start_time) / (imu_packet_num - 1)
+            ) * ((i - head_length) // 12)
+        else:
+            timestamp = None
+        samples.append((
+            -1 * acc_y,
+            acc_z,
+            -1 * acc_x,
+            -1 * gyr_y - bias[0],
+            gyr_z - bias[1],
+            -1 * gyr_x - bias[2],
+            timestamp,
+        ))
+    return samples
+
+
+def random_packet(rng: random.Random, num: int, fsr: int, odd: bool, tail: bool) -> bytes:
+    data = bytearray(struct.pack("<HBB", rng.randrange(1 << 16), 0x40, 0x06))
+    if odd:
+        data.append(fsr)
+    data += bytes(rng.randrange(256) for _ in range(12 * num))
+    if tail:
+        start = rng.randrange(1, 1 << 30)
+        data += struct.pack("<ii", start, start + rng.randrange(1, 1 << 16))
+    if not odd:
+        # without the extra head byte data[4] is the first sample byte
+        data[4] = fsr
+    return bytes(data)
+
+
+def test_matches_reference_decoder():
+    rng = random.Random(1)
+    for _ in range(500):
+        num = rng.randrange(2, 21)
+        tail = rng.random() < 0.5
+        packet = random_packet(rng, num, rng.randrange(16), rng.random() < 0.5, tail)
+        bias = tuple(rng.uniform(-0.1, 0.1) for _ in range(3))
+
+        imu, timestamps, host_time = decode_imu_packet(packet, bias, receive_time=12.5)
+        expected = reference_decode(packet, bias)
+
+        assert imu.shape == (len(expected), 6)
+        # bit-exact, not approximately equal
+        assert imu.tolist() == [list(sample[:6]) for sample in expected]
+        if tail:
+            assert not host_time
+            assert timestamps.tolist() == [sample[6] for sample in expected]
+        else:
+            assert host_time
+            assert np.all(timestamps == 12.5)
+
+
+def test_single_sample_with_tail_uses_receive_time():
+    # the old loop divided by zero here
+    packet = random_packet(random.Random(2), 1, 0, True, True)
+    imu, timestamps, host_time = decode_imu_packet(packet, receive_time=3.0)
+    assert imu.shape == (1, 6)
+    assert host_time
+    assert timestamps.tolist() == [3.0]
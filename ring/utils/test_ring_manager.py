@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+import ring.ble_ring_v2 as ble_ring_v2
+from ring.utils.ring_manager import RingManager
+
+
+@pytest.fixture
+def slow_client(fake_v2_client, monkeypatch):
+    class SlowClient(fake_v2_client):
+        instances = []
+        connect_time = 0.05
+        connecting = 0
+        max_connecting = 0
+
+        async def connect(self):
+            cls = type(self)
+            cls.connecting += 1
+            cls.max_connecting = max(cls.max_connecting, cls.connecting)
+            try:
+                await super().connect()
+            finally:
+                cls.connecting -= 1
+
+    monkeypatch.setattr(ble_ring_v2, "BleakClient", SlowClient)
+    return SlowClient
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def start_manager(ring_num: int, **kwargs) -> RingManager:
+    rings = [ble_ring_v2.BLERing(f"AA:BB:{i:02X}", i) for i in range(ring_num)]
+    manager = RingManager(rings, **kwargs)
+    manager.start()
+    wait_until(lambda: all(ring.connected for ring in rings))
+    return manager
+
+
+def on_loop(manager: RingManager, function, *args):
+    # the fake clients deliver their notifications from the manager loop
+    manager.loop.call_soon_threadsafe(function, *args)
+
+
+def test_fan_in(slow_client):
+    manager = start_manager(6, max_connecting=2)
+    try:
+        assert slow_client.max_connecting == 2
+        clients = {client.address: client for client in slow_client.instances}
+        for ring in manager.rings:
+            on_loop(manager, clients[ring.address].stream, ring.index + 1)
+            on_loop(manager, clients[ring.address].touch, 1)
+
+        events = []
+        while len(events) < sum(range(1, 7)) + 6:
+            event = manager.get(timeout=5.0)
+            assert event is not None
+            events.append(event)
+        assert manager.get(timeout=0.05) is None
+    finally:
+        manager.stop()
+
+    assert [event.time for event in events] == sorted(event.time for event in events)
+    for ring in manager.rings:
+        own = [event for event in events if event.index == ring.index]
+        assert [event.kind for event in own] == [RingManager.IMU] * (ring.index + 1) + [RingManager.TOUCH]
+        assert all(len(event.data) == 10 for event in own[:-1])
+        assert own[-1].data == 2
+    for stats in manager.stats():
+        assert stats["queued"] == 0
+        assert stats["dropped"] == 0
+        assert stats["received"] == stats["index"] + 2
+        assert stats["connects"] == 1
+
+
+def test_backpressure_per_ring(slow_client):
+    manager = start_manager(2, ring_queue_size=5)
+    try:
+        clients = {client.address: client for client in slow_client.instances}
+        on_loop(manager, clients[manager.rings[0].address].stream, 20)
+        on_loop(manager, clients[manager.rings[1].address].stream, 3)
+        wait_until(lambda: sum(stats["received"] for stats in manager.stats()) == 23)
+
+        stats = manager.stats()
+        # the ring that ran ahead loses its newest packets, the other one nothing
+        assert (stats[0]["queued"], stats[0]["dropped"]) == (5, 15)
+        assert (stats[1]["queued"], stats[1]["dropped"]) == (3, 0)
+        events = manager.poll()
+        assert [event.index for event in events].count(0) == 5
+
+        # consuming makes room again
+        on_loop(manager, clients[manager.rings[0].address].stream, 2)
+        wait_until(lambda: manager.stats()[0]["queued"] == 2)
+        assert manager.stats()[0]["dropped"] == 15
+    finally:
+        manager.stop()
@@ -0,0 +1,86 @@
+import random
+import struct
+
+from ring.utils.crc import crc16
+from ring.utils.spp_framer import SPPFramer
+
+
+def frame(i: int) -> bytes:
+    # 36 byte v1 IMU frame, CRC of the bytes after it in bytes 2-3
+    data = bytearray(36)
+    data[0:2] = SPPFramer.HEADER
+    struct.pack_into("6f", data, 4, i, 0, 9.8, 0, 0, 0)
+    crc = crc16(data, 4)
+    data[2] = crc & 0xFF
+    data[3] = crc >> 8
+    return bytes(data)
+
+
+def feed(framer: SPPFramer, chunks) -> list:
+    received = []
+    for chunk in chunks:
+        framer.feed(chunk)
+        # the views are only valid until the next feed
+        received.extend(bytes(view) for view in framer.frames())
+    return received
+
+
+def split(data: bytes, sizes) -> list:
+    chunks = []
+    while data:
+        size = next(sizes)
+        chunks.append(data[:size])
+        data = data[size:]
+    return chunks
+
+
+def test_frame_split_across_chunks():
+    framer = SPPFramer()
+    data = frame(1) + frame(2)
+    received = []
+    fed = 0
+    for chunk in split(data, iter([1, 1, 5, 20, 10, 3, 30, 2])):
+        received.extend(feed(framer, [chunk]))
+        fed += len(chunk)
+        # a frame is yielded as soon as its last byte arrives, not before
+        assert len(received) == fed // 36
+        assert len(framer) == fed % 36
+    assert received == [frame(1), frame(2)]
+    assert (framer.frame_count, framer.crc_error_count, framer.discarded_bytes) == (2, 0, 0)
+    assert len(framer) == 0
+
+
+def test_bad_crc_resyncs():
+    framer = SPPFramer()
+    bad = bytearray(frame(2))
+    bad[10] ^= 0xFF
+    assert feed(framer, [frame(1) + bytes(bad) + frame(3)]) == [frame(1), frame(3)]
+    assert framer.crc_error_count == 1
+    # the bad frame is skipped byte by byte up to the next header
+    assert framer.discarded_bytes == 36
+
+    # a bad CRC split across chunks, followed by a good frame
+    assert feed(framer, split(bytes(bad) + frame(4), iter([7, 30, 4, 31]))) == [frame(4)]
+    assert framer.crc_error_count == 2
+    assert framer.frame_count == 3
+
+
+def test_garbage_between_frames():
+    rng = random.Random(1)
+    framer = SPPFramer()
+    data = b""
+    expected = []
+    for i in range(200):
+        garbage = bytes(rng.randrange(256) for _ in range(rng.randrange(0, 50)))
+        if i % 10 == 0:
+            # a false header and a trailing half header
+            garbage += SPPFramer.HEADER + bytes(40)
+        if i % 7 == 0:
+            garbage += b"\xAA"
+        data += garbage + frame(i)
+        expected.append(frame(i))
+    received = feed(framer, split(data, iter(lambda: rng.randrange(1, 80), None)))
+    assert received == expected
+    assert framer.frame_count == 200
+    assert framer.crc_error_count >= 20
+    assert framer.discarded_bytes == len(data) - 200 * 36
@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+import ring.ble_ring_v1 as ble_ring_v1
+import ring.ble_ring_v2 as ble_ring_v2
+from ring.utils.supervisor import ConnectionStats, supervise
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_v1_reconnect_restores_spp_state(fake_v1_client):
+    batches = []
+    ring = ble_ring_v1.BLERing("AA:BB", 0, imu_batch_callback=lambda index, batch: batches.append(len(batch)))
+    stats = ConnectionStats()
+
+    async def run():
+        supervisor = asyncio.ensure_future(supervise(ring, stats, min_backoff=0.05, check_interval=0.02))
+        await wait_until(lambda: ring.imu_mode and ring.connected)
+        client = fake_v1_client.instances[-1]
+        client.stream(5, split=20)
+        await wait_until(lambda: sum(batches) == 5)
+        client.drop()
+
+        await wait_until(lambda: len(fake_v1_client.instances) == 2 and ring.imu_mode and ring.connected)
+        client = fake_v1_client.instances[-1]
+        client.stream(5)
+        await wait_until(lambda: sum(batches) == 10)
+        ring.send_action("disconnect")
+        await asyncio.wait_for(supervisor, 5.0)
+
+    asyncio.run(run())
+    assert stats.connects == 2
+    assert stats.disconnects == 1
+    assert len(stats.gaps) == 1
+    # the ACKs of the second setup are read as text, not fed to the old frame buffer
+    assert ring.commands.timeout_count == 0
+    assert ring.spp_framer.crc_error_count == 0
+    assert b"ENDB6AX\r\n" in fake_v1_client.instances[-1].written
+
+
+def test_v2_reconnect_replays_streams(fake_v2_client):
+    batches = []
+    ring = ble_ring_v2.BLERing("AA:BB", 0, imu_batch_callback=lambda index, batch: batches.append(len(batch)))
+    stats = ConnectionStats()
+
+    async def run():
+        supervisor = asyncio.ensure_future(supervise(ring, stats, min_backoff=0.05, check_interval=0.02))
+        await wait_until(lambda: ring.connected)
+        await ring.open_audio()
+        client = fake_v2_client.instances[-1]
+        client.stream(3)
+        await wait_until(lambda: sum(batches) == 30)
+        client.drop()
+        # no samples while the link is down
+        await asyncio.sleep(0.2)
+
+        await wait_until(lambda: len(fake_v2_client.instances) == 2 and ring.connected)
+        client = fake_v2_client.instances[-1]
+        client.stream(3)
+        await wait_until(lambda: sum(batches) == 60)
+        await ring.disconnect()
+        await asyncio.wait_for(supervisor, 5.0)
+
+    asyncio.run(run())
+    assert stats.connects == 2
+    assert stats.disconnects == 1
+    assert stats.gaps[0] >= 0.05
+    assert stats.lost_samples > 0
+    assert ring.commands.timeout_count == 0
+    # IMU and mic are opened again on the new link
+    opcodes = [tuple(command[2:4]) for command in fake_v2_client.instances[-1].written]
+    assert (0x40, 0x06) in opcodes
+    assert (0x71, 0x01) in opcodes
@@ -1,33 +1,92 @@
 import sys
 import time
+import argparse
+import ctypes
+import asyncio
 import _thread
+import threading
 import numpy as np
 from collections import deque
-from typing import List
+from typing import List, NamedTuple
 
 from . import sensel
-from .frame_data import FrameData, ContactData
+from .frame_data import FrameData, FrameBatch, MAX_X, MAX_Y, CONTACT_DTYPE
+
+
+class BoardProfile(NamedTuple):
+    frame_content: int  # FRAME_CONTENT_*_MASK bits requested from the board
+    contacts_mask: int  # CONTACT_MASK_* bits of the contacts
+    scan_detail: int  # 0 high, 1 medium, 2 low
+    max_frame_rate: int
+    decimation: int = 1  # force maps keep every decimation-th row and column
+
+    @property
+    def pressure(self) -> bool:
+        return bool(self.frame_content & sensel.FRAME_CONTENT_PRESSURE_MASK)
+
+
+_ALL_CONTACT_FIELDS = (
+    sensel.CONTACT_MASK_ELLIPSE | sensel.CONTACT_MASK_DELTAS | sensel.CONTACT_MASK_BOUNDING_BOX | sensel.CONTACT_MASK_PEAK
+)
+
+PROFILES = {
+    # everything the board offers, what Board always requested before profiles
+    "full": BoardProfile(
+        sensel.FRAME_CONTENT_PRESSURE_MASK
+        | sensel.FRAME_CONTENT_LABELS_MASK
+        | sensel.FRAME_CONTENT_CONTACTS_MASK
+        | sensel.FRAME_CONTENT_ACCEL_MASK,
+        _ALL_CONTACT_FIELDS,
+        2,
+        2000,
+    ),
+    # contacts only, FrameData.force_map is None
+    "contacts": BoardProfile(sensel.FRAME_CONTENT_CONTACTS_MASK, _ALL_CONTACT_FIELDS, 2, 2000),
+    # pressure maps at the highest scan detail, no contacts
+    "pressure": BoardProfile(sensel.FRAME_CONTENT_PRESSURE_MASK, 0, 0, 2000),
+    # pressure maps at low scan detail, every other row and column
+    "pressure_decimated": BoardProfile(sensel.FRAME_CONTENT_PRESSURE_MASK, 0, 2, 2000, decimation=2),
+}
 
 
 class Board:
     """Manage the Sensel Morph board."""
 
-    MAX_X = 230.0
-    MAX_Y = 130.0
+    MAX_X = MAX_X
+    MAX_Y = MAX_Y
     FPS = 50  # unused
+    # frames (or batches) waiting for the consumer, older ones are dropped
+    QUEUE_SIZE = 100
+    # SDK force units -> force_map units
+    FORCE_SCALE = 0.05
 
-    def __init__(self, print_fps=False):
+    def __init__(self, print_fps=False, frame_pool_size: int = None, batch_size: int = None, profile="full"):
         self.print_fps = print_fps
+        # name in PROFILES or a BoardProfile, what the board scans and sends
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+        # frames reuse frame_pool_size preallocated force maps round-robin, so the
+        # pool must outlast a full queue plus the frame being read and the one last returned
+        min_pool_size = (Board.QUEUE_SIZE + 2) * (batch_size or 1)
+        if frame_pool_size is not None and frame_pool_size < min_pool_size:
+            raise ValueError(f"frame_pool_size must be at least {min_pool_size}, got {frame_pool_size}")
+        self.frame_pool_size = frame_pool_size
+        # every frame available after a readSensor is read; with batch_size the
+        # queue holds FrameBatch objects of up to batch_size frames instead of FrameData
+        self.batch_size = batch_size
+        # frames the SDK reported lost since the board was opened
+        self.lost_frame_count = 0
         self.fps_cnt = 0
         self.fps_start_time = time.perf_counter()
         self._open_sensel()
-        self.setScanDetail(2)
-        self.setMaxFrameRate(2000)
+        self.setScanDetail(self.profile.scan_detail)
+        self.setMaxFrameRate(self.profile.max_frame_rate)
         print("detail: ", self.getScanDetail())
         print("max frame rate: ", self.getMaxFrameRate())
         self._init_frame()
 
     def _open_sensel(self):
+        if sensel.sensel_lib is None:
+            raise RuntimeError("Sensel SDK not found, install LibSensel to use the board")
         handle = None
         (error, device_list) = sensel.getDeviceList()
         if device_list.num_devices != 0:
@@ -36,19 +95,77 @@ class Board:
 
     def _init_frame(self):
         (error, self.info) = sensel.getSensorInfo(self.handle)
-        error = sensel.setFrameContent(self.handle, 0x0F)
-        error = sensel.setContactsMask(self.handle, 0x0F)
+        error = sensel.setFrameContent(self.handle, self.profile.frame_content)
+        error = sensel.setContactsMask(self.handle, self.profile.contacts_mask)
         error, frame = sensel.allocateFrameData(self.handle)
         error = sensel.startScanning(self.handle)
         self._frame = frame
-        self.frames = deque(maxlen=100)
+        self._init_force_map()
+        self._init_contacts()
+        self.frames = deque(maxlen=Board.QUEUE_SIZE)
+        # guards frames, notified for every new frame
+        self.frames_condition = threading.Condition()
+        # (loop, future) of the get_frame_async() calls waiting for a frame
+        self.async_waiters = []
         self.last_timestamp = time.perf_counter()
-        self.updated = False
+        # set once the reading thread has closed the board
+        self.stopped = threading.Event()
+        # set before the thread starts, a close() right after opening must not be lost
+        self.is_running = True
         try:
             _thread.start_new_thread(self._run, ())
         except:
             print("Thread Error")
 
+    def _init_force_map(self):
+        R = self.info.num_rows
+        C = self.info.num_cols
+        self.force_pool = None
+        self.force_pool_index = 0
+        if not self.profile.pressure:
+            # nothing to convert, frames come without force maps
+            self.force_array = None
+            return
+        # the SDK's force buffer itself, overwritten by every getFrame
+        force_array = np.ctypeslib.as_array(self._frame.force_array, shape=(R, C))
+        d = self.profile.decimation
+        self.force_array = force_array[::d, ::d]
+        if self.frame_pool_size is not None:
+            self.force_pool = np.empty((self.frame_pool_size,) + self.force_array.shape, dtype=np.float32)
+
+    def _init_contacts(self):
+        if CONTACT_DTYPE.itemsize != ctypes.sizeof(sensel.SenselContact):
+            # the contacts are copied as raw bytes, the layouts have to agree
+            raise RuntimeError(
+                f"CONTACT_DTYPE is {CONTACT_DTYPE.itemsize} bytes, SenselContact {ctypes.sizeof(sensel.SenselContact)}"
+            )
+        # the SDK's contact buffer as bytes, overwritten by every getFrame
+        size = self.info.max_contacts * CONTACT_DTYPE.itemsize
+        self.contact_bytes = np.ctypeslib.as_array(ctypes.cast(self._frame.contacts, ctypes.POINTER(ctypes.c_ubyte)), shape=(size,))
+
+    def _take_force_maps(self, count: int) -> np.ndarray:
+        # count consecutive force maps, from the pool when there is one
+        if self.force_pool is None or count > len(self.force_pool):
+            return np.empty((count,) + self.force_array.shape, dtype=np.float32)
+        if self.force_pool_index + count > len(self.force_pool):
+            self.force_pool_index = 0
+        start = self.force_pool_index
+        self.force_pool_index = (start + count) % len(self.force_pool)
+        return self.force_pool[start : start + count]
+
+    def _take_force_map(self) -> np.ndarray:
+        if self.force_array is None:
+            return None
+        # one pass over the SDK buffer, scaled on the way
+        force_map = self._take_force_maps(1)[0]
+        np.multiply(self.force_array, Board.FORCE_SCALE, out=force_map)
+        return force_map
+
+    def _take_contact_bytes(self) -> np.ndarray:
+        # contacts are copied out of the SDK buffer, the next getFrame reuses it
+        # (as bytes, a structured copy goes field by field and is several times slower)
+        return self.contact_bytes[: self._frame.n_contacts * CONTACT_DTYPE.itemsize]
+
     def _close_sensel(self):
         self.is_running = False
         error = sensel.freeFrameData(self.handle, self._frame)
@@ -59,56 +176,65 @@ class Board:
         while (time.perf_counter() - self.last_timestamp) * Board.FPS < 1:
             pass
 
-    def _run(self):
-        self.is_running = True
-        while self.is_running:
-            error = sensel.readSensor(self.handle)
-            (error, num_frames) = sensel.getNumAvailableFrames(self.handle)
-            for i in range(num_frames):
-                # self._sync() # important!!! NEVER USE SYNC
-                timestamp_s = time.perf_counter()
-                error = sensel.getFrame(self.handle, self._frame)
-                timestamp_e = time.perf_counter()
-                timestamp = (timestamp_s + timestamp_e) / 2
-                self.last_timestamp = timestamp
-            R = self.info.num_rows
-            C = self.info.num_cols
-            force_map = np.zeros((R, C), dtype=np.float32)
-            for r in range(R):
-                force_map[r, :] = self._frame.force_array[r * C : (r + 1) * C]
-            force_map *= 0.05
-            frame = FrameData(force_map, timestamp)
-
-            for i in range(self._frame.n_contacts):
-                c = self._frame.contacts[i]
-                x = c.x_pos / Board.MAX_X
-                y = c.y_pos / Board.MAX_Y
-                contact = ContactData(
-                    c.id,
-                    c.state,
-                    x,
-                    y,
-                    c.area,
-                    c.total_force,
-                    c.major_axis,
-                    c.minor_axis,
-                    c.delta_x,
-                    c.delta_y,
-                    c.delta_force,
-                    c.delta_area,
-                )
-                frame.append_contact(contact)
+    def _next_frame(self) -> float:
+        # self._sync() # important!!! NEVER USE SYNC
+        timestamp_s = time.perf_counter()
+        error = sensel.getFrame(self.handle, self._frame)
+        timestamp_e = time.perf_counter()
+        timestamp = (timestamp_s + timestamp_e) / 2
+        self.last_timestamp = timestamp
+        self.lost_frame_count += self._frame.lost_frame_count
+        return timestamp
 
-            self.frames.append(frame)
-            if len(self.frames) == self.frames.maxlen:
-                print("Warning: Frame data not read in time")
-            self.updated = True
+    def _read_frame(self) -> FrameData:
+        timestamp = self._next_frame()
+        contacts = np.frombuffer(bytearray(self._take_contact_bytes()), dtype=CONTACT_DTYPE)
+        return FrameData(self._take_force_map(), timestamp, contacts)
+
+    def _read_batch(self, count: int) -> FrameBatch:
+        force_maps = None if self.force_array is None else self._take_force_maps(count)
+        timestamps = np.empty(count)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        contacts = bytearray()
+        lost_frame_count = self.lost_frame_count
+        for i in range(count):
+            timestamps[i] = self._next_frame()
+            if force_maps is not None:
+                np.multiply(self.force_array, Board.FORCE_SCALE, out=force_maps[i])
+            contacts += self._take_contact_bytes().data
+            offsets[i + 1] = offsets[i] + self._frame.n_contacts
+        contacts = np.frombuffer(contacts, dtype=CONTACT_DTYPE)
+        return FrameBatch(force_maps, timestamps, contacts, offsets, self.lost_frame_count - lost_frame_count)
+
+    def _run(self):
+        try:
+            while self.is_running:
+                error = sensel.readSensor(self.handle)
+                (error, num_frames) = sensel.getNumAvailableFrames(self.handle)
+                if self.batch_size is None:
+                    for i in range(num_frames):
+                        self._put_frame(self._read_frame())
+                else:
+                    for start in range(0, num_frames, self.batch_size):
+                        self._put_frame(self._read_batch(min(self.batch_size, num_frames - start)))
 
-            if self.print_fps:
-                self._printFPS()
-            self.fps_cnt += 1
+                if self.print_fps:
+                    self._printFPS()
+                self.fps_cnt += num_frames
+        finally:
+            try:
+                self._close_sensel()
+            finally:
+                self.stopped.set()
+                self._wake_consumers()
 
-        self._close_sensel()
+    def _wake_consumers(self):
+        # blocked getters see stopped and return without a frame
+        with self.frames_condition:
+            waiters = self.async_waiters
+            self.async_waiters = []
+            self.frames_condition.notify_all()
+        _wake_all(waiters)
 
     def _printFPS(self, time_interval=1):
         if time.perf_counter() - self.fps_start_time > time_interval:
@@ -118,24 +244,87 @@ class Board:
             self.fps_start_time = time.perf_counter()
             self.fps_cnt = 0
 
-    def close(self):
+    def close(self, wait: bool = False):
+        """Stop reading, and with wait return only once the board is closed."""
         self.is_running = False
+        if wait:
+            self.stopped.wait()
+
+    def _put_frame(self, frame: FrameData):
+        with self.frames_condition:
+            self.frames.append(frame)
+            full = len(self.frames) == self.frames.maxlen
+            waiters = self.async_waiters
+            self.async_waiters = []
+            self.frames_condition.notify_all()
+        _wake_all(waiters)
+        if full:
+            print("Warning: Frame data not read in time")
+
+    def get_frame(self, block: bool = True, timeout: float = None) -> FrameData:
+        """Oldest unread frame (FrameBatch with batch_size), waiting up to timeout (forever for None) unless block is False.
+
+        Returns None when no frame arrived in time or the board is closed. With
+        frame_pool_size the force_map of a returned frame is a pool slot that is
+        overwritten once frame_pool_size more maps have been read, copy it to
+        keep it longer.
+        """
+        with self.frames_condition:
+            if block:
+                self.frames_condition.wait_for(lambda: self.frames or self.stopped.is_set(), timeout)
+            return self.frames.popleft() if self.frames else None
 
-    def get_frame(self) -> FrameData:
-        while self.updated == False:
-            time.sleep(0.001)
-        self.updated = False
-        return self.frames.popleft()
-
-    def get_frames(self) -> List[FrameData]:
-        frames = []
-        while self.updated == False:
-            time.sleep(0.001)
-        self.updated = False
-        while len(self.frames) > 0:
-            frames.append(self.frames.popleft())
+    def get_frame_nowait(self) -> FrameData:
+        return self.get_frame(block=False)
+
+    def get_frames(self, block: bool = True, timeout: float = None) -> List[FrameData]:
+        """All unread frames, waiting for the first one like get_frame()."""
+        with self.frames_condition:
+            if block:
+                self.frames_condition.wait_for(lambda: self.frames or self.stopped.is_set(), timeout)
+            frames = list(self.frames)
+            self.frames.clear()
         return frames
 
+    async def _wait_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.frames_condition:
+                if self.frames or self.stopped.is_set():
+                    return
+                future = loop.create_future()
+                waiter = (loop, future)
+                self.async_waiters.append(waiter)
+            try:
+                await future
+            finally:
+                # cancelled or timed out waiters must not stay behind
+                with self.frames_condition:
+                    if waiter in self.async_waiters:
+                        self.async_waiters.remove(waiter)
+
+    async def get_frame_async(self, timeout: float = None) -> FrameData:
+        """get_frame() for asyncio code, the event loop keeps running while waiting."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wait_async(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            frame = self.get_frame(block=False)
+            # another consumer may have taken it first
+            if frame is not None or self.stopped.is_set():
+                return frame
+
+    async def get_frames_async(self, timeout: float = None) -> List[FrameData]:
+        while True:
+            try:
+                await asyncio.wait_for(self._wait_async(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            frames = self.get_frames(block=False)
+            if frames or self.stopped.is_set():
+                return frames
+
     def setScanDetail(self, detail):
         error = sensel.setScanDetail(self.handle, detail)
 
@@ -149,12 +338,52 @@ class Board:
         return sensel.getMaxFrameRate(self.handle)
 
 
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _wake_all(waiters):
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_wake, future)
+        except RuntimeError:
+            # the waiter's event loop is closed already
+            pass
+
+
+def _bench(profiles: List[str], duration: float):
+    for name in profiles:
+        board = Board(profile=name)
+        try:
+            # let the scan settle before counting
+            board.get_frames(timeout=1.0)
+            frames = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                frames += len(board.get_frames(timeout=1.0))
+            elapsed = time.perf_counter() - start
+        finally:
+            # the next profile can only open the board once this one is closed
+            board.close(wait=True)
+        print(f"{name}: {frames / elapsed:.0f} fps, {board.lost_frame_count} frames lost")
+
+
 if __name__ == "__main__":
-    board = Board(print_fps=True)
+    parser = argparse.ArgumentParser(description="Read the Sensel board, or report the achieved frame rate of each profile")
+    parser.add_argument("--profile", type=str, default="full", choices=list(PROFILES))
+    parser.add_argument("--benchmark", action="store_true", help="measure every profile in turn")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to read (per profile with --benchmark)")
+    args = parser.parse_args()
+    if args.benchmark:
+        _bench(list(PROFILES), args.duration)
+        sys.exit()
+
+    board = Board(print_fps=True, profile=args.profile)
 
     start_time = time.time()
     cnt = 0
-    while time.time() - start_time < 10:
+    while time.time() - start_time < args.duration:
         time.sleep(0.1)
         # print(time.time() - start_time)
     print("Done")
@@ -0,0 +1,166 @@
+import threading
+from collections import deque
+
+import numpy as np
+import pytest
+
+from . import sensel as sdk
+from .board import Board
+
+
+class FakeSenselLib:
+    """Stands in for the LibSensel handle behind sensel.sensel.
+
+    The SDK structures of sensel.py are filled in place like the real library
+    does, from a fake frame buffer. Frames only exist once a test adds them
+    with add_frames(), frame k has every force cell set to k and k % 4 contacts
+    (none without FRAME_CONTENT_CONTACTS_MASK) whose x_pos is k.
+    """
+
+    def __init__(self, rows: int = 105, cols: int = 185, max_contacts: int = 16):
+        self.rows = rows
+        self.cols = cols
+        self.max_contacts = max_contacts
+        self.condition = threading.Condition()
+        # lost_frame_count of every frame the board has not read yet
+        self.available = deque()
+        # frames reported by the last getNumAvailableFrames
+        self.reported = 0
+        self.next_frame = 0
+        self.idle = True
+        self.frame_content = 0
+        self.contacts_mask = 0
+        self.scan_detail = 0
+        self.max_frame_rate = 0
+        self.scanning = False
+        self.closed = False
+
+    def __getattr__(self, name):
+        # SDK calls the board does not use
+        return lambda *args: 0
+
+    def add_frames(self, count: int, lost: int = 0):
+        with self.condition:
+            self.available.extend([lost] * count)
+            self.idle = False
+            self.condition.notify_all()
+
+    def wait_idle(self, timeout: float = 5.0):
+        """Wait until the board has read every added frame and queued it."""
+        with self.condition:
+            assert self.condition.wait_for(lambda: self.idle, timeout), "board did not read the frames"
+
+    def senselGetDeviceList(self, device_list):
+        device_list._obj.num_devices = 1
+        return 0
+
+    def senselOpenDeviceByID(self, handle, idx):
+        handle._obj.value = 1
+        return 0
+
+    def senselClose(self, handle):
+        self.closed = True
+        return 0
+
+    def senselGetSensorInfo(self, handle, info):
+        info._obj.max_contacts = self.max_contacts
+        info._obj.num_rows = self.rows
+        info._obj.num_cols = self.cols
+        return 0
+
+    def senselSetFrameContent(self, handle, content):
+        self.frame_content = content.value
+        return 0
+
+    def senselSetContactsMask(self, handle, mask):
+        self.contacts_mask = mask.value
+        return 0
+
+    def senselSetScanDetail(self, handle, detail):
+        self.scan_detail = detail.value
+        return 0
+
+    def senselGetScanDetail(self, handle, detail):
+        detail._obj.value = self.scan_detail
+        return 0
+
+    def senselSetMaxFrameRate(self, handle, frame_rate):
+        self.max_frame_rate = frame_rate.value
+        return 0
+
+    def senselGetMaxFrameRate(self, handle, frame_rate):
+        frame_rate._obj.value = self.max_frame_rate
+        return 0
+
+    def senselAllocateFrameData(self, handle, frame_pointer):
+        self.force = (sdk.c_float * (self.rows * self.cols))()
+        self.contacts = (sdk.SenselContact * self.max_contacts)()
+        self.frame = sdk.SenselFrameData()
+        self.frame.force_array = sdk.cast(self.force, sdk.POINTER(sdk.c_float))
+        self.frame.contacts = sdk.cast(self.contacts, sdk.POINTER(sdk.SenselContact))
+        frame_pointer._obj.contents = self.frame
+        return 0
+
+    def senselStartScanning(self, handle):
+        self.scanning = True
+        return 0
+
+    def senselStopScanning(self, handle):
+        self.scanning = False
+        return 0
+
+    def senselReadSensor(self, handle):
+        with self.condition:
+            if not self.available:
+                # every frame added so far has been read and queued
+                self.idle = True
+                self.condition.notify_all()
+                # the real call blocks until the next scan too
+                self.condition.wait(0.01)
+            self.reported = len(self.available)
+        return 0
+
+    def senselGetNumAvailableFrames(self, handle, num_frames):
+        num_frames._obj.value = self.reported
+        return 0
+
+    def senselGetFrame(self, handle, frame):
+        with self.condition:
+            lost = self.available.popleft()
+        self.reported -= 1
+        k = self.next_frame
+        self.next_frame += 1
+        frame = frame._obj
+        frame.lost_frame_count = lost
+        np.ctypeslib.as_array(self.force)[:] = k
+        frame.n_contacts = k % 4 if self.frame_content & sdk.FRAME_CONTENT_CONTACTS_MASK else 0
+        for i in range(frame.n_contacts):
+            contact = self.contacts[i]
+            contact.id = i
+            contact.state = sdk.CONTACT_MOVE
+            contact.x_pos = k
+            contact.y_pos = i
+            contact.total_force = k
+        return 0
+
+
+@pytest.fixture
+def fake_sensel(monkeypatch):
+    lib = FakeSenselLib()
+    monkeypatch.setattr(sdk, "sensel_lib", lib)
+    return lib
+
+
+@pytest.fixture
+def open_board(fake_sensel):
+    """Board factory on the fake SDK, the boards are closed after the test."""
+    boards = []
+
+    def open_board(**kwargs) -> Board:
+        board = Board(**kwargs)
+        boards.append(board)
+        return board
+
+    yield open_board
+    for board in boards:
+        board.close(wait=True)
@@ -3,6 +3,35 @@ import cv2
 import time
 import numpy as np
 
+# board size in mm, ContactData positions are relative to it
+MAX_X = 230.0
+MAX_Y = 130.0
+
+# SenselContact of sensel.py field for field, rows of FrameData.contact_array
+CONTACT_DTYPE = np.dtype([
+    ('content_bit_mask', np.uint8),
+    ('id', np.uint8),
+    ('state', np.int32),
+    ('x_pos', np.float32),
+    ('y_pos', np.float32),
+    ('total_force', np.float32),
+    ('area', np.float32),
+    ('orientation', np.float32),
+    ('major_axis', np.float32),
+    ('minor_axis', np.float32),
+    ('delta_x', np.float32),
+    ('delta_y', np.float32),
+    ('delta_force', np.float32),
+    ('delta_area', np.float32),
+    ('min_x', np.float32),
+    ('min_y', np.float32),
+    ('max_x', np.float32),
+    ('max_y', np.float32),
+    ('peak_x', np.float32),
+    ('peak_y', np.float32),
+    ('peak_force', np.float32),
+], align=True)
+
 
 class ContactData():
     ''' Contains all info in one keystroke
@@ -29,6 +58,26 @@ class ContactData():
         self.delta_force = delta_force
         self.delta_area = delta_area
         self.label = label
+
+
+    @classmethod
+    def from_record(cls, c, label = 0):
+        ''' ContactData of one CONTACT_DTYPE row '''
+        return cls(int(c['id']), int(c['state']), float(c['x_pos']) / MAX_X, float(c['y_pos']) / MAX_Y,
+            float(c['area']), float(c['total_force']), float(c['major_axis']), float(c['minor_axis']),
+            float(c['delta_x']), float(c['delta_y']), float(c['delta_force']), float(c['delta_area']), label)
+
+
+    def to_record(self):
+        ''' CONTACT_DTYPE row of the contact, the fields ContactData does not keep are 0 '''
+        c = np.zeros((), dtype=CONTACT_DTYPE)
+        c['id'], c['state'] = self.id, self.state
+        c['x_pos'], c['y_pos'] = self.x * MAX_X, self.y * MAX_Y
+        c['area'], c['total_force'] = self.area, self.force
+        c['major_axis'], c['minor_axis'] = self.major, self.minor
+        c['delta_x'], c['delta_y'] = self.delta_x, self.delta_y
+        c['delta_force'], c['delta_area'] = self.delta_force, self.delta_area
+        return c
         
 
     def __str__(self):
@@ -45,20 +94,45 @@ class ContactData():
 class FrameData():
     ''' info in one frame of morph board
     attrs:
-        force_array: TODO
-        contacts: list of keystroke contacts on the board
+        force_map: (R, C) float32 forces, None for board profiles without pressure
+        contact_array: structured array of CONTACT_DTYPE, the SDK contacts of the frame,
+            a copy since the SDK overwrites its contact buffer on every getFrame
+        contacts: list of keystroke contacts on the board, built from contact_array on first use;
+            append_contact() and assigning contacts update contact_array to match
         timestamp: time acquired from time.perf_counter for each frame
     '''
 
 
-    def __init__(self, force_map, timestamp):
+    def __init__(self, force_map, timestamp, contact_array = None):
         self.force_map = force_map
         self.timestamp = timestamp
-        self.contacts = []
+        self.contact_array = np.empty(0, dtype=CONTACT_DTYPE) if contact_array is None else contact_array
+        self._contacts = None
+
+
+    @property
+    def contacts(self):
+        if self._contacts is None:
+            self._contacts = [self.contact(i) for i in range(len(self.contact_array))]
+        return self._contacts
+
+
+    @contacts.setter
+    def contacts(self, contacts):
+        self._contacts = contacts
+        self.contact_array = np.zeros(len(contacts), dtype=CONTACT_DTYPE)
+        for i, contact in enumerate(contacts):
+            self.contact_array[i] = contact.to_record()
+
+
+    def contact(self, i) -> ContactData:
+        ''' ContactData of row i of contact_array '''
+        return ContactData.from_record(self.contact_array[i])
 
     
     def append_contact(self, contact):
         self.contacts.append(contact)
+        self.contact_array = np.concatenate((self.contact_array, contact.to_record().reshape(1)))
         
         
     def render(self) -> np.ndarray:
@@ -67,12 +141,56 @@ class FrameData():
             np.ndarray, the rendered image.
         '''
         upsample_ratio = 4
-        H, W = self.force_map.shape
-        force_map = cv2.resize(self.force_map, (W * upsample_ratio, H * upsample_ratio))
-        force_map = cv2.cvtColor(force_map, cv2.COLOR_GRAY2BGR)
+        if self.force_map is None:
+            # contacts only profile, draw them on a blank board of one pixel per mm
+            H, W = int(MAX_Y), int(MAX_X)
+            force_map = np.zeros((H * upsample_ratio, W * upsample_ratio, 3), dtype=np.float32)
+        else:
+            H, W = self.force_map.shape
+            force_map = cv2.resize(self.force_map, (W * upsample_ratio, H * upsample_ratio))
+            force_map = cv2.cvtColor(force_map, cv2.COLOR_GRAY2BGR)
 
         color = (0, 255, 0)
         for contact in self.contacts:
             cv2.circle(force_map, (int((contact.x * W + 0.5) * upsample_ratio),
                 int((contact.y * H + 0.5) * upsample_ratio)), 8, color, -1)
-        return force_map
\ No newline at end of file
+        return force_map
+
+
+class FrameBatch():
+    ''' frames read from the board in one pass, with Board(batch_size=...)
+    attrs:
+        force_maps: (n, R, C) force maps, one preallocated block, None without pressure
+        timestamps: (n,) time acquired from time.perf_counter for each frame
+        contact_array: CONTACT_DTYPE rows of all frames, frame i owns rows offsets[i]:offsets[i + 1]
+        offsets: (n + 1,) start of the contacts of each frame
+        lost_frame_count: frames the SDK reported lost while reading this batch
+    '''
+
+
+    def __init__(self, force_maps, timestamps, contact_array, offsets, lost_frame_count = 0):
+        self.force_maps = force_maps
+        self.timestamps = timestamps
+        self.contact_array = contact_array
+        self.offsets = offsets
+        self.lost_frame_count = lost_frame_count
+
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+    def __getitem__(self, i) -> FrameData:
+        ''' FrameData of frame i, sharing the batch's arrays '''
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('frame index out of range')
+        force_map = None if self.force_maps is None else self.force_maps[i]
+        return FrameData(force_map, float(self.timestamps[i]),
+            self.contact_array[self.offsets[i]:self.offsets[i + 1]])
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -48,18 +48,22 @@ CONTACT_MOVE    = 2
 CONTACT_END     = 3
 
 platform_name = platform.system()
-if platform_name == "Windows":
-    python_is_x64 = sys.maxsize > 2**32
-    if python_is_x64:
-        sensel_lib_decompress = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x64\\LibSenselDecompress.dll")
-        sensel_lib = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x64\\LibSensel.dll")
+try:
+    if platform_name == "Windows":
+        python_is_x64 = sys.maxsize > 2**32
+        if python_is_x64:
+            sensel_lib_decompress = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x64\\LibSenselDecompress.dll")
+            sensel_lib = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x64\\LibSensel.dll")
+        else:
+            sensel_lib_decompress = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x86\\LibSenselDecompress.dll")
+            sensel_lib = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x86\\LibSensel.dll")
+    elif platform_name == "Darwin":
+        sensel_lib = cdll.LoadLibrary("/usr/local/lib/libSensel.dylib")
     else:
-        sensel_lib_decompress = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x86\\LibSenselDecompress.dll")
-        sensel_lib = windll.LoadLibrary("C:\\Program Files\\Sensel\\SenselLib\\x86\\LibSensel.dll")
-elif platform_name == "Darwin":
-    sensel_lib = cdll.LoadLibrary("/usr/local/lib/libSensel.dylib")
-else:
-    sensel_lib = cdll.LoadLibrary("/usr/lib/libsensel.so")
+        sensel_lib = cdll.LoadLibrary("/usr/lib/libsensel.so")
+except OSError:
+    # no SDK on this machine, the frame types stay importable and Board refuses to open
+    sensel_lib = None
 
 class SenselSensorInfo(Structure):
     _fields_ = [("max_contacts", c_ubyte), 
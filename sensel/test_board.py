@@ -0,0 +1,226 @@
+import time
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from . import sensel as sdk
+from . import board as board_module
+from .board import Board
+from .frame_data import MAX_X, MAX_Y
+
+
+def frame_number(frame) -> int:
+    # the fake SDK fills frame k with force k
+    return round(float(frame.force_map[0, 0]) / Board.FORCE_SCALE)
+
+
+def later(delay: float, function, *args):
+    timer = threading.Timer(delay, function, args)
+    timer.start()
+    return timer
+
+
+def test_blocking_get_frame(open_board, fake_sensel):
+    board = open_board()
+    later(0.05, fake_sensel.add_frames, 1)
+    start = time.perf_counter()
+    frame = board.get_frame()
+    assert time.perf_counter() - start >= 0.04
+    assert frame_number(frame) == 0
+    assert board.get_frame_nowait() is None
+
+
+def test_timeout_and_nowait(open_board, fake_sensel):
+    board = open_board()
+    start = time.perf_counter()
+    assert board.get_frame(timeout=0.05) is None
+    assert time.perf_counter() - start >= 0.05
+    assert board.get_frames(timeout=0.01) == []
+    assert board.get_frame(block=False) is None
+
+    fake_sensel.add_frames(3)
+    fake_sensel.wait_idle()
+    assert frame_number(board.get_frame_nowait()) == 0
+    assert [frame_number(frame) for frame in board.get_frames(block=False)] == [1, 2]
+
+
+def test_async_delivery(open_board, fake_sensel):
+    board = open_board()
+
+    async def run():
+        assert await board.get_frame_async(timeout=0.02) is None
+        assert await board.get_frames_async(timeout=0.02) == []
+        later(0.05, fake_sensel.add_frames, 2)
+        frame = await board.get_frame_async()
+        frames = await board.get_frames_async(timeout=1.0)
+        # timed out waiters are removed again
+        assert board.async_waiters == []
+        return frame, frames
+
+    frame, frames = asyncio.run(run())
+    assert frame_number(frame) == 0
+    assert len(frames) == 1
+
+
+def test_close_wakes_blocked_consumers(open_board, fake_sensel):
+    board = open_board()
+    results = []
+    consumers = [
+        threading.Thread(target=lambda: results.append(board.get_frame())),
+        threading.Thread(target=lambda: results.append(board.get_frames())),
+        threading.Thread(target=lambda: results.append(asyncio.run(board.get_frame_async()))),
+    ]
+    for consumer in consumers:
+        consumer.start()
+    time.sleep(0.05)
+    board.close(wait=True)
+    for consumer in consumers:
+        consumer.join(2.0)
+        assert not consumer.is_alive()
+    assert sorted(results, key=repr) == [None, None, []]
+    assert fake_sensel.closed
+    # getters of a closed board do not block either
+    assert board.get_frame() is None
+    assert asyncio.run(board.get_frames_async()) == []
+
+
+def test_close_right_after_open(open_board, fake_sensel):
+    board = open_board()
+    board.close()
+    assert board.stopped.wait(2.0)
+    assert not fake_sensel.scanning
+
+
+def test_frames_in_order(open_board, fake_sensel):
+    board = open_board()
+    fake_sensel.add_frames(50)
+    fake_sensel.wait_idle()
+    frames = board.get_frames(block=False)
+    assert [frame_number(frame) for frame in frames] == list(range(50))
+    timestamps = [frame.timestamp for frame in frames]
+    assert timestamps == sorted(timestamps)
+
+
+def test_pool_size_checked(fake_sensel):
+    with pytest.raises(ValueError):
+        Board(frame_pool_size=Board.QUEUE_SIZE + 1)
+    with pytest.raises(ValueError):
+        Board(frame_pool_size=2 * Board.QUEUE_SIZE, batch_size=4)
+
+
+def test_pooled_maps_not_overwritten_while_queued(open_board, fake_sensel):
+    board = open_board(frame_pool_size=Board.QUEUE_SIZE + 2)
+    fake_sensel.add_frames(1)
+    held = board.get_frame()
+    # a full queue and the frame after it do not reach the map last returned
+    fake_sensel.add_frames(Board.QUEUE_SIZE + 1)
+    fake_sensel.wait_idle()
+    assert np.all(held.force_map == 0)
+    board.get_frames(block=False)
+
+    # the queue overflows and the pool wraps around several times
+    fake_sensel.add_frames(398)
+    fake_sensel.wait_idle()
+    frames = board.get_frames(block=False)
+    assert [frame_number(frame) for frame in frames] == list(range(400, 500))
+    for frame in frames:
+        assert np.shares_memory(frame.force_map, board.force_pool)
+        assert np.all(frame.force_map == frame.force_map[0, 0])
+
+
+def test_pooled_batches_not_overwritten_while_queued(open_board, fake_sensel):
+    board = open_board(frame_pool_size=(Board.QUEUE_SIZE + 2) * 4, batch_size=4)
+    fake_sensel.add_frames(1000)
+    fake_sensel.wait_idle()
+    batches = board.get_frames(block=False)
+    assert len(batches) == Board.QUEUE_SIZE
+    numbers = [frame_number(frame) for batch in batches for frame in batch]
+    assert numbers == list(range(600, 1000))
+    for batch in batches:
+        assert np.shares_memory(batch.force_maps, board.force_pool)
+        assert np.all(batch.force_maps == batch.force_maps[:, :1, :1])
+
+
+def test_every_frame_drained(open_board, fake_sensel):
+    board = open_board()
+    fake_sensel.add_frames(7, lost=2)
+    fake_sensel.wait_idle()
+    frames = board.get_frames(block=False)
+    assert [frame_number(frame) for frame in frames] == list(range(7))
+    assert board.lost_frame_count == 14
+    for k, frame in enumerate(frames):
+        assert frame.force_map.shape == (fake_sensel.rows, fake_sensel.cols)
+        assert len(frame.contact_array) == k % 4
+        assert np.all(frame.contact_array["x_pos"] == k)
+        assert [contact.id for contact in frame.contacts] == list(range(k % 4))
+
+
+def test_batches(open_board, fake_sensel):
+    board = open_board(batch_size=4)
+    fake_sensel.add_frames(10, lost=1)
+    fake_sensel.wait_idle()
+    batches = board.get_frames(block=False)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [batch.lost_frame_count for batch in batches] == [4, 4, 2]
+    assert board.lost_frame_count == 10
+
+    k = 0
+    for batch in batches:
+        assert batch.force_maps.shape == (len(batch), fake_sensel.rows, fake_sensel.cols)
+        assert len(batch.timestamps) == len(batch)
+        assert np.all(np.diff(batch.timestamps) >= 0)
+        counts = [(k + i) % 4 for i in range(len(batch))]
+        assert batch.offsets.tolist() == np.concatenate([[0], np.cumsum(counts)]).tolist()
+        assert len(batch.contact_array) == sum(counts)
+        for frame in batch:
+            assert frame_number(frame) == k
+            assert np.all(frame.force_map == frame.force_map[0, 0])
+            assert len(frame.contact_array) == k % 4
+            assert np.all(frame.contact_array["x_pos"] == k)
+            k += 1
+    assert k == 10
+
+
+def test_contacts_profile(open_board, fake_sensel):
+    board = open_board(profile="contacts")
+    assert fake_sensel.frame_content == sdk.FRAME_CONTENT_CONTACTS_MASK
+    assert board.force_array is None
+    fake_sensel.add_frames(4)
+    fake_sensel.wait_idle()
+    frames = board.get_frames(block=False)
+    assert [len(frame.contact_array) for frame in frames] == [0, 1, 2, 3]
+    assert all(frame.force_map is None for frame in frames)
+    # drawn on a blank board
+    image = frames[3].render()
+    assert image.shape == (int(MAX_Y) * 4, int(MAX_X) * 4, 3)
+    assert image.any()
+
+
+def test_contacts_profile_batches(open_board, fake_sensel):
+    board = open_board(profile="contacts", batch_size=4)
+    fake_sensel.add_frames(4)
+    fake_sensel.wait_idle()
+    batch = board.get_frame(block=False)
+    assert batch.force_maps is None
+    assert batch[3].force_map is None
+    assert batch.offsets.tolist() == [0, 0, 1, 3, 6]
+
+
+def test_pressure_profiles(open_board, fake_sensel):
+    board = open_board(profile="pressure_decimated")
+    assert fake_sensel.frame_content == sdk.FRAME_CONTENT_PRESSURE_MASK
+    assert fake_sensel.scan_detail == 2
+    fake_sensel.add_frames(4)
+    fake_sensel.wait_idle()
+    frames = board.get_frames(block=False)
+    assert frames[0].force_map.shape == ((fake_sensel.rows + 1) // 2, (fake_sensel.cols + 1) // 2)
+    # no contacts requested, none delivered
+    assert [len(frame.contact_array) for frame in frames] == [0] * 4
+
+
+def test_contact_layout_checked(fake_sensel, monkeypatch):
+    monkeypatch.setattr(board_module, "CONTACT_DTYPE", np.dtype([("id", np.uint8)]))
+    with pytest.raises(RuntimeError):
+        Board()
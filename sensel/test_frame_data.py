@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from .frame_data import CONTACT_DTYPE, ContactData, FrameData
+
+
+def test_append_contact_keeps_contact_array():
+    frame = FrameData(None, 0.0)
+    frame.append_contact(ContactData(id=1, state=1, x=0.5, y=0.25, force=3.0, label=1))
+    frame.append_contact(ContactData(id=2, state=2, x=0.1, y=0.9, area=4.0))
+    assert len(frame.contact_array) == 2
+    assert frame.contact_array['id'].tolist() == [1, 2]
+    assert frame.contact_array['total_force'].tolist() == [3.0, 0.0]
+    assert [contact.label for contact in frame.contacts] == [1, 0]
+    # rows read back as the contacts that were appended
+    assert frame.contact(0).x == pytest.approx(0.5)
+    assert frame.contact(1).y == pytest.approx(0.9)
+
+
+def test_append_to_sdk_contacts():
+    contacts = np.zeros(1, dtype=CONTACT_DTYPE)
+    contacts['id'] = 5
+    frame = FrameData(None, 0.0, contacts)
+    frame.append_contact(ContactData(id=6))
+    assert frame.contact_array['id'].tolist() == [5, 6]
+    assert [contact.id for contact in frame.contacts] == [5, 6]
+
+
+def test_assign_contacts():
+    frame = FrameData(None, 0.0, np.zeros(3, dtype=CONTACT_DTYPE))
+    frame.contacts = [ContactData(id=7, x=1.0)]
+    assert frame.contact_array['id'].tolist() == [7]
+    assert frame.contact(0).x == pytest.approx(1.0)
+    frame.contacts = []
+    assert len(frame.contact_array) == 0
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from utils.window import Window, ArrayWindow, RollingStats
+
+# feature() of a constant window divides 0 by 0 before mapping the nan to 0
+pytestmark = pytest.mark.filterwarnings("ignore:invalid value encountered:RuntimeWarning")
+
+
+def assert_same_window(array_window: ArrayWindow, window: Window):
+    expected = np.array(window.window)
+    assert array_window.capacity() == window.capacity()
+    assert array_window.full() == window.full()
+    assert array_window.empty() == window.empty()
+    np.testing.assert_array_equal(array_window.to_numpy(), expected)
+    if not window.empty():
+        np.testing.assert_array_equal(array_window.first(), window.first())
+        np.testing.assert_array_equal(array_window.last(), window.last())
+        np.testing.assert_array_equal(array_window.get(-2 if window.capacity() > 1 else 0), expected[-2 if window.capacity() > 1 else 0])
+        # both compute the features of the same values in the same order
+        np.testing.assert_array_equal(array_window.feature(), window.feature())
+
+
+@pytest.mark.parametrize("width", [None, 3])
+def test_push_matches_window(width):
+    rng = np.random.default_rng(1)
+    array_window = ArrayWindow(20, width)
+    window = Window(20)
+    # more than enough pushes to compact the buffer several times
+    for i in range(130):
+        row = rng.normal(size=width)
+        array_window.push(row)
+        window.push(np.copy(row))
+        assert_same_window(array_window, window)
+
+
+@pytest.mark.parametrize("width", [None, 7])
+def test_extend_matches_window(width):
+    rng = np.random.default_rng(2)
+    array_window = ArrayWindow(20, width)
+    window = Window(20)
+    # batches smaller than, equal to and larger than the window, wrapping the buffer end
+    for size in [3, 10, 19, 1, 20, 7, 45, 13, 13, 13, 2, 0, 17]:
+        rows = rng.normal(size=(size,) if width is None else (size, width))
+        array_window.extend(rows)
+        for row in rows:
+            window.push(np.copy(row))
+        assert_same_window(array_window, window)
+        if size % 2:
+            row = rng.normal(size=width)
+            array_window.push(row)
+            window.push(np.copy(row))
+            assert_same_window(array_window, window)
+
+
+def test_head_tail_and_helpers():
+    array_window = ArrayWindow(5, window=[3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0])
+    window = Window(5)
+    for x in [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0]:
+        window.push(x)
+    assert_same_window(array_window, window)
+    assert_same_window(array_window.head(2), window.head(2))
+    assert_same_window(array_window.tail(3), window.tail(3))
+    assert array_window.argmax() == window.argmax()
+    assert array_window.sum() == window.sum()
+    assert array_window.count(lambda x: x > 2) == window.count(lambda x: x > 2)
+
+    array_window.set_to_last_value()
+    window.set_to_last_value()
+    assert_same_window(array_window, window)
+    # a constant window has no skewness or kurtosis
+    assert array_window.feature()[3:] == [0, 0]
+
+    array_window.clear()
+    assert array_window.empty()
+    assert array_window.argmax() == 0
+
+
+def test_copies_survive_compaction():
+    array_window = ArrayWindow(4, 2)
+    array_window.extend(np.arange(8.0).reshape(4, 2))
+    kept = array_window.to_numpy().copy()
+    for i in range(10):
+        array_window.push([i, i])
+    np.testing.assert_array_equal(kept, np.arange(8.0).reshape(4, 2))
+    np.testing.assert_array_equal(array_window.to_numpy(), [[6, 6], [7, 7], [8, 8], [9, 9]])
+
+
+def batch_feature(rows):
+    # Window.feature() recomputed from scratch
+    return np.array(Window(len(rows), list(rows)).feature(), dtype=np.float64)
+
+
+def test_rolling_stats_scalar():
+    rng = np.random.default_rng(3)
+    stats = RollingStats(50)
+    # an offset far from 0, a constant stretch and a jump
+    samples = np.concatenate([rng.normal(100, 2, 300), np.full(80, 3.0), rng.normal(-5, 0.1, 200)])
+    for i, x in enumerate(samples):
+        stats.push(x)
+        if i % 7 == 0 or i >= len(samples) - 3:
+            np.testing.assert_allclose(stats.feature(), batch_feature(samples[max(0, i - 49):i + 1]), rtol=1e-6, atol=1e-9)
+
+
+def test_rolling_stats_channels():
+    rng = np.random.default_rng(4)
+    rows = rng.normal(size=(400, 6)) * [1, 2, 9.8, 0.1, 0.1, 0.1] + [0, 0, 9.8, 0, 0, 0]
+    stats = RollingStats(64, 6)
+    for i, row in enumerate(rows):
+        stats.push(row)
+        if i % 11 == 0:
+            window = rows[max(0, i - 63):i + 1]
+            per_channel = np.array([batch_feature(column) for column in window.T]).T
+            np.testing.assert_allclose(stats.feature(), per_channel, rtol=1e-6, atol=1e-9)
+            np.testing.assert_allclose(stats.feature(pooled=True), batch_feature(window), rtol=1e-6, atol=1e-9)
+
+
+def test_rolling_windows_match_batch():
+    rng = np.random.default_rng(5)
+    window = Window(30, rolling_stats=True)
+    array_window = ArrayWindow(30, 3, rolling_stats=True)
+    for i in range(100):
+        window.push(float(rng.normal()))
+        array_window.extend(rng.normal(size=(i % 4, 3)))
+        np.testing.assert_allclose(window.feature(), batch_feature(window.window), rtol=1e-6, atol=1e-9)
+        if not array_window.empty():
+            np.testing.assert_allclose(array_window.feature(), batch_feature(array_window.to_numpy()), rtol=1e-6, atol=1e-9)
+
+
+def test_rolling_stats_copy_the_input():
+    rng = np.random.default_rng(6)
+    array_window = ArrayWindow(10, 3, rolling_stats=True)
+    stats = RollingStats(10, 3)
+    pushed = []
+    buffer = rng.normal(size=(8, 3))
+    array_window.extend(buffer)
+    stats.extend(buffer)
+    pushed.extend(buffer.copy())
+    # the caller reuses its buffer for the next packet
+    buffer[:] = 1000
+    expected = batch_feature(np.array(pushed))
+    np.testing.assert_allclose(array_window.feature(), expected, rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(stats.feature(pooled=True), expected, rtol=1e-6, atol=1e-9)
+    row = np.empty(3)
+    for _ in range(2):
+        row[:] = rng.normal(size=3)
+        array_window.push(row)
+        stats.push(row)
+        pushed.append(row.copy())
+    expected = batch_feature(np.array(pushed[-10:]))
+    np.testing.assert_allclose(array_window.feature(), expected, rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(stats.feature(pooled=True), expected, rtol=1e-6, atol=1e-9)
@@ -2,22 +2,29 @@ from __future__ import annotations
 
 import math
 import numpy as np
+from collections import deque
 from typing import TypeVar, Generic
 
 _T = TypeVar('_T')
 
 class Window(Generic[_T]):
-  def __init__(self, window_length:int, window:list[_T]=None):
+  def __init__(self, window_length:int, window:list[_T]=None, rolling_stats:bool=False):
     self.window_length = window_length
     self.window:list[_T] = [] if window is None else window
+    # feature() of scalar windows from running statistics, see RollingStats
+    self.stats = RollingStats(window_length, window=self.window) if rolling_stats else None
   
   def push(self, data:_T):
     self.window.append(data)
     if len(self.window) > self.window_length:
       self.window.pop(0)
+    if self.stats is not None:
+      self.stats.push(data)
 
   def clear(self):
     self.window.clear()
+    if self.stats is not None:
+      self.stats.clear()
 
   def first(self) -> _T:
     return self.window[0]
@@ -70,6 +77,8 @@ class Window(Generic[_T]):
     return np.array([x.to_numpy() for x in self.window])
   
   def feature(self) -> list[float]:
+    if self.stats is not None:
+      return self.stats.feature()
     x = np.array(self.window)
     std = np.std(x)
     min = np.min(x)
@@ -88,4 +97,299 @@ class Window(Generic[_T]):
         self.window[i].assigned_by(self.window[-1])
       else:
         self.window[i] = self.window[-1]
-    return self
\ No newline at end of file
+    if self.stats is not None:
+      self.stats.reset(self.window)
+    return self
+
+class RollingStats:
+  ''' Running mean, min, max, skewness and kurtosis of the last window_length samples.
+
+  The central moments are updated with Welford/Pebay style formulas as
+  samples are pushed and evicted, on samples shifted by the mean of the last
+  recompute. They are recomputed from the kept samples once every
+  recompute_interval pushes (window_length by default), and early when the
+  spread collapses, so rounding errors do not build up. Rolling min and max
+  come from monotonic deques. feature() matches Window.feature() within
+  rounding, including skewness and kurtosis of 0 for a constant window.
+
+  channels=None takes scalar samples, otherwise arrays of channels values
+  (e.g. the 6 IMU axes) updated in one call; feature() then returns a
+  (5, channels) array, or with pooled=True the features of all values
+  together like Window.feature() of a multi-column window.
+  '''
+  def __init__(self, window_length:int, channels:int=None, window=None, recompute_interval:int=None):
+    self.window_length = window_length
+    self.channels = channels
+    self.recompute_interval = window_length if recompute_interval is None else recompute_interval
+    # circular store of the samples, needed to evict them
+    self.values = np.zeros((window_length,) if channels is None else (window_length, channels))
+    self.clear()
+    if window is not None:
+      self.reset(window)
+
+  def clear(self):
+    self.pushed = 0
+    self.n = 0
+    zero = 0.0 if self.channels is None else np.zeros(self.channels)
+    # samples enter the moments as x - shift
+    self.shift = None
+    self.mean = zero
+    # sums of the 2nd, 3rd and 4th powers of the deviations from the mean
+    self.M2 = zero
+    self.M3 = zero
+    self.M4 = zero
+    # (push number, value) pairs, increasing in min_deques and decreasing in max_deques
+    self.min_deques = [deque() for _ in range(self.channels or 1)]
+    self.max_deques = [deque() for _ in range(self.channels or 1)]
+    self.since_recompute = 0
+    self.peak_M2 = zero
+
+  def reset(self, window):
+    self.clear()
+    for x in window:
+      self.push(x)
+
+  def _add(self, x):
+    n1 = self.n
+    self.n += 1
+    n = self.n
+    delta = x - self.mean
+    dn = delta / n
+    dn2 = dn * dn
+    term1 = delta * dn * n1
+    self.mean = self.mean + dn
+    self.M4 = self.M4 + term1 * dn2 * (n * n - 3 * n + 3) + 6 * dn2 * self.M2 - 4 * dn * self.M3
+    self.M3 = self.M3 + term1 * dn * (n - 2) - 3 * dn * self.M2
+    self.M2 = self.M2 + term1
+
+  def _remove(self, x):
+    # _add() run backwards
+    n = self.n
+    self.n -= 1
+    if self.n == 0:
+      self.mean = self.M2 = self.M3 = self.M4 = self.mean * 0
+      return
+    self.mean = (n * self.mean - x) / self.n
+    delta = x - self.mean
+    dn = delta / n
+    dn2 = dn * dn
+    term1 = delta * dn * self.n
+    self.M2 = self.M2 - term1
+    self.M3 = self.M3 - term1 * dn * (n - 2) + 3 * dn * self.M2
+    self.M4 = self.M4 - term1 * dn2 * (n * n - 3 * n + 3) - 6 * dn2 * self.M2 + 4 * dn * self.M3
+
+  def _recompute(self):
+    x = self.values[:self.n]
+    shift = x.mean(axis=0)
+    d = x - shift
+    d2 = d * d
+    moments = shift, d.mean(axis=0), d2.sum(axis=0), (d2 * d).sum(axis=0), (d2 * d2).sum(axis=0)
+    if self.channels is None:
+      moments = [float(m) for m in moments]
+    self.shift, self.mean, self.M2, self.M3, self.M4 = moments
+    self.peak_M2 = self.M2
+    self.since_recompute = 0
+
+  def push(self, x):
+    slot = self.pushed % self.window_length
+    if self.channels is None:
+      x = float(x)
+      values = (x,)
+    else:
+      x = np.asarray(x, dtype=np.float64)
+      values = x.tolist()
+    if self.shift is None:
+      # a copy, x may be a row of a buffer the caller reuses
+      self.shift = x if self.channels is None else x.copy()
+    if self.n == self.window_length:
+      old = self.values[slot] if self.channels is None else self.values[slot].copy()
+      self._remove((float(old) if self.channels is None else old) - self.shift)
+    self.values[slot] = x
+    self._add(x - self.shift)
+
+    evicted = self.pushed - self.window_length
+    for v, min_deque, max_deque in zip(values, self.min_deques, self.max_deques):
+      while min_deque and min_deque[-1][1] >= v:
+        min_deque.pop()
+      min_deque.append((self.pushed, v))
+      if min_deque[0][0] <= evicted:
+        min_deque.popleft()
+      while max_deque and max_deque[-1][1] <= v:
+        max_deque.pop()
+      max_deque.append((self.pushed, v))
+      if max_deque[0][0] <= evicted:
+        max_deque.popleft()
+    self.pushed += 1
+
+    self.since_recompute += 1
+    self.peak_M2 = np.maximum(self.peak_M2, self.M2)
+    # the evicted spread cancels out of M2 with the rounding errors of its size,
+    # and samples far from the shift lose the digits of their spread
+    if (self.since_recompute >= self.recompute_interval or np.any(self.M2 < 1e-2 * self.peak_M2)
+        or np.any(self.mean * self.mean * self.n > 1e2 * self.M2)):
+      self._recompute()
+
+  def extend(self, rows):
+    for x in rows:
+      self.push(x)
+
+  def feature(self, pooled:bool=False):
+    if self.n == 0:
+      raise ValueError('feature() of an empty window')
+    n = self.n
+    mean, M2, M3, M4 = self.shift + self.mean, self.M2, self.M3, self.M4
+    min = np.array([q[0][1] for q in self.min_deques])
+    max = np.array([q[0][1] for q in self.max_deques])
+    if pooled and self.channels is not None:
+      # moments of every channel about the common mean
+      pooled_mean = np.mean(mean)
+      d = mean - pooled_mean
+      M4 = np.sum(M4 + 4 * d * M3 + 6 * d * d * M2 + n * d ** 4)
+      M3 = np.sum(M3 + 3 * d * M2 + n * d ** 3)
+      M2 = np.sum(M2 + n * d * d)
+      mean, min, max = pooled_mean, min.min(), max.max()
+      n *= self.channels
+    elif self.channels is None:
+      min, max = min[0], max[0]
+    # a window of equal values has no skewness or kurtosis
+    flat = (min == max) | (M2 <= 0)
+    std = np.where(flat, 1.0, np.sqrt(np.maximum(M2, 0) / n))
+    sc = np.where(flat, 0.0, M3 / n / std ** 3)
+    ku = np.where(flat, 0.0, M4 / n / std ** 4)
+    if np.ndim(mean) == 0:
+      return [float(mean), float(min), float(max), float(sc), float(ku)]
+    return np.array([mean, min, max, sc, ku])
+
+
+class ArrayWindow:
+  ''' Window of fixed-width numeric rows stored in a preallocated numpy array.
+
+  Rows are appended to a buffer twice the window length, so push() is O(1)
+  and to_numpy() is always a contiguous view of the last rows. When the
+  buffer end is reached the newest window_length - 1 rows move back to its
+  front, once every window_length pushes. Views returned by to_numpy(),
+  first(), last() and get() are only valid until the next push; copy them
+  to keep them.
+
+  width=None stores scalars (an (N,) array), otherwise rows of width
+  columns, e.g. 7 for acc, gyr and timestamp (an (N, 7) array).
+  '''
+  def __init__(self, window_length:int, width:int=None, dtype=np.float64, window=None, rolling_stats:bool=False):
+    self.window_length = window_length
+    self.width = width
+    shape = (2 * window_length,) if width is None else (2 * window_length, width)
+    self.buffer = np.zeros(shape, dtype=dtype)
+    # rows [start, end) of the buffer are the window
+    self.start = 0
+    self.end = 0
+    # feature() from running statistics, per column features in stats.feature()
+    self.stats = RollingStats(window_length, width) if rolling_stats else None
+    if window is not None:
+      self.extend(window)
+
+  def push(self, data):
+    if self.end == len(self.buffer):
+      self._compact(self.window_length - 1)
+    self.buffer[self.end] = data
+    self.end += 1
+    if self.end - self.start > self.window_length:
+      self.start += 1
+    if self.stats is not None:
+      self.stats.push(self.buffer[self.end - 1])
+
+  def extend(self, rows):
+    ''' push every row of rows, e.g. np.column_stack((batch.imu_np, batch.timestamp)) of an IMUBatch '''
+    rows = np.asarray(rows, dtype=self.buffer.dtype)
+    if self.stats is not None:
+      self.stats.extend(rows[-self.window_length:])
+    if len(rows) >= self.window_length:
+      self.start = 0
+      self.end = self.window_length
+      self.buffer[:self.end] = rows[-self.window_length:]
+      return
+    if self.end + len(rows) > len(self.buffer):
+      self._compact(self.window_length - len(rows))
+    self.buffer[self.end:self.end + len(rows)] = rows
+    self.end += len(rows)
+    self.start = max(self.start, self.end - self.window_length)
+
+  def _compact(self, keep:int):
+    # move the newest keep rows to the front of the buffer
+    keep = min(keep, self.end - self.start)
+    self.buffer[:keep] = self.buffer[self.end - keep:self.end]
+    self.start = 0
+    self.end = keep
+
+  def clear(self):
+    self.start = 0
+    self.end = 0
+    if self.stats is not None:
+      self.stats.clear()
+
+  def first(self):
+    return self.buffer[self.start]
+
+  def last(self):
+    return self.buffer[self.end - 1]
+
+  def get(self, index:int):
+    return self.to_numpy()[index]
+
+  def head(self, length:int) -> ArrayWindow:
+    return ArrayWindow(self.window_length, self.width, self.buffer.dtype, self.to_numpy()[:length])
+
+  def tail(self, length:int) -> ArrayWindow:
+    return ArrayWindow(self.window_length, self.width, self.buffer.dtype, self.to_numpy()[-length:])
+
+  def capacity(self):
+    return self.end - self.start
+
+  def empty(self):
+    return self.end == self.start
+
+  def full(self):
+    return self.end - self.start == self.window_length
+
+  def sum(self, func:function=lambda x:x):
+    return sum(map(func, self.to_numpy()))
+
+  def count(self, func:function=lambda x:x):
+    return len(list(filter(lambda x:x == True, map(func, self.to_numpy()))))
+
+  def map(self, func:function=lambda x:x) -> Window:
+    return Window(self.window_length, list(map(func, self.to_numpy())))
+
+  def argmax(self) -> tuple[int, float]:
+    ''' first maximum of a scalar window '''
+    if self.capacity() == 0:
+      return 0
+    x = self.to_numpy()
+    index = int(np.argmax(x))
+    return index, x[index]
+
+  def to_numpy(self) -> np.ndarray:
+    return self.buffer[self.start:self.end]
+
+  def to_numpy_inside(self) -> np.ndarray:
+    return self.to_numpy()
+
+  def feature(self) -> list[float]:
+    if self.stats is not None:
+      return self.stats.feature(pooled=True)
+    x = self.to_numpy()
+    std = np.std(x)
+    min = np.min(x)
+    max = np.max(x)
+    mean = np.mean(x)
+    sc = np.mean((x - mean) ** 3) / pow(std, 3)
+    ku = np.mean((x - mean) ** 4) / pow(std, 4)
+    if math.isnan(ku):
+      sc = 0
+      ku = 0
+    return [mean, min, max, sc, ku]
+
+  def set_to_last_value(self):
+    self.buffer[self.start:self.end - 1] = self.buffer[self.end - 1]
+    if self.stats is not None:
+      self.stats.reset(self.to_numpy())
+    return self